@@ -0,0 +1,73 @@
+""" Benchmarks the next reaction method against the direct method on a sparse model: a ring of compartments with nearest neighbour
+transport, birth and death, so every event changes the propensity of a handful of the 4*num_compartments subrules.
+
+Usage: python NRM_Benchmark.py [comma separated numbers of compartments] [number of events]
+"""
+import datetime
+import sys
+import time
+
+import numpy as np
+
+from pyRBM.Build.Classes import Classes
+from pyRBM.Core.Cache import loadClasses, loadCompartments, loadMatchedRules
+from pyRBM.Simulation.RuleChain import returnOneStepRuleUpdates
+from pyRBM.Simulation.State import ModelState
+import pyRBM.Simulation.Solvers as Solvers
+
+
+def ringModelDicts(num_compartments:int, initial_population:float = 50):
+    classes = Classes()
+    classes.addClass("A", "individuals")
+    compartments = {str(comp_i):{"compartment_name":f"C{comp_i}", "type":"Cell", "label_mapping":{"0":"A"},
+                                 "initial_values":[initial_population], "compartment_constants":{}}
+                    for comp_i in range(num_compartments)}
+    single_indices = [[comp_i] for comp_i in range(num_compartments)]
+    neighbour_indices = [[comp_i, (comp_i+step) % num_compartments] for step in [1, -1] for comp_i in range(num_compartments)]
+    matched_rules = {"0":{"rule_name":"Hop", "propensity":["0.5*x0", "1"], "stoichiomety":[[-1.0], [1.0]],
+                          "matching_indices":neighbour_indices},
+                     "1":{"rule_name":"Birth", "propensity":["1"], "stoichiomety":[[1.0]], "matching_indices":single_indices},
+                     "2":{"rule_name":"Death", "propensity":["0.02*x0"], "stoichiomety":[[-1.0]], "matching_indices":single_indices}}
+    return classes.returnClassDict(), compartments, matched_rules
+
+def timeSolver(create_solver, simulation, update_graph, num_events:int, repeats:int = 3) -> float:
+    """ Returns the best time per event (in seconds) over repeats runs of num_events steps, excluding the initial propensity evaluation.
+    """
+    compartments, builtin_classes, rules, matched_indices = simulation
+    model_state = ModelState(builtin_classes, datetime.datetime(2001, 1, 1))
+    best_time = np.inf
+    for repeat in range(repeats):
+        solver = create_solver()
+        solver.initialize(compartments, rules, matched_indices, model_state, update_graph)
+        solver._random_source = np.random.default_rng(repeat)
+        compartments[0].state.reset()
+        model_state.reset()
+        solver.reset()
+        current_time = solver.simulateOneStep(0.0)
+        start_time = time.perf_counter()
+        for _ in range(num_events):
+            current_time = solver.simulateOneStep(current_time)
+        best_time = min(best_time, time.perf_counter()-start_time)
+    return best_time/num_events
+
+def runBenchmark(compartment_numbers:list[int], num_events:int) -> None:
+    solvers = {"direct linear":lambda: Solvers.GillespieSolver(debug=False),
+               "direct tree":lambda: Solvers.GillespieSolver(debug=False, selection_method="tree"),
+               "NRM":lambda: Solvers.GillespieNRMSolver(debug=False)}
+    print(f"{'compartments':>12} {'subrules':>9} " + " ".join(f"{name:>14}" for name in solvers) + "   (us/event)")
+    for num_compartments in compartment_numbers:
+        classes_dict, compartments_dict, matched_rules_dict = ringModelDicts(num_compartments)
+        _, builtin_classes = loadClasses(classes_dict=classes_dict)
+        compartments = loadCompartments(build_compartments_dict=compartments_dict)
+        rules, matched_indices = loadMatchedRules(compartments, num_builtin_classes=len(builtin_classes),
+                                                  matched_rule_dict=matched_rules_dict)
+        update_graph = returnOneStepRuleUpdates(rules, compartments, matched_indices,
+                                                ModelState(builtin_classes, datetime.datetime(2001, 1, 1)).returnModelClasses())
+        simulation = (compartments, builtin_classes, rules, matched_indices)
+        event_times = [timeSolver(create_solver, simulation, update_graph, num_events) for create_solver in solvers.values()]
+        print(f"{num_compartments:>12} {update_graph.num_subrules:>9} " + " ".join(f"{1e6*event_time:>14.1f}" for event_time in event_times))
+
+if __name__ == "__main__":
+    compartment_numbers = [int(number) for number in sys.argv[1].split(",")] if len(sys.argv) > 1 else [100, 1000, 10000]
+    num_events = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    runBenchmark(compartment_numbers, num_events)
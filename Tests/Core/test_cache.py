@@ -0,0 +1,62 @@
+import datetime
+import os
+
+import numpy as np
+import sympy
+
+from pyRBM.Core.Cache import returnModelHash, writeUpdateGraph, readUpdateGraph
+from pyRBM.Simulation.RuleChain import returnOneStepRuleUpdates
+from pyRBM.Simulation.State import ModelState
+
+
+class TestCache:
+
+    def test_model_hash_changes_with_model_dicts(self, sir_model_dicts):
+        model_dicts = sir_model_dicts()
+        model_hash = returnModelHash(*model_dicts)
+        assert returnModelHash(*sir_model_dicts()) == model_hash
+
+        model_dicts[1]["0"]["compartment_constants"]["comp_infectivity"] = 0.2
+        assert returnModelHash(*model_dicts) != model_hash
+        model_dicts = sir_model_dicts()
+        model_dicts[2]["1"]["propensity"] = ["comp_recovery*x1*x1"]
+        assert returnModelHash(*model_dicts) != model_hash
+
+    def test_update_graph_round_trip(self, sir_model_dicts, simulation_loader, tmp_path):
+        compartments, builtin_classes, rules, matched_indices = simulation_loader(sir_model_dicts())
+        model_state = ModelState(builtin_classes, datetime.datetime(2001, 1, 1))
+        update_graph = returnOneStepRuleUpdates(rules, compartments, matched_indices, model_state.returnModelClasses())
+        writeUpdateGraph(update_graph, f"{tmp_path}/Cache/UpdateGraph")
+        read_graph = readUpdateGraph(f"{tmp_path}/Cache/UpdateGraph")
+
+        assert read_graph.num_subrules == update_graph.num_subrules
+        assert np.array_equal(read_graph.indptr, update_graph.indptr)
+        assert np.array_equal(read_graph.indices, update_graph.indices)
+        assert read_graph.returnModelClasses() == update_graph.returnModelClasses()
+        for model_class in update_graph.returnModelClasses():
+            assert np.array_equal(read_graph.returnModelClassDependents(model_class),
+                                  update_graph.returnModelClassDependents(model_class))
+
+    def test_warm_load_does_not_parse(self, sir_model_dicts, model_loader, monkeypatch):
+        model = model_loader(sir_model_dicts(), "codegen")
+        assert os.path.exists(f"{model.model_paths.returnCachePath('CompiledRules', model.model_hash)}.json")
+
+        parse_calls = []
+        parse_expr = sympy.parse_expr
+        monkeypatch.setattr(sympy, "parse_expr", lambda *args, **kwargs: parse_calls.append(args) or parse_expr(*args, **kwargs))
+        warm_model = model_loader(sir_model_dicts(), "codegen", write_files=False)
+        assert warm_model.model_hash == model.model_hash
+        assert parse_calls == []
+        assert warm_model.compiled_rules == model.compiled_rules
+
+    def test_changed_constants_invalidate_cache(self, sir_model_dicts, model_loader):
+        model = model_loader(sir_model_dicts(), "codegen")
+        changed_model = model_loader(sir_model_dicts(infectivity=0.2), "codegen")
+        assert changed_model.model_hash != model.model_hash
+        assert os.path.exists(f"{changed_model.model_paths.returnCachePath('CompiledRules', changed_model.model_hash)}.json")
+
+        state_values = changed_model.compartments[0].state.values
+        model_class_values = list(changed_model.model_state.returnModelClassesValues())
+        infection_propensities = changed_model.rules[0].returnPropensities(state_values, model_class_values)
+        # Only C0 has infected individuals: 0.2*200*5/205.
+        assert np.allclose(infection_propensities, [0.2*200*5/205, 0.0, 0.0])
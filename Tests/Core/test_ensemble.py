@@ -0,0 +1,69 @@
+import datetime
+
+import numpy as np
+import pytest
+
+import pyRBM.Simulation.Solvers as Solvers
+
+
+def simulate_ensemble(model, solver, n_replicates:int = 4, time_limit:float = 20) -> np.ndarray:
+    model.initializeSolver(solver)
+    ensemble_trajectory = model.simulateEnsemble(n_replicates, datetime.datetime(2001, 1, 1), time_limit, max_iterations=10000)
+    return ensemble_trajectory.returnEnsembleValues()
+
+
+def replicate_final_values(model, n_replicates:int, max_workers:int, seed:int) -> np.ndarray:
+    """ Returns the final class values of every replicate of `Model.simulateReplicates`, in replicate order.
+    """
+    final_values = {}
+    for replicate_i, trajectory in model.simulateReplicates(n_replicates, datetime.datetime(2001, 1, 1), 20, max_iterations=10000,
+                                                            max_workers=max_workers, seed=seed):
+        final_values[replicate_i] = np.concatenate([compartment_values[-1] for compartment_values
+                                                    in trajectory.trajectory_compartment_values.values()])
+    return np.array([final_values[replicate_i] for replicate_i in range(n_replicates)])
+
+
+class TestEnsemble:
+
+    def test_ode_ensemble(self, sir_model_dicts, model_loader):
+        model = model_loader(sir_model_dicts())
+        ensemble_values = simulate_ensemble(model, Solvers.ODESolver(debug=False))
+        assert ensemble_values.shape[0] == 4 and ensemble_values.shape[2] == 9
+        assert np.all(ensemble_values >= -1e-6)
+        # The replicates are deterministic and the SIR dynamics conserve the population.
+        assert np.allclose(ensemble_values, ensemble_values[:1])
+        assert np.allclose(ensemble_values.sum(axis=2), 605)
+        assert ensemble_values[0, -1, 2::3].sum() > 0
+
+    @pytest.mark.parametrize("solver", [Solvers.TauLeapSolver(time_step=0.1, debug=False),
+                                        Solvers.TauLeapSolver(time_step=0.1, debug=False, tau_selection="adaptive")])
+    def test_tau_leap_ensemble(self, sir_model_dicts, model_loader, solver):
+        model = model_loader(sir_model_dicts())
+        ensemble_values = simulate_ensemble(model, solver)
+        assert ensemble_values.shape[0] == 4 and ensemble_values.shape[2] == 9
+        assert np.all(ensemble_values >= 0)
+        assert np.array_equal(ensemble_values, np.round(ensemble_values))
+        assert np.allclose(ensemble_values.sum(axis=2), 605)
+
+    @pytest.mark.parametrize("negative_behaviour", ["clip", "ignore"])
+    def test_langevin_ensemble(self, sir_model_dicts, model_loader, negative_behaviour):
+        model = model_loader(sir_model_dicts())
+        ensemble_values = simulate_ensemble(model, Solvers.LangevinSolver(time_step=0.1, debug=False,
+                                                                          negative_behaviour=negative_behaviour))
+        assert ensemble_values.shape[0] == 4 and ensemble_values.shape[2] == 9
+        if negative_behaviour == "clip":
+            assert np.all(ensemble_values >= 0)
+        else:
+            # Clipping adds individuals, without it the Gaussian steps conserve the population.
+            assert np.allclose(ensemble_values.sum(axis=2), 605)
+        # The replicates draw independent Gaussian noise.
+        assert not np.allclose(ensemble_values[0], ensemble_values[1])
+
+    @pytest.mark.parametrize("solver", [Solvers.GillespieSolver(debug=False), Solvers.LangevinSolver(time_step=0.1, debug=False)])
+    def test_replicates_reproducible_across_workers(self, sir_model_dicts, model_loader, solver):
+        model = model_loader(sir_model_dicts())
+        model.initializeSolver(solver)
+        serial_values = replicate_final_values(model, 3, max_workers=1, seed=11)
+        parallel_values = replicate_final_values(model, 3, max_workers=2, seed=11)
+        assert np.array_equal(serial_values, parallel_values)
+        assert not np.array_equal(serial_values, replicate_final_values(model, 3, max_workers=2, seed=12))
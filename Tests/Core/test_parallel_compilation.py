@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from pyRBM.Core.Cache import loadClasses, loadCompartments, loadMatchedRules, compileMatchedRules
+from pyRBM.Simulation.PropensityCompiler import returnPropensityModuleSource
+
+
+class TestParallelCompilation:
+
+    @pytest.mark.parametrize("compilation_mode", ["lazy_compilation", "parameterized_compilation"])
+    def test_max_workers_rejects_uncompiled_modes(self, sir_model_dicts, compilation_mode):
+        classes_dict, compartments_dict, matched_rules_dict = sir_model_dicts()
+        _, builtin_classes = loadClasses(classes_dict=classes_dict)
+        compartments = loadCompartments(build_compartments_dict=compartments_dict)
+        with pytest.raises(ValueError):
+            loadMatchedRules(compartments, num_builtin_classes=len(builtin_classes), matched_rule_dict=matched_rules_dict,
+                             max_workers=2, **{compilation_mode:True})
+
+    def test_model_compilation_workers_rejects_lazy(self, sir_model_dicts, model_loader):
+        with pytest.raises(ValueError):
+            model_loader(sir_model_dicts(), "lazy", compilation_workers=2)
+
+    def test_parallel_compilation_matches_serial(self, sir_model_dicts, simulation_loader):
+        classes_dict, compartments_dict, matched_rules_dict = sir_model_dicts()
+        _, builtin_classes = loadClasses(classes_dict=classes_dict)
+        compartments = loadCompartments(build_compartments_dict=compartments_dict)
+        propensity_source, _ = compileMatchedRules(compartments, len(builtin_classes), matched_rules_dict, max_workers=2)
+        assert propensity_source == returnPropensityModuleSource(matched_rules_dict, compartments, len(builtin_classes))
+
+        rules, matched_indices = loadMatchedRules(compartments, num_builtin_classes=len(builtin_classes),
+                                                  matched_rule_dict=matched_rules_dict, max_workers=2)
+        serial_compartments, _, serial_rules, serial_matched_indices = simulation_loader(sir_model_dicts(), "codegen")
+        assert matched_indices == serial_matched_indices
+        state_values = compartments[0].state.values
+        for rule, serial_rule in zip(rules, serial_rules):
+            assert np.allclose(rule.returnPropensities(state_values, [0.0]*len(builtin_classes)),
+                               serial_rule.returnPropensities(serial_compartments[0].state.values, [0.0]*len(builtin_classes)))
@@ -0,0 +1,32 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from pyRBM.Simulation.Solvers import GillespieSolver
+
+
+class TestSweep:
+
+    @pytest.mark.parametrize("propensity_compilation", ["parameterized", "codegen"])
+    def test_sweep_from_zero_constant_matches_uncached(self, sir_model_dicts, model_loader, propensity_compilation):
+        # The infectivity of C0 (the only initially infected compartment) is 0 at build time.
+        model = model_loader(sir_model_dicts(infectivity=0.0), propensity_compilation)
+        parameter_grid = [{"C0":{"comp_infectivity":0.0}}, {"C0":{"comp_infectivity":0.4}}]
+        sweep_arguments = {"parameter_grid":parameter_grid, "n_replicates":2, "start_date":datetime.datetime(2001, 1, 1),
+                           "time_limit":50, "max_iterations":100000, "seed":7}
+        cached_values = model.sweep(solver=GillespieSolver(use_cached_propensities=True, debug=False), **sweep_arguments)
+        uncached_values = model.sweep(solver=GillespieSolver(use_cached_propensities=False, debug=False), **sweep_arguments)
+
+        assert cached_values.shape == (2, 2, 9)
+        assert np.all(cached_values >= 0)
+        assert np.array_equal(cached_values, uncached_values)
+        # C0 infects its own susceptibles at the second grid point only.
+        assert np.all(cached_values[0, :, 0] == 200)
+        assert np.all(cached_values[1, :, 0] < 200)
+
+    def test_sweep_restores_constants(self, sir_model_dicts, model_loader):
+        model = model_loader(sir_model_dicts(), "parameterized")
+        model.sweep([{"C1":{"comp_recovery":0.5}}], 1, GillespieSolver(debug=False), datetime.datetime(2001, 1, 1), 5, seed=1)
+        assert model.compartments[1].compartment_constants["comp_recovery"] == 0.1
+        assert model.rules[1].compiled_slots[0].returnConstants(1, 1) == [0.1]
@@ -0,0 +1,54 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from pyRBM.Simulation.RuleChain import returnOneStepRuleUpdates
+from pyRBM.Simulation.State import ModelState
+import pyRBM.Simulation.Solvers as Solvers
+
+
+def simulate_after_constant_change(simulation, solver, use_update_graph:bool, time_limit:float = 100, seed:int = 3) -> np.ndarray:
+    """ Builds the update graph (as `pyRBM.Core.Model.Model.initializeSolver`) before the infectivity of every compartment is raised from
+    0 to 0.4 (as `pyRBM.Core.Model.Model.setCompartmentConstants`), then simulates and returns the final state values.
+    """
+    compartments, builtin_classes, rules, matched_indices = simulation
+    model_state = ModelState(builtin_classes, datetime.datetime(2001, 1, 1))
+    update_graph = None
+    if use_update_graph:
+        update_graph = returnOneStepRuleUpdates(rules, compartments, matched_indices, model_state.returnModelClasses())
+    for compartment in compartments:
+        compartment.compartment_constants["comp_infectivity"] = 0.4
+    for rule in rules:
+        rule.updateCompartmentConstants(compartments)
+    solver.initialize(compartments, rules, matched_indices, model_state, update_graph)
+    solver._random_source = np.random.default_rng(seed)
+
+    compartments[0].state.reset()
+    model_state.reset()
+    solver.reset()
+    current_time = 0.0
+    while current_time < time_limit:
+        current_time = solver.simulateOneStep(current_time)
+        model_state.processUpdate(current_time)
+    return compartments[0].state.values.copy()
+
+
+class TestCompartmentConstants:
+
+    @pytest.mark.parametrize("propensity_compilation", ["parameterized", "codegen"])
+    def test_slot_symbols_ignore_zero_constants(self, sir_model_dicts, simulation_loader, propensity_compilation):
+        _, _, rules, _ = simulation_loader(sir_model_dicts(infectivity=0.0), propensity_compilation)
+        assert rules[0].slot_symbol_indices[0].tolist() == [0, 1, 2]
+
+    @pytest.mark.parametrize("propensity_compilation", ["parameterized", "codegen"])
+    def test_cached_propensities_after_constant_change(self, sir_model_dicts, simulation_loader, propensity_compilation):
+        # The infectivity is 0 in the even compartments at build time.
+        cached_values = simulate_after_constant_change(simulation_loader(sir_model_dicts(infectivity=0.0), propensity_compilation),
+                                                       Solvers.GillespieSolver(use_cached_propensities=True, debug=False), True)
+        uncached_values = simulate_after_constant_change(simulation_loader(sir_model_dicts(infectivity=0.0), propensity_compilation),
+                                                         Solvers.GillespieSolver(use_cached_propensities=False, debug=False), False)
+        assert np.all(cached_values >= 0)
+        assert np.array_equal(cached_values, uncached_values)
+        # The infection spreads (the recovered of the uncached run are not all initially infected).
+        assert uncached_values[2::3].sum() > 5
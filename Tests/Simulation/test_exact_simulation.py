@@ -0,0 +1,92 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from pyRBM.Build.Classes import Classes
+from pyRBM.Core.Cache import loadClasses, loadCompartments, loadMatchedRules
+from pyRBM.Simulation.RuleChain import returnOneStepRuleUpdates
+from pyRBM.Simulation.State import ModelState
+import pyRBM.Simulation.Solvers as Solvers
+
+NUM_COMPARTMENTS = 3
+BIRTH_RATE = 20.0
+DEATH_RATE = 0.1
+TRANSPORT_RATE = 0.01
+# The total population of the birth-death model is Poisson distributed with mean NUM_COMPARTMENTS*BIRTH_RATE/DEATH_RATE at
+# stationarity, whatever the transport between compartments.
+STATIONARY_MEAN = NUM_COMPARTMENTS*BIRTH_RATE/DEATH_RATE
+
+
+def birth_death_dicts():
+    classes = Classes()
+    classes.addClass("A", "Individuals")
+    compartments_dict = {str(comp_i):{"compartment_name":f"C{comp_i}", "type":"Cell", "label_mapping":{"0":"A"},
+                                      "initial_values":[STATIONARY_MEAN/NUM_COMPARTMENTS],
+                                      "compartment_constants":{"comp_birth":BIRTH_RATE}}
+                         for comp_i in range(NUM_COMPARTMENTS)}
+    single_indices = [[comp_i] for comp_i in range(NUM_COMPARTMENTS)]
+    neighbour_indices = [[comp_i, (comp_i+step) % NUM_COMPARTMENTS] for comp_i in range(NUM_COMPARTMENTS) for step in [1, -1]]
+    matched_rules_dict = {"0":{"rule_name":"Birth", "propensity":["comp_birth"], "stoichiomety":[[1.0]],
+                               "matching_indices":single_indices},
+                          "1":{"rule_name":"Death", "propensity":[f"{DEATH_RATE}*x0"], "stoichiomety":[[-1.0]],
+                               "matching_indices":single_indices},
+                          "2":{"rule_name":"Transport", "propensity":[f"{TRANSPORT_RATE}*x0", "1"], "stoichiomety":[[-1.0], [1.0]],
+                               "matching_indices":neighbour_indices}}
+    return classes.class_def_dict, compartments_dict, matched_rules_dict
+
+def time_averaged_total_moments(solver, time_limit:float, burn_in:float, seed:int) -> tuple[float, float]:
+    """ Simulates the birth-death model with solver (as `pyRBM.Core.Model.Model.simulate` does) and returns the time averaged mean and
+    variance of the total population after burn_in.
+    """
+    classes_dict, compartments_dict, matched_rules_dict = birth_death_dicts()
+    _, builtin_classes = loadClasses(classes_dict=classes_dict)
+    compartments = loadCompartments(build_compartments_dict=compartments_dict)
+    rules, matched_indices = loadMatchedRules(compartments, num_builtin_classes=len(builtin_classes),
+                                              matched_rule_dict=matched_rules_dict)
+    model_state = ModelState(builtin_classes, datetime.datetime(2001, 1, 1))
+    update_graph = None
+    if solver.use_cached_propensities:
+        update_graph = returnOneStepRuleUpdates(rules, compartments, matched_indices, model_state.returnModelClasses())
+    solver.initialize(compartments, rules, matched_indices, model_state, update_graph)
+    solver._random_source = np.random.default_rng(seed)
+
+    state = compartments[0].state
+    state.reset()
+    model_state.reset()
+    solver.reset()
+    total_time = 0.0
+    weighted_sum = 0.0
+    weighted_square_sum = 0.0
+    while model_state.elapsed_time < time_limit:
+        total = state.values.sum()
+        new_time = solver.simulateOneStep(model_state.elapsed_time)
+        interval = max(0.0, min(new_time, time_limit) - max(model_state.elapsed_time, burn_in))
+        total_time += interval
+        weighted_sum += interval*total
+        weighted_square_sum += interval*total**2
+        model_state.processUpdate(new_time)
+    mean = weighted_sum/total_time
+    return mean, weighted_square_sum/total_time - mean**2
+
+
+class TestExactSimulation:
+
+    @pytest.mark.parametrize("solver_class, solver_kwargs", [
+        (Solvers.GillespieSolver, {}),
+        (Solvers.GillespieSolver, {"selection_method":"tree"}),
+        (Solvers.SortingDirectSolver, {}),
+        (Solvers.CompositionRejectionSolver, {}),
+        (Solvers.GillespieFRMSolver, {}),
+        (Solvers.GillespieFRMSolver, {"selection_method":"batched"}),
+        (Solvers.GillespieFRMSolver, {"selection_method":"batched", "resort_interval":4}),
+        (Solvers.GillespieNRMSolver, {}),
+        (Solvers.HKOSolver, {}),
+        (Solvers.NextSubvolumeSolver, {}),
+        (Solvers.RSSASolver, {}),
+    ])
+    def test_birth_death_stationary_distribution(self, solver_class, solver_kwargs):
+        mean, variance = time_averaged_total_moments(solver_class(debug=False, **solver_kwargs), time_limit=600, burn_in=20, seed=1)
+        # The correlation time of the total is 1/DEATH_RATE, so the estimates are from ~30 independent samples.
+        assert mean == pytest.approx(STATIONARY_MEAN, rel=0.03)
+        assert variance == pytest.approx(STATIONARY_MEAN, rel=0.3)
@@ -0,0 +1,85 @@
+import heapq
+
+import numpy as np
+import pytest
+
+from pyRBM.Simulation.IndexedHeap import IndexedMinHeap
+
+
+def pop_all(heap:IndexedMinHeap) -> list[tuple[float, int]]:
+    # Pops by setting the key of the minimum item to inf, as the heap always contains every item.
+    popped = []
+    item, key = heap.returnMin()
+    while key < np.inf:
+        popped.append((key, item))
+        heap.update(item, np.inf)
+        item, key = heap.returnMin()
+    return popped
+
+def assert_heap_invariants(heap:IndexedMinHeap) -> None:
+    assert np.array_equal(heap.positions[heap.heap], np.arange(heap.size))
+    for position in range(1, heap.size):
+        assert heap.keys[heap.heap[(position-1)//2]] <= heap.keys[heap.heap[position]]
+
+
+class TestIndexedMinHeap:
+
+    def test_push_pop_order(self):
+        rng = np.random.default_rng(0)
+        keys = rng.random(200)
+        heap = IndexedMinHeap(len(keys))
+        reference = []
+        # Pushing an item sets its key from inf.
+        for item, key in enumerate(keys.tolist()):
+            heap.update(item, key)
+            heapq.heappush(reference, (key, item))
+            assert_heap_invariants(heap)
+        assert pop_all(heap) == [heapq.heappop(reference) for _ in range(len(keys))]
+
+    def test_build_pop_order(self):
+        keys = np.random.default_rng(1).random(100)
+        heap = IndexedMinHeap(len(keys))
+        heap.build(keys)
+        assert_heap_invariants(heap)
+        assert pop_all(heap) == sorted(zip(keys.tolist(), range(len(keys))))
+
+    def test_update_keys(self):
+        rng = np.random.default_rng(2)
+        keys = rng.random(64)
+        heap = IndexedMinHeap(len(keys))
+        heap.build(keys)
+        for item in rng.integers(0, len(keys), 500).tolist():
+            keys[item] = rng.random()
+            heap.update(item, keys[item])
+            assert heap.returnKey(item) == keys[item]
+            assert heap.returnMin() == (int(np.argmin(keys)), float(keys.min()))
+        assert_heap_invariants(heap)
+        assert pop_all(heap) == sorted(zip(keys.tolist(), range(len(keys))))
+
+    def test_update_to_inf(self):
+        keys = np.array([3.0, 1.0, 4.0, 1.5, 5.0, 9.0, 2.0])
+        heap = IndexedMinHeap(len(keys))
+        heap.build(keys)
+        heap.update(1, np.inf)
+        heap.update(6, np.inf)
+        assert_heap_invariants(heap)
+        assert heap.returnMin() == (3, 1.5)
+        assert pop_all(heap) == [(1.5, 3), (3.0, 0), (4.0, 2), (5.0, 4), (9.0, 5)]
+        # Every item has an inf key once all are popped.
+        assert heap.returnMin()[1] == np.inf
+
+    def test_all_inf(self):
+        heap = IndexedMinHeap(5)
+        assert heap.returnMin()[1] == np.inf
+        heap.update(3, 2.0)
+        assert heap.returnMin() == (3, 2.0)
+        heap.update(3, np.inf)
+        assert heap.returnMin()[1] == np.inf
+        assert_heap_invariants(heap)
+
+    @pytest.mark.parametrize("size", [1, 2, 3])
+    def test_small_heaps(self, size):
+        keys = np.arange(size, 0, -1, dtype=np.float64)
+        heap = IndexedMinHeap(size)
+        heap.build(keys)
+        assert pop_all(heap) == sorted(zip(keys.tolist(), range(size)))
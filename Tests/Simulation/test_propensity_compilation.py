@@ -0,0 +1,83 @@
+import datetime
+
+import numpy as np
+import pytest
+import sympy
+
+from pyRBM.Simulation.PropensityCompiler import (CompiledSlot, returnPropensityModuleHeader, returnSlotFunctionsSource,
+                                                 loadPropensityModule)
+from pyRBM.Simulation.Rule import LazyPropensityFunctions
+from pyRBM.Simulation.State import ModelState
+
+
+def returnAllPropensities(simulation, seed:int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """ Sets random class values and returns the batched (`Rule.returnPropensities`) and scalar (`Rule.returnPropensity`) propensity
+    of every subrule.
+    """
+    compartments, builtin_classes, rules, _ = simulation
+    state = compartments[0].state
+    state.values[:] = np.random.default_rng(seed).integers(0, 50, len(state.values))
+    model_class_values = list(ModelState(builtin_classes, datetime.datetime(2001, 1, 1)).returnModelClassesValues())
+    batched = np.concatenate([rule.returnPropensities(state.values, model_class_values) for rule in rules])
+    scalar = np.array([rule.returnPropensity([compartments[comp_i] for comp_i in index_set], model_class_values, index_set_i)
+                       for rule in rules for index_set_i, index_set in enumerate(rule.index_sets.tolist())])
+    return batched, scalar
+
+
+class TestPropensityCompilation:
+
+    @pytest.mark.parametrize("propensity_compilation", ["codegen", "parameterized", "lazy"])
+    def test_propensities_match_lambdify(self, sir_model_dicts, simulation_loader, propensity_compilation):
+        expected_batched, expected_scalar = returnAllPropensities(simulation_loader(sir_model_dicts(), "lambdify"))
+        batched, scalar = returnAllPropensities(simulation_loader(sir_model_dicts(), propensity_compilation))
+        assert np.allclose(expected_batched, expected_scalar)
+        assert np.allclose(batched, expected_batched)
+        assert np.allclose(scalar, expected_scalar)
+
+    def test_lambdify_interns_identical_formulas(self, sir_model_dicts, simulation_loader):
+        # The infectivity alternates between the compartments, the recovery and mobility constants are shared.
+        _, _, rules, _ = simulation_loader(sir_model_dicts(num_compartments=4), "lambdify")
+        assert len(rules[0].slot_group_functions[0]) == 2
+        assert rules[0].slot_function_groups[0].tolist() == [0, 1, 0, 1]
+        assert rules[0].lambda_propensities[0][0] is rules[0].lambda_propensities[0][2]
+        assert len(rules[1].slot_group_functions[0]) == 1
+        assert len(rules[2].slot_group_functions[0]) == 1
+        assert rules[2].slot_group_functions[1] is None
+
+    def test_lazy_functions_compiled_on_first_evaluation(self, sir_model_dicts, simulation_loader):
+        _, _, rules, _ = simulation_loader(sir_model_dicts(), "lazy")
+        lazy_functions = rules[0].lambda_propensities[0]
+        assert isinstance(lazy_functions, LazyPropensityFunctions)
+        assert lazy_functions._formula_strs == {}
+        lazy_functions[1]
+        assert list(lazy_functions._formula_strs) == [1]
+
+    def test_codegen_slots_use_constants_tables(self, sir_model_dicts, simulation_loader):
+        compartments, _, rules, _ = simulation_loader(sir_model_dicts(), "codegen")
+        infection_slot = rules[0].compiled_slots[0]
+        assert infection_slot.constant_rows == "compartment"
+        assert infection_slot.returnConstants(1, 1) == [compartments[1].compartment_constants["comp_infectivity"]]
+        assert rules[2].compiled_slots[0].constant_rows == "index_set"
+
+    @pytest.mark.parametrize("formula, class_value, expected", [("k0/x0", 0.0, np.inf), ("x0/x0*k0", 0.0, np.nan),
+                                                                ("k0/x0", 2.0, 1.0)])
+    def test_scalar_matches_batched_on_invalid_operations(self, formula, class_value, expected):
+        x0, k0 = sympy.symbols("x0 k0", real=True)
+        expression = sympy.parse_expr(formula, local_dict={"x0":x0, "k0":k0}, evaluate=False)
+        source = returnSlotFunctionsSource("slot", expression, 1, 1)
+        module = loadPropensityModule(returnPropensityModuleHeader(source)+source)
+        compiled_slot = CompiledSlot(module.slot, module.slot_batched, ["k0"], np.array([[2.0]]), "compartment")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            batched = module.slot_batched(np.array([class_value]), 2.0)[0]
+        assert np.array_equal(compiled_slot.evaluateScalar(class_value, 2.0), expected, equal_nan=True)
+        assert np.array_equal(batched, expected, equal_nan=True)
+
+    def test_module_header_imports(self):
+        x0, x1 = sympy.symbols("x0 x1", real=True)
+        plain_source = returnSlotFunctionsSource("slot", x0*x1, 2, 0)
+        max_source = returnSlotFunctionsSource("slot", sympy.Max(x0, x1, 1), 2, 0)
+        assert "import functools" not in returnPropensityModuleHeader(plain_source)
+        assert "import functools" in returnPropensityModuleHeader(max_source)
+        module = loadPropensityModule(returnPropensityModuleHeader(max_source)+max_source)
+        assert module.slot(0.5, 3.0) == 3.0
+        assert np.array_equal(module.slot_batched(np.array([0.5, 4.0]), np.array([0.0, 1.0])), [1.0, 4.0])
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from pyRBM.Simulation.PropensityTree import PropensitySumTree
+
+
+def linear_search(propensities:np.ndarray, random_propensity:float) -> int:
+    # The cumulative search of the linear direct method.
+    return int(np.searchsorted(np.cumsum(propensities), random_propensity, side="right"))
+
+
+class TestPropensitySumTree:
+
+    @pytest.mark.parametrize("size", [1, 2, 5, 8, 37])
+    def test_rebuild_total(self, size):
+        propensities = np.random.default_rng(size).random(size)
+        tree = PropensitySumTree(size)
+        tree.rebuild(propensities)
+        assert tree.num_leaves >= size
+        assert tree.returnTotal() == pytest.approx(propensities.sum())
+
+    def test_search_matches_cumulative_search(self):
+        rng = np.random.default_rng(0)
+        propensities = rng.random(37)
+        propensities[[3, 4, 20]] = 0
+        tree = PropensitySumTree(len(propensities))
+        tree.rebuild(propensities)
+        for random_propensity in rng.random(1000)*propensities.sum():
+            assert tree.search(random_propensity) == linear_search(propensities, random_propensity)
+
+    def test_search_interval_boundaries(self):
+        propensities = np.array([1.0, 0.0, 2.0, 3.0])
+        tree = PropensitySumTree(len(propensities))
+        tree.rebuild(propensities)
+        assert tree.search(0.0) == 0
+        assert tree.search(0.999) == 0
+        # Zero propensity subrules are skipped.
+        assert tree.search(1.0) == 2
+        assert tree.search(2.999) == 2
+        assert tree.search(3.0) == 3
+        assert tree.search(5.999) == 3
+
+    def test_update_matches_rebuild(self):
+        rng = np.random.default_rng(1)
+        propensities = rng.random(50)
+        tree = PropensitySumTree(len(propensities))
+        tree.rebuild(propensities)
+        for subrule_i in rng.integers(0, len(propensities), 500).tolist():
+            propensities[subrule_i] = rng.random() if rng.random() < 0.8 else 0.0
+            tree.update(subrule_i, propensities[subrule_i])
+        rebuilt_tree = PropensitySumTree(len(propensities))
+        rebuilt_tree.rebuild(propensities)
+        assert np.allclose(tree.tree, rebuilt_tree.tree)
+        assert tree.returnTotal() == pytest.approx(propensities.sum())
+        for random_propensity in rng.random(200)*propensities.sum():
+            assert tree.search(random_propensity) == linear_search(propensities, random_propensity)
+
+    def test_update_to_zero(self):
+        tree = PropensitySumTree(3)
+        tree.rebuild(np.array([1.0, 2.0, 3.0]))
+        tree.update(1, 0.0)
+        assert tree.returnTotal() == 4.0
+        assert tree.search(1.5) == 2
+        tree.update(0, 0.0)
+        tree.update(2, 0.0)
+        assert tree.returnTotal() == 0.0
+
+    def test_selection_frequencies(self):
+        rng = np.random.default_rng(2)
+        propensities = np.array([0.5, 0.0, 1.5, 2.0])
+        tree = PropensitySumTree(len(propensities))
+        tree.rebuild(propensities)
+        counts = np.bincount([tree.search(u*tree.returnTotal()) for u in rng.random(20000)], minlength=len(propensities))
+        assert counts[1] == 0
+        assert np.allclose(counts/counts.sum(), propensities/propensities.sum(), atol=0.015)
@@ -0,0 +1,80 @@
+import copy
+
+import pytest
+
+from pyRBM.Build.Classes import Classes
+from pyRBM.Core.Cache import loadClasses, loadCompartments, loadMatchedRules, writeDictToJSON
+from pyRBM.Simulation.PropensityCompiler import returnPropensityModuleSource, loadPropensityModule
+
+
+def returnSIRModelDicts(num_compartments:int = 3, population:float = 200, infected:float = 5, infectivity:float = 0.4) -> tuple[dict, dict, dict]:
+    """ Returns the classes, compartments and matched rules dicts (as written by `pyRBM.Core.Model.Model.buildModel`) of a SIR model on
+    num_compartments fully connected compartments, with compartment (comp_infectivity) and index set (comp_mobility_slot_1) constants.
+    """
+    classes = Classes()
+    for class_name in ["S", "I", "R"]:
+        classes.addClass(class_name, "Individuals")
+    names = [f"C{comp_i}" for comp_i in range(num_compartments)]
+    compartments_dict = {}
+    for comp_i, name in enumerate(names):
+        constants = {"comp_infectivity":infectivity+0.05*(comp_i % 2), "comp_recovery":0.1}
+        constants.update({f"comp_mobility_{other}":0.01 for other in names if other != name})
+        compartments_dict[str(comp_i)] = {"compartment_name":name, "type":"Region", "label_mapping":{"0":"S", "1":"I", "2":"R"},
+                                          "initial_values":[population, infected if comp_i == 0 else 0.0, 0.0],
+                                          "compartment_constants":constants}
+    single_indices = [[comp_i] for comp_i in range(num_compartments)]
+    pair_indices = [[comp_i, other_i] for comp_i in range(num_compartments) for other_i in range(num_compartments) if comp_i != other_i]
+    matched_rules_dict = {"0":{"rule_name":"Infection", "propensity":["comp_infectivity*x0*x1/(x0+x1+x2)"],
+                               "stoichiomety":[[-1.0, 1.0, 0.0]], "matching_indices":single_indices},
+                          "1":{"rule_name":"Recovery", "propensity":["comp_recovery*x1"],
+                               "stoichiomety":[[0.0, -1.0, 1.0]], "matching_indices":single_indices},
+                          "2":{"rule_name":"Travel", "propensity":["comp_mobility_slot_1*x1", "1"],
+                               "stoichiomety":[[0.0, -1.0, 0.0], [0.0, 1.0, 0.0]], "matching_indices":pair_indices}}
+    return classes.returnClassDict(), compartments_dict, matched_rules_dict
+
+@pytest.fixture
+def sir_model_dicts():
+    """ A factory of fresh (deep copied) SIR model dicts, see `returnSIRModelDicts`.
+    """
+    def factory(**kwargs):
+        return copy.deepcopy(returnSIRModelDicts(**kwargs))
+    return factory
+
+def loadSimulation(model_dicts:tuple[dict, dict, dict], propensity_compilation:str = "lambdify") -> tuple[list, list, list, list]:
+    """ Loads the simulation compartments, model_ classes, rules and matched indices of model_dicts with propensity_compilation
+    ("lambdify", "lazy", "parameterized" or "codegen", as `pyRBM.Core.Model.Model.convertToSimulation`).
+    """
+    classes_dict, compartments_dict, matched_rules_dict = model_dicts
+    _, builtin_classes = loadClasses(classes_dict=classes_dict)
+    compartments = loadCompartments(build_compartments_dict=compartments_dict)
+    propensity_module = None
+    if propensity_compilation == "codegen":
+        propensity_module = loadPropensityModule(returnPropensityModuleSource(matched_rules_dict, compartments, len(builtin_classes)))
+    rules, matched_indices = loadMatchedRules(compartments, num_builtin_classes=len(builtin_classes),
+                                              matched_rule_dict=matched_rules_dict, propensity_module=propensity_module,
+                                              lazy_compilation=propensity_compilation == "lazy",
+                                              parameterized_compilation=propensity_compilation == "parameterized")
+    return compartments, builtin_classes, rules, matched_indices
+
+@pytest.fixture
+def simulation_loader():
+    """ `loadSimulation`, for tests.
+    """
+    return loadSimulation
+
+@pytest.fixture
+def model_loader(tmp_path):
+    """ Writes model dicts to json files in a temporary model folder and loads them with `pyRBM.Core.Model.Model.loadModelFromJSONFiles`.
+    Tests using it are skipped if `pyRBM.Core.Model` cannot be imported.
+    """
+    model_module = pytest.importorskip("pyRBM.Core.Model")
+    def loader(model_dicts:tuple[dict, dict, dict], propensity_compilation:str = "lambdify", model_name:str = "SIR",
+               write_files:bool = True, **load_kwargs):
+        if write_files:
+            for filename, model_dict in zip(["Classes", "Compartments", "CompartmentMatchedRules"], model_dicts):
+                writeDictToJSON(model_dict, f"{tmp_path}/{model_name}/{filename}")
+        model = model_module.Model(model_name)
+        model.loadModelFromJSONFiles(model_folder=f"{tmp_path}/", model_name=model_name,
+                                     propensity_compilation=propensity_compilation, **load_kwargs)
+        return model
+    return loader
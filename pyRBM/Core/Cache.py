@@ -1,11 +1,20 @@
+import hashlib
 import json
 import os
+import types
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from typing import Optional, Any
 
 import numpy as np
 
 from pyRBM.Simulation.Rule import Rule
-from pyRBM.Simulation.Compartment import Compartment
+from pyRBM.Simulation.Compartment import Compartment, CompartmentsState
+from pyRBM.Simulation.PropensityCompiler import (returnCompiledSlots, returnParameterizedSlots, returnRuleSource,
+                                                 returnPropensityModuleHeader, loadPropensityModule)
+from pyRBM.Simulation.RuleChain import PropensityUpdateGraph
+
+# Version of the compiled model cache format, part of the model hash.
+COMPILED_CACHE_VERSION = 3
 
 class ModelPaths:
     """ Provides paths for created and loaded model files.
@@ -21,6 +30,7 @@ class ModelPaths:
         classes_path (str|None): the path to the classes .json file saved or loaded or created at this object's creation, if it was saved/loaded, otherwise None.
         matched_rules_path (str|None): the path to the matched_rules .json file saved or loaded or created at this object's creation, if it was saved/loaded, otherwise None.
         metarule_path (str|None): the path to the metarule .json file saved or loaded at this object's creation, if it was saved/loaded, otherwise None.
+        propensity_module_path (str|None): the path to the generated propensity module .py file (see `pyRBM.Simulation.PropensityCompiler`) if the model has a folder, otherwise None.
         save_model_folder (str|None): the model folder that the 
     """
     def __init__(self, matched_rules_filename:Optional[str] = None,
@@ -28,15 +38,20 @@ class ModelPaths:
                  model_folder_path_to:Optional[str] = None,
                  model_name:Optional[str] = "",
                  classes_filename:Optional[str] = None,
-                 metarules_filename:Optional[str] = None):
+                 metarules_filename:Optional[str] = None,
+                 propensity_module_filename:Optional[str] = "Propensities",
+                 cache_folder_name:Optional[str] = "Cache"):
         if model_name is None or model_folder_path_to is None:
             model_name = None
+            self.save_model_folder = None
         else:
             self.save_model_folder = f"{model_folder_path_to}{model_name}/"
         self._matched_rules_filename = matched_rules_filename
         self._compartments_filename = compartments_filename
         self._classes_filename = classes_filename
         self._metarules_filename = metarules_filename
+        self._propensity_module_filename = propensity_module_filename
+        self._cache_folder_name = cache_folder_name
     # property decorator allows the function to be accessed as a standard class variable
     @property
     def compartments_path(self) -> Optional[str]:
@@ -66,6 +81,31 @@ class ModelPaths:
             return None
         else:
             return self.save_model_folder+self._metarules_filename
+    @property
+    def propensity_module_path(self) -> Optional[str]:
+        """The path to the generated propensity module .py file if the model has a folder, otherwise None."""
+        if self._propensity_module_filename is None or self.save_model_folder is None:
+            return None
+        else:
+            return self.save_model_folder+self._propensity_module_filename
+
+    def returnCachePath(self, artifact_name:str, content_hash:Optional[str]) -> Optional[str]:
+        """ The path (excluding the file ending) of a compiled model cache artifact for the model content with content_hash (see
+        `returnModelHash`), in the cache folder of the model folder. None if the model has no folder, caching is disabled
+        (cache_folder_name is None) or content_hash is None.
+        """
+        if self._cache_folder_name is None or self.save_model_folder is None or content_hash is None:
+            return None
+        else:
+            return f"{self.save_model_folder}{self._cache_folder_name}/{artifact_name}_{content_hash}"
+
+def _createParentFolder(filename:str) -> None:
+    folder =''.join([folder+'/' for folder in filename.split("/")[:-1]])
+    dir_to_create = os.path.join(os.curdir,folder)
+
+    if not os.path.exists(dir_to_create):
+        print(f"Creating folder: {dir_to_create}")
+        os.makedirs(dir_to_create)
 
 def writeDictToJSON(dict_to_write:dict, filename:str,
                     dict_name:str="") -> None:
@@ -79,12 +119,7 @@ def writeDictToJSON(dict_to_write:dict, filename:str,
                 file that is being written to (excluding the .json file ending).
         dict_name (str, optional): a string to include to provide user friendly output as to which file is being written.
     """
-    folder =''.join([folder+'/' for folder in filename.split("/")[:-1]])
-    dir_to_create = os.path.join(os.curdir,folder)
-
-    if not os.path.exists(dir_to_create):
-        print(f"Creating folder: {dir_to_create}")
-        os.makedirs(dir_to_create)
+    _createParentFolder(filename)
 
     json_file = json.dumps(dict_to_write, indent=4, sort_keys=True)
     with open(f"{filename}.json", "w+", encoding='utf-8') as outfile:
@@ -105,6 +140,52 @@ def readDictFromJSON(filename:str) -> dict:
         file_data = json.load(infile)
     return file_data
 
+def writePropensityModule(source:str, filename:str) -> None:
+    """ Writes generated propensity module source (see `pyRBM.Simulation.PropensityCompiler`) to a .py file at the filename path
+    using utf-8 encoding, creating all folders if they don't already exist.
+
+    Args:
+        source (str): the module source.
+        filename (str): the string representation of the path and filename of the module (excluding the .py file ending).
+    """
+    _createParentFolder(filename)
+
+    with open(f"{filename}.py", "w+", encoding='utf-8') as outfile:
+        print(f"Writing propensity module to file: {filename}.py")
+        outfile.write(source)
+
+def returnModelHash(classes_dict:dict, compartments_dict:dict, matched_rules_dict:dict) -> str:
+    """ Returns a hash of the model content that compiled model artifacts depend on, used to key the compiled model cache
+    (see `ModelPaths.returnCachePath`). The hash changes with the cache format version so stale artifacts are never loaded.
+    """
+    model_content = json.dumps({"cache_version":COMPILED_CACHE_VERSION, "classes":classes_dict,
+                                "compartments":compartments_dict, "matched_rules":matched_rules_dict},
+                               sort_keys=True, default=str)
+    return hashlib.sha256(model_content.encode("utf-8")).hexdigest()[:16]
+
+def writeUpdateGraph(update_graph:PropensityUpdateGraph, filename:str) -> None:
+    """ Writes a `PropensityUpdateGraph` to a .npz file at the filename path (excluding the .npz file ending), creating all folders
+    if they don't already exist.
+    """
+    _createParentFolder(filename)
+    model_classes = update_graph.returnModelClasses()
+    model_class_dependents = [update_graph.returnModelClassDependents(model_class) for model_class in model_classes]
+    model_class_indptr = np.zeros(len(model_classes)+1, dtype=np.int64)
+    model_class_indptr[1:] = np.cumsum([len(dependents) for dependents in model_class_dependents])
+    print(f"Writing propensity update graph to file: {filename}.npz")
+    np.savez(f"{filename}.npz", indptr=update_graph.indptr, indices=update_graph.indices,
+             model_classes=np.array(model_classes, dtype=str), model_class_indptr=model_class_indptr,
+             model_class_indices=np.concatenate(model_class_dependents+[np.zeros(0, dtype=np.int64)]))
+
+def readUpdateGraph(filename:str) -> PropensityUpdateGraph:
+    """ Reads a `PropensityUpdateGraph` written by `writeUpdateGraph` from the filename path (excluding the .npz file ending).
+    """
+    with np.load(f"{filename}.npz", allow_pickle=False) as graph_data:
+        model_class_indptr = graph_data["model_class_indptr"]
+        model_class_dependents = {str(model_class):graph_data["model_class_indices"][model_class_indptr[i]:model_class_indptr[i+1]]
+                                  for i, model_class in enumerate(graph_data["model_classes"])}
+        return PropensityUpdateGraph.fromArrays(graph_data["indptr"], graph_data["indices"], model_class_dependents)
+
 def processFilenameOrDict(filename:Optional[str],
                           provided_dict:Optional[dict[str,Any]]) -> Optional[dict[str,Any]]:
     """
@@ -133,7 +214,8 @@ def loadCompartments(compartments_filename:Optional[str] = None,
         build_compartments_dict (dict, optional): a dictionary of pyRBM.Build.Compartments 
                 (e.g. from calling Compartments.returnCompartmentsDict())
     Returns:
-        list: pyRBM.Simulation compatible Compartments for each compartment in either compartment_file or build_compartments_dict.
+        list: pyRBM.Simulation compatible Compartments for each compartment in either compartment_file or build_compartments_dict,
+            with class values bound to a shared `CompartmentsState` (`compartment.state`).
     """
     compartment_list = []
     compartments_data = processFilenameOrDict(compartments_filename, build_compartments_dict)
@@ -145,11 +227,17 @@ def loadCompartments(compartments_filename:Optional[str] = None,
                                      initial_class_values=np.array(compartment_dict["initial_values"]),
                                      compartment_constants=compartment_dict["compartment_constants"])
         compartment_list.append(compartment)
+    CompartmentsState(compartment_list)
     return compartment_list
 
 
 def loadMatchedRules(compartments,  num_builtin_classes:int, matched_rules_filename:Optional[str] = None,
-                     matched_rule_dict:Optional[dict]=None) -> tuple[list[Rule], list[list[int]]]:
+                     matched_rule_dict:Optional[dict]=None,
+                     propensity_module:Optional[types.ModuleType] = None,
+                     rule_artifacts:Optional[list[dict]] = None,
+                     lazy_compilation:bool = False,
+                     parameterized_compilation:bool = False,
+                     max_workers:Optional[int] = 1) -> tuple[list[Rule], list[list[int]]]:
     """ Loads all rules from a model matched rules json (see ModelCreation for details).
 
     Args: 
@@ -157,12 +245,30 @@ def loadMatchedRules(compartments,  num_builtin_classes:int, matched_rules_filen
         num_builtin_classes: 
         matched_rules_filename: the string of the file compartment containing the rule definitions.
         matched_rule_dict: 
+        propensity_module (types.ModuleType, optional): a loaded propensity module generated from the same matched rules
+            (see `pyRBM.Simulation.PropensityCompiler`). If passed, rules use its compiled slot functions instead of lambdified
+            per compartment functions.
+        rule_artifacts (list[dict], optional): the `Rule.returnArtifacts` of every rule loaded from the same matched rules and
+            compartments (e.g. from the compiled model cache), which skips the sympy analysis of the rule formulas.
+        lazy_compilation (bool, optional): if True (and no propensity_module is passed), per compartment functions are lambdified on
+            first evaluation (see `pyRBM.Simulation.Rule.LazyPropensityFunctions`).
+        parameterized_compilation (bool, optional): if True (and no propensity_module is passed), each rule slot formula is lambdified
+            once with its compartment constants as arguments (see `pyRBM.Simulation.PropensityCompiler.returnParameterizedSlots`).
+        max_workers (int, optional): if not 1 (and no propensity_module or rule_artifacts are passed), the rules are compiled into a
+            generated propensity module in a pool of max_workers processes (None for the number of processors) with
+            `compileMatchedRules`, and the rules use its compiled slot functions. Raises a ValueError with lazy_compilation or
+            parameterized_compilation.
     Returns: [a list of rules remapped to all possible compartment sets, 
               a 2d list of lists of satisfying indices for the corresponding rule]
     """
     rules_list = []
     applicable_indices = []
+    if max_workers != 1 and (lazy_compilation or parameterized_compilation):
+        raise ValueError("max_workers compiles a generated propensity module, it cannot be combined with lazy or parameterized compilation.")
     rules_data =  processFilenameOrDict(matched_rules_filename, matched_rule_dict)
+    if max_workers != 1 and propensity_module is None and rule_artifacts is None:
+        propensity_source, rule_artifacts = compileMatchedRules(compartments, num_builtin_classes, rules_data, max_workers)
+        propensity_module = loadPropensityModule(propensity_source)
 
     for rule_index in range(len(rules_data)):
         rules_dict = rules_data[str(rule_index)]
@@ -175,14 +281,70 @@ def loadMatchedRules(compartments,  num_builtin_classes:int, matched_rules_filen
         for comp_propensity in rules_dict["propensity"]:
             propensities.append(comp_propensity)
 
+        compiled_slots = None
+        if propensity_module is not None:
+            compiled_slots = returnCompiledSlots(propensity_module, rule_index, len(propensities))
+        elif parameterized_compilation:
+            compiled_slots = returnParameterizedSlots(propensities, stochiometries, num_builtin_classes,
+                                                      rules_dict["matching_indices"], compartments, rules_dict["rule_name"])
         rule = Rule(propensity=propensities, stoichiometry=stochiometries, rule_name=rules_dict["rule_name"],
                          num_builtin_classes=num_builtin_classes, compartments=compartments,
-                         rule_index_sets=rules_dict["matching_indices"])
+                         rule_index_sets=rules_dict["matching_indices"], compiled_slots=compiled_slots,
+                         rule_artifacts=rule_artifacts[rule_index] if rule_artifacts is not None else None,
+                         lazy_compilation=lazy_compilation)
 
         applicable_indices.append(rules_dict["matching_indices"])
         rules_list.append(rule)
     return (rules_list, applicable_indices)
 
+def compileMatchedRules(compartments, num_builtin_classes:int, matched_rule_dict:dict,
+                        max_workers:Optional[int] = None, model_name:str = "") -> tuple[str, list[dict]]:
+    """ Compiles every rule of a matched rules dictionary in a pool of worker processes, each rule independently.
+
+    Workers generate the propensity module source of their rule (see `pyRBM.Simulation.PropensityCompiler.returnRuleSource`) and
+    the rule's `Rule.returnArtifacts`, both serializable, so the parent only joins the sources and constructs rules from the loaded
+    module and the artifacts (`loadMatchedRules` with propensity_module and rule_artifacts), without any sympy work.
+
+    Args:
+        compartments (list[Compartment]): the model compartments.
+        num_builtin_classes (int): the number of model_ classes.
+        matched_rule_dict (dict): the model matched rules dictionary.
+        max_workers (int, optional): the number of worker processes, defaults to the number of processors.
+        model_name (str, optional): the model name, used in the module docstring.
+    Returns:
+        tuple[str, list[dict]]: the propensity module source and the rule artifacts of every rule.
+    """
+    num_rules = len(matched_rule_dict)
+    rule_sources = [None]*num_rules
+    rule_artifacts = [None]*num_rules
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_initializeCompilationWorker,
+                             initargs=(compartments, num_builtin_classes, matched_rule_dict)) as executor:
+        rule_futures = {executor.submit(_compileRule, rule_index):rule_index for rule_index in range(num_rules)}
+        for future in as_completed(rule_futures):
+            rule_sources[rule_futures[future]], rule_artifacts[rule_futures[future]] = future.result()
+    module_body = "".join(rule_sources)
+    return returnPropensityModuleHeader(module_body, model_name)+module_body, rule_artifacts
+
+# The model data of a `compileMatchedRules` worker process, set once per worker by _initializeCompilationWorker.
+_compilation_worker_data:Optional[tuple] = None
+
+def _initializeCompilationWorker(compartments, num_builtin_classes:int, matched_rule_dict:dict) -> None:
+    global _compilation_worker_data
+    _compilation_worker_data = (compartments, num_builtin_classes, matched_rule_dict)
+
+def _compileRule(rule_index:int) -> tuple[str, dict]:
+    compartments, num_builtin_classes, matched_rule_dict = _compilation_worker_data
+    rules_dict = matched_rule_dict[str(rule_index)]
+    rule_source = returnRuleSource(rule_index, rules_dict, compartments, num_builtin_classes)
+    # The rule is constructed from its own compiled slots to run the sympy analysis of its formulas here rather than in the parent.
+    compiled_slots = returnCompiledSlots(loadPropensityModule(returnPropensityModuleHeader(rule_source)+rule_source),
+                                         rule_index, len(rules_dict["propensity"]))
+    rule = Rule(propensity=list(rules_dict["propensity"]),
+                stoichiometry=[np.array(comp_stoichiometry) for comp_stoichiometry in rules_dict["stoichiomety"]],
+                rule_name=rules_dict["rule_name"], num_builtin_classes=num_builtin_classes, compartments=compartments,
+                rule_index_sets=rules_dict["matching_indices"], compiled_slots=compiled_slots)
+    return rule_source, rule.returnArtifacts()
+
 def loadClasses(model_prefix:str = "model_", classes_filename:Optional[str] = None,
                 classes_dict:Optional[dict] = None) -> tuple[dict, dict]:
     """ Loads classes from either a model class json file (see ModelCreation for details) or from a pyRBM.Build.Classes dictionary,
@@ -1,7 +1,10 @@
 import time
 import datetime
+import os
+import types
 from collections import defaultdict
-from typing import Any, Iterable, Callable, Union, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Iterable, Iterator, Callable, Union, Optional
 
 import numpy as np
 
@@ -11,14 +14,16 @@ from pyRBM.Build.Rules import Rules, Rule
 from pyRBM.Build.RuleMatching import returnMatchedRulesDict
 from pyRBM.Build.Utils import createEuclideanDistanceMatrix
 
-from pyRBM.Core.Cache import (ModelPaths, writeDictToJSON, loadClasses,
-                              loadCompartments, loadMatchedRules)
+from pyRBM.Core.Cache import (ModelPaths, writeDictToJSON, readDictFromJSON, writePropensityModule, writeUpdateGraph,
+                              readUpdateGraph, returnModelHash, loadClasses, loadCompartments, loadMatchedRules,
+                              compileMatchedRules)
 from pyRBM.Core.Plotting import SolverDataPlotting
 
 from pyRBM.Simulation.State import ModelState
+from pyRBM.Simulation.PropensityCompiler import returnPropensityModuleSource, loadPropensityModule
 from pyRBM.Simulation.Solvers import Solver
 from pyRBM.Simulation.RuleChain import returnOneStepRuleUpdates
-from pyRBM.Simulation.Trajectory import Trajectory
+from pyRBM.Simulation.Trajectory import Trajectory, EnsembleTrajectory
 
 
 
@@ -44,6 +49,12 @@ class Model:
         self.defined_classes:Optional[list[str]] = None
 
         self.model_paths = ModelPaths()
+        # Source of the generated propensity module, None unless the model was compiled with propensity_compilation="codegen".
+        self.propensity_source:Optional[str] = None
+        # Hash of the model dicts keying the compiled model cache (see `pyRBM.Core.Cache.returnModelHash`).
+        self.model_hash:Optional[str] = None
+        self.propensity_compilation = "lambdify"
+        self.compiled_rules:Optional[dict] = None
 
         self.model_initialized = False
         self.solver_initialized = False
@@ -114,7 +125,9 @@ class Model:
                    compartment_filename:str = "Compartments",
                    matched_rules_filename:str = "CompartmentMatchedRules",
                    classes_filename:str = "Classes",
-                   metarule_filename:str = "MetaRules") -> None:
+                   metarule_filename:str = "MetaRules",
+                   propensity_compilation:str = "lambdify",
+                   compilation_workers:Optional[int] = 1) -> None:
 
 
         self.classes_defintions = classes_defintions
@@ -162,9 +175,10 @@ class Model:
             if save_meta_rules:
                 print("Warning: meta rules not saved as file saving is false")
 
-        self.convertToSimulation()
+        self.convertToSimulation(propensity_compilation, compilation_workers=compilation_workers)
 
-    def convertToSimulation(self) -> None:
+    def convertToSimulation(self, propensity_compilation:str = "lambdify", compiled_rules:Optional[dict] = None,
+                            compilation_workers:Optional[int] = 1) -> None:
         """ Transform internal dict/json representations created from `buildModel` into `pyRBM.Simulation` `Classes`, `Compartment`s and `Rule`s. Creates new `ModelState` and `Trajectory` object to account for the 
         change in state.
 
@@ -172,12 +186,25 @@ class Model:
 
         WARNING:
             This function overwrites `self.trajectory` and therefore possibly a prior `Trajectory`.
+
+        Args:
+            propensity_compilation (str, optional): "lambdify" to lambdify a propensity function per compartment (or index set) for
+                each rule slot, "lazy" to lambdify these functions on first evaluation only (see
+                `pyRBM.Simulation.Rule.LazyPropensityFunctions`), "parameterized" to lambdify one function per rule slot with the
+                compartment constants as arguments, or "codegen" to generate one propensity module for the model with a function per
+                rule slot (see `compilePropensityModule`). The constants of the parameterized and codegen compilations can be changed
+                without recompiling (see `setCompartmentConstants`).
+            compiled_rules (dict, optional): previously compiled rule artifacts for the same model dicts (`self.compiled_rules`),
+                used instead of the compiled model cache.
+            compilation_workers (int, optional): the number of worker processes to compile the rules in (None for the number of
+                processors), see `pyRBM.Core.Cache.compileMatchedRules`. Only supported with propensity_compilation="codegen", 1
+                compiles in this process.
         """
+        assert propensity_compilation in ["lambdify", "lazy", "parameterized", "codegen"]
         self.classes, self.builtin_classes = loadClasses(classes_dict=self._classes_dict)
         self.compartments = loadCompartments(build_compartments_dict=self._compartments_dict)
-        self.rules, self.matched_indices = loadMatchedRules(self.compartments,
-                                                            num_builtin_classes=len(self.builtin_classes),
-                                                            matched_rule_dict=self._matched_rules_dict)
+        self.compartments_state = self.compartments[0].state
+        self._loadSimulationRules(propensity_compilation, compiled_rules, compilation_workers)
 
         self.trajectory = Trajectory(self.compartments)
         self.model_state = ModelState(self.builtin_classes, datetime.datetime.now())
@@ -191,7 +218,9 @@ class Model:
                                matched_rules_filename:str = "CompartmentMatchedRules",
                                classes_filename:str = "Classes",
                                model_folder:str = "Backend/ModelFiles/",
-                               model_name:Optional[str]="") -> None:
+                               model_name:Optional[str]="",
+                               propensity_compilation:str = "lambdify",
+                               compilation_workers:Optional[int] = 1) -> None:
         """ Loads json representations of the model created from `buildModel` into `pyRBM.Simulation `Classes`, `Compartment`s and `Rule`s. Creates new `ModelState`, `Trajectory` and `ModelPaths` objects.
 
         Uninitializes `self.solver` as the solver is initialize with respect to the prior rules, compartments and matched indices.
@@ -205,18 +234,24 @@ class Model:
             classes_filename (str): 
             model_folder (str): 
             model_name (str, optional): 
+            propensity_compilation (str, optional): "lambdify", "lazy", "parameterized" or "codegen", see `convertToSimulation`.
+            compilation_workers (int, optional): the number of rule compilation worker processes, see `convertToSimulation`.
         """
+        assert propensity_compilation in ["lambdify", "lazy", "parameterized", "codegen"]
         self.model_paths = ModelPaths(matched_rules_filename, compartment_filename,
                                       model_folder, model_name, classes_filename, None)
 
-        self.classes, self.builtin_classes = loadClasses(classes_filename = self.model_paths.classes_path)
+        # The model dicts are kept so the model can be rebuilt elsewhere (e.g. by `simulateReplicates` workers).
+        self._classes_dict = readDictFromJSON(self.model_paths.classes_path)
+        self.classes, self.builtin_classes = loadClasses(classes_dict=self._classes_dict)
         if self.model_paths.compartments_path is None:
-            self.compartments = loadCompartments(build_compartments_dict=returnDefaultCompartment(self.classes))
+            self._compartments_dict = returnDefaultCompartment(self.classes)
         else:
-            self.compartments = loadCompartments(compartments_filename = self.model_paths.compartments_path)
-        self.rules, self.matched_indices = loadMatchedRules(self.compartments, num_builtin_classes=len(self.builtin_classes),
-                                                                  matched_rules_filename=self.model_paths.matched_rules_path)
-
+            self._compartments_dict = readDictFromJSON(self.model_paths.compartments_path)
+        self.compartments = loadCompartments(build_compartments_dict=self._compartments_dict)
+        self.compartments_state = self.compartments[0].state
+        self._matched_rules_dict = readDictFromJSON(self.model_paths.matched_rules_path)
+        self._loadSimulationRules(propensity_compilation, compilation_workers=compilation_workers)
 
         self.trajectory = Trajectory(self.compartments)
         self.model_state = ModelState(self.builtin_classes, datetime.datetime.now())
@@ -225,9 +260,115 @@ class Model:
         self.solver_initialized = False
         self.model_initialized = True
 
+    def _loadSimulationRules(self, propensity_compilation:str, compiled_rules:Optional[dict] = None,
+                             compilation_workers:Optional[int] = 1) -> None:
+        """ Loads `self.rules` and `self.matched_indices` from `self._matched_rules_dict` and the loaded compartments.
+
+        The compiled rule artifacts (the generated propensity module source and `Rule.returnArtifacts` of every rule) are read from the
+        compiled model cache in the model folder, keyed by the hash of the model dicts (`self.model_hash`), so a warm load of an
+        unchanged model does no sympy parsing, simplification or analysis with propensity_compilation="codegen". Missing artifacts are
+        compiled and written back to the cache. The artifacts are kept in `self.compiled_rules`.
+        """
+        if compilation_workers != 1 and propensity_compilation != "codegen":
+            raise ValueError(f"compilation_workers is only supported with codegen propensity compilation, not {propensity_compilation}.")
+        self.propensity_compilation = propensity_compilation
+        self.model_hash = returnModelHash(self._classes_dict, self._compartments_dict, self._matched_rules_dict)
+        cache_path = self.model_paths.returnCachePath("CompiledRules", self.model_hash)
+        # Compiled rules passed in may come from a model whose constants were since changed (see `setCompartmentConstants`).
+        refresh_constants = compiled_rules is not None
+        if compiled_rules is None and cache_path is not None and os.path.exists(f"{cache_path}.json"):
+            compiled_rules = readDictFromJSON(cache_path)
+        if compiled_rules is None:
+            compiled_rules = {"propensity_source":None, "rule_artifacts":None}
+        update_cache = False
+
+        self.propensity_source = None
+        propensity_module = None
+        if propensity_compilation == "codegen" and compiled_rules["propensity_source"] is None and compilation_workers != 1:
+            compiled_rules["propensity_source"], compiled_rules["rule_artifacts"] = compileMatchedRules(
+                self.compartments, len(self.builtin_classes), self._matched_rules_dict, compilation_workers, self.model_name)
+            update_cache = True
+            if self.model_paths.propensity_module_path is not None:
+                writePropensityModule(compiled_rules["propensity_source"], self.model_paths.propensity_module_path)
+        if propensity_compilation == "codegen":
+            update_cache = update_cache or compiled_rules["propensity_source"] is None
+            propensity_module = self.compilePropensityModule(compiled_rules["propensity_source"])
+            compiled_rules["propensity_source"] = self.propensity_source
+        self.rules, self.matched_indices = loadMatchedRules(self.compartments, num_builtin_classes=len(self.builtin_classes),
+                                                            matched_rule_dict=self._matched_rules_dict,
+                                                            propensity_module=propensity_module,
+                                                            rule_artifacts=compiled_rules["rule_artifacts"],
+                                                            lazy_compilation=propensity_compilation == "lazy",
+                                                            parameterized_compilation=propensity_compilation == "parameterized")
+        if compiled_rules["rule_artifacts"] is None:
+            update_cache = True
+            compiled_rules["rule_artifacts"] = [rule.returnArtifacts() for rule in self.rules]
+
+        if refresh_constants and propensity_module is not None:
+            for rule in self.rules:
+                rule.updateCompartmentConstants(self.compartments)
+
+        self.compiled_rules = compiled_rules
+        if update_cache and cache_path is not None:
+            writeDictToJSON(compiled_rules, cache_path, "compiled rules")
+
+    def compilePropensityModule(self, propensity_source:Optional[str] = None) -> types.ModuleType:
+        """ Generates the propensity module of the model from `self._matched_rules_dict` and the loaded compartments (see
+        `pyRBM.Simulation.PropensityCompiler.returnPropensityModuleSource`), saves its source next to the model json files if the model
+        has a folder (`self.model_paths.propensity_module_path`) and imports it once.
+
+        The source is kept in `self.propensity_source`.
+
+        Args:
+            propensity_source (str, optional): previously generated source to load instead of generating the module.
+        Returns:
+            types.ModuleType: the loaded propensity module.
+        """
+        module_path = self.model_paths.propensity_module_path
+        if propensity_source is None:
+            propensity_source = returnPropensityModuleSource(self._matched_rules_dict, self.compartments,
+                                                             len(self.builtin_classes), self.model_name)
+            if module_path is not None:
+                writePropensityModule(propensity_source, module_path)
+        self.propensity_source = propensity_source
+        return loadPropensityModule(propensity_source, filename=f"{module_path}.py" if module_path is not None else None)
+
+    def setCompartmentConstants(self, compartment_constants:dict[str, dict[str, float]]) -> None:
+        """ Changes the value of compartment constants without recompiling the rules, e.g. for parameter sweeps or calibration.
+
+        Requires the model to be compiled with propensity_compilation "parameterized" or "codegen" (see `convertToSimulation`). The
+        new values are used from the next `simulate` (or ensemble/replicate) call.
+
+        Args:
+            compartment_constants (dict[str, dict[str, float]]): compartment name -> constant name -> new value. Only constants already
+                defined for the compartment can be changed.
+        """
+        if self.propensity_compilation not in ["parameterized", "codegen"]:
+            raise ValueError("Compartment constants can only be changed with parameterized or codegen propensity compilation.")
+        compartment_indices = {compartment.name:compartment_i for compartment_i, compartment in enumerate(self.compartments)}
+        for compartment_name, constants in compartment_constants.items():
+            if compartment_name not in compartment_indices:
+                raise ValueError(f"Unknown compartment: {compartment_name}")
+            compartment_i = compartment_indices[compartment_name]
+            compartment = self.compartments[compartment_i]
+            for constant_name, value in constants.items():
+                if constant_name not in compartment.compartment_constants:
+                    raise ValueError(f"Constant {constant_name} not defined for compartment {compartment_name}")
+                compartment.compartment_constants[constant_name] = value
+                # Kept in step so the model is rebuilt with the new values (e.g. by `simulateReplicates` workers).
+                self._compartments_dict[str(compartment_i)]["compartment_constants"][constant_name] = value
+        for rule in self.rules:
+            rule.updateCompartmentConstants(self.compartments)
+        # Key the compiled model cache by the new values, so e.g. the next `initializeSolver` does not read a propensity update
+        # graph cached for the old values.
+        self.model_hash = returnModelHash(self._classes_dict, self._compartments_dict, self._matched_rules_dict)
+
     def initializeSolver(self, solver:Solver) -> None:
         """ Instatiates the provided `solver` class with the model compartments, rules and matched indices. Computes the rule to rule map used in 
-        solver propensity caching if `solver.use_cached_propensities` is True. Old solver stats are overwritten.
+        solver propensity caching if `solver.use_cached_propensities` is True (or reads it from the compiled model cache in the model folder). Old solver stats are overwritten.
+
+        The solver numbers subrules with a flat integer id fixed here (see `pyRBM.Simulation.RuleChain.returnSubruleOffsets`),
+        the rule to rule map is stored as an integer `PropensityUpdateGraph` over these ids.
 
         A concrete class (e.g. `GillespieSolver`) that `Solver` should be used and not the `Solver` class
         
@@ -236,11 +377,18 @@ class Model:
         """
         if self.model_initialized:
             if solver.use_cached_propensities:
-                self.rule_propensity_update_dict = returnOneStepRuleUpdates(self.rules, self.compartments,
-                                                                            self.matched_indices,
-                                                                            self.model_state.returnModelClasses())
+                # The graph only depends on the model content, so it is read from the compiled model cache if present.
+                graph_path = self.model_paths.returnCachePath("UpdateGraph", self.model_hash)
+                if graph_path is not None and os.path.exists(f"{graph_path}.npz"):
+                    self.rule_propensity_update_dict = readUpdateGraph(graph_path)
+                else:
+                    self.rule_propensity_update_dict = returnOneStepRuleUpdates(self.rules, self.compartments,
+                                                                                self.matched_indices,
+                                                                                self.model_state.returnModelClasses())
+                    if graph_path is not None:
+                        writeUpdateGraph(self.rule_propensity_update_dict, graph_path)
             else:
-                self.rule_propensity_update_dict = {}
+                self.rule_propensity_update_dict = None
 
 
             self.simulation_elapsed_times:list[float] = []
@@ -255,10 +403,7 @@ class Model:
             self.debug = solver.debug
             if self.debug:
                 self.prior_iterations_data = defaultdict(list)
-                # Remove manual change required for new solver data collection fields here
-                self.solver_diag_data = SolverData(fields=["rule_triggered",
-                                                           "rule_index_set",
-                                                           "total_propensity"])
+                self.solver_diag_data = SolverData(fields=solver.returnStatsFields())
                 self.model_debug_plot = SolverDataPlotting(self)
         else:
             raise ValueError("Model not initialized: initialize model before solver")
@@ -270,14 +415,13 @@ class Model:
             This will overwrite the `self.trajectory`, please store this variable for future use if desired.
         
         Specifically: 
-            `class_values` are reset to `initial_values` for each compartment.
+            `class_values` are reset to `initial_values` for each compartment (in place, in `self.compartments_state`).
             A new `self.trajectory` is created.
             `self.model_state` is reset to it's initial values include the start date.
             `self.solver` resets all cached propensity values but keeps the old `propensity_update_dict` value.
 
         """
-        for compartment in self.compartments:
-            compartment.reset()
+        self.compartments_state.reset()
         # Trajectory uses current compartment values so needs to be defined after compartment values reset.
         self.trajectory = Trajectory(self.compartments)
         self.model_state.reset()
@@ -336,6 +480,157 @@ class Model:
         else:
             raise ValueError("Model/solver not initialized: initialize model before the solver.")
 
+    def simulateEnsemble(self, n_replicates:int, start_date:Union[datetime.time, datetime.date, datetime.datetime],
+                         time_limit:Union[int, float], max_iterations:int = 10000) -> EnsembleTrajectory:
+        """ Simulate n_replicates independent replicates of the model in lockstep using `self.solver` from `start_date` until either the
+        `time_limit` is reached or the number of steps exceed `max_iterations`.
+
+        The replicates are held in a single (n_replicates, state size) array and advanced together by `self.solver.simulateEnsembleStep`,
+        so the solver must take steps common to all replicates (e.g. `TauLeapSolver` or `ODESolver`). All replicates share the same model_
+        class values as they share the same time. Solver debug stats are not collected.
+
+        Has the same model/solver initialization requirements as `model.simulate`.
+
+        Args:
+            n_replicates (int): the number of replicates to simulate.
+            start_date (datetime.time|datetime.date|datetime.datetime): the date to start the simulation from. This date will overwrite the prior `start_datetime` in `self.model_state`.
+            time_limit (int|float): the time limit of the simulation (after which the simulation will terminate) in unit time.
+            max_iterations (int): the upper bound on the number of steps of the simulation (after which the simulation will terminate).
+
+        Returns:
+            EnsembleTrajectory: the trajectories of all replicates, `returnEnsembleValues` returns the stacked trajectory array.
+        """
+        if not (self.solver_initialized and self.model_initialized):
+            raise ValueError("Model/solver not initialized: initialize model before the solver.")
+        self.start_date = start_date
+        self.model_state.changeDate(self.start_date)
+        self.resetSimulation()
+
+        ensemble_values = np.tile(self.compartments_state.initial_values, (n_replicates, 1))
+        ensemble_trajectory = EnsembleTrajectory(self.compartments, ensemble_values)
+
+        start_perf_time = time.perf_counter()
+        while self.model_state.elapsed_time < time_limit and self.model_state.iterations < max_iterations:
+            new_time = self.solver.simulateEnsembleStep(ensemble_values, self.model_state.elapsed_time)
+            self.model_state.processUpdate(new_time)
+            if new_time is None:
+                break
+            ensemble_trajectory.addEntry(new_time, ensemble_values)
+        time_elapsed = time.perf_counter()-start_perf_time
+
+        print(f"Ensemble of {n_replicates} replicates has finished after {self.model_state.elapsed_time} {self.model_state.time_measurement}, requiring {self.model_state.iterations} steps and {time_elapsed} secs of compute time")
+        return ensemble_trajectory
+
+    def simulateReplicates(self, n_replicates:int, start_date:Union[datetime.time, datetime.date, datetime.datetime],
+                           time_limit:Union[int, float], max_iterations:int = 10000, max_workers:Optional[int] = None,
+                           seed:Optional[int] = None) -> Iterator[tuple[int, Trajectory]]:
+        """ Simulate n_replicates independent replicates of the model with `self.solver` in a pool of worker processes, yielding
+        each replicate's `Trajectory` as soon as it finishes.
+
+        Each worker rebuilds the model (from the model dicts, reusing the compiled rule artifacts) and initializes a copy of the solver once, then runs replicates with
+        `model.simulate`. Replicate i uses its own random generator, seeded by the i-th child of `np.random.SeedSequence(seed)`,
+        so the replicates are statistically independent and a fixed seed gives the same replicates regardless of the number of
+        workers or the order in which replicates finish. Solver debug stats are not collected in the workers.
+
+        Has the same model/solver initialization requirements as `model.simulate`.
+
+        Args:
+            n_replicates (int): the number of replicates to simulate.
+            start_date (datetime.time|datetime.date|datetime.datetime): the date to start each simulation from.
+            time_limit (int|float): the time limit of each simulation (after which the simulation will terminate) in unit time.
+            max_iterations (int): the upper bound on the number of iterations of each simulation.
+            max_workers (int, optional): the number of worker processes, defaults to the number of processors.
+            seed (int, optional): the root seed of the replicate random generators, None draws fresh entropy from the OS.
+
+        Yields:
+            tuple[int, Trajectory]: the replicate index and the replicate's `Trajectory`, in order of completion.
+        """
+        if not (self.solver_initialized and self.model_initialized):
+            raise ValueError("Model/solver not initialized: initialize model before the solver.")
+
+        replicate_seeds = np.random.SeedSequence(seed).spawn(n_replicates)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_initializeReplicateWorker,
+                                 initargs=(self.model_name, self._classes_dict, self._compartments_dict,
+                                           self._matched_rules_dict, self.propensity_compilation, self.compiled_rules,
+                                           self.solver)) as executor:
+            replicate_futures = {executor.submit(_simulateReplicate, replicate_seed, start_date,
+                                                 time_limit, max_iterations):replicate_i
+                                 for replicate_i, replicate_seed in enumerate(replicate_seeds)}
+            for future in as_completed(replicate_futures):
+                yield replicate_futures[future], future.result()
+
+    def sweep(self, parameter_grid:Iterable[dict[str, dict[str, float]]], n_replicates:int, solver:Solver,
+              start_date:Union[datetime.time, datetime.date, datetime.datetime], time_limit:Union[int, float],
+              max_iterations:int = 10000, max_workers:Optional[int] = 1, seed:Optional[int] = None) -> np.ndarray:
+        """ Simulate n_replicates replicates of the model at every point of a grid of compartment constant values, without rebuilding or
+        recompiling the model: the constants of the compiled rules are rebound per grid point (see `setCompartmentConstants`) and the
+        solver (and its propensity update graph) is initialized once.
+
+        The solver replaces the model's current solver (`initializeSolver(solver)`) and remains the model's solver afterwards.
+
+        Every grid point starts from the current constant values, overridden by the point's values. The current values (and the
+        solver's random generator) are restored afterwards, also if a simulation raises. Replicate r of grid point i uses its own random generator, seeded by the child i*n_replicates+r of
+        `np.random.SeedSequence(seed)`, so a fixed seed gives the same results regardless of max_workers.
+
+        Requires the model to be compiled with propensity_compilation "parameterized" or "codegen" (see `convertToSimulation`).
+
+        Args:
+            parameter_grid (Iterable[dict[str, dict[str, float]]]): the grid points, each compartment name -> constant name -> value.
+            n_replicates (int): the number of replicates per grid point.
+            solver (Solver): the solver to simulate with, set as the model's solver with `initializeSolver`.
+            start_date (datetime.time|datetime.date|datetime.datetime): the date to start each simulation from.
+            time_limit (int|float): the time limit of each simulation in unit time.
+            max_iterations (int): the upper bound on the number of iterations of each simulation.
+            max_workers (int, optional): the number of worker processes (see `simulateReplicates`), None for the number of
+                processors. 1 simulates in this process.
+            seed (int, optional): the root seed of the replicate random generators, None draws fresh entropy from the OS.
+        Returns:
+            np.ndarray: the final class values (`CompartmentsState.values` layout) of every replicate, of shape
+                (number of grid points, n_replicates, number of class values), in parameter_grid order.
+        """
+        if self.propensity_compilation not in ["parameterized", "codegen"]:
+            raise ValueError("Parameter sweeps require parameterized or codegen propensity compilation.")
+        parameter_grid = list(parameter_grid)
+        named_compartments = {compartment.name:compartment for compartment in self.compartments}
+        base_constants = defaultdict(dict)
+        for point_constants in parameter_grid:
+            for compartment_name, constants in point_constants.items():
+                if compartment_name not in named_compartments:
+                    raise ValueError(f"Unknown compartment: {compartment_name}")
+                compartment = named_compartments[compartment_name]
+                for constant_name in constants:
+                    if constant_name not in compartment.compartment_constants:
+                        raise ValueError(f"Constant {constant_name} not defined for compartment {compartment_name}")
+                    base_constants[compartment_name][constant_name] = compartment.compartment_constants[constant_name]
+        grid_constants = [{compartment_name:constants | point_constants.get(compartment_name, {})
+                           for compartment_name, constants in base_constants.items()}
+                          for point_constants in parameter_grid]
+        replicate_seeds = np.random.SeedSequence(seed).spawn(len(parameter_grid)*n_replicates)
+        point_seeds = [replicate_seeds[point_i*n_replicates:(point_i+1)*n_replicates] for point_i in range(len(parameter_grid))]
+
+        self.initializeSolver(solver)
+        sweep_values = np.zeros((len(parameter_grid), n_replicates, len(self.compartments_state.values)), dtype=np.float64)
+        if max_workers == 1:
+            random_source = self.solver._random_source
+            try:
+                for point_i, point_constants in enumerate(grid_constants):
+                    sweep_values[point_i] = _returnSweepPointValues(self, point_constants, point_seeds[point_i], start_date,
+                                                                    time_limit, max_iterations)
+            finally:
+                self.solver._random_source = random_source
+                self.setCompartmentConstants(base_constants)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_initializeReplicateWorker,
+                                     initargs=(self.model_name, self._classes_dict, self._compartments_dict,
+                                               self._matched_rules_dict, self.propensity_compilation, self.compiled_rules,
+                                               self.solver)) as executor:
+                point_futures = {executor.submit(_simulateSweepPoint, point_constants, point_seeds[point_i], start_date,
+                                                 time_limit, max_iterations):point_i
+                                 for point_i, point_constants in enumerate(grid_constants)}
+                for future in as_completed(point_futures):
+                    sweep_values[point_futures[future]] = future.result()
+        return sweep_values
+
     def printSimulationPerformanceStats(self) -> None:
         """ Prints (computational) performance statistics for the current model (since its inception).
         
@@ -349,6 +644,43 @@ class Model:
         print(f"Iterations:\n   Mean: {np.mean(self.simulation_iterations)}, Std: {np.std(self.simulation_iterations)}")
         print(f"Simulation Elapsed Time:\n  Mean: {np.mean(self.simulation_elapsed_times)}, Std: {np.std(self.simulation_elapsed_times)}")
     
+# The model of a `Model.simulateReplicates` worker process, built once per worker by _initializeReplicateWorker.
+_replicate_worker_model:Optional[Model] = None
+
+def _initializeReplicateWorker(model_name:str, classes_dict:dict, compartments_dict:dict,
+                               matched_rules_dict:dict, propensity_compilation:str, compiled_rules:Optional[dict],
+                               solver:Solver) -> None:
+    global _replicate_worker_model
+    model = Model(model_name)
+    model._classes_dict = classes_dict
+    model._compartments_dict = compartments_dict
+    model._matched_rules_dict = matched_rules_dict
+    # Workers reuse the compiled rule artifacts (e.g. the generated propensity module) rather than recompiling them.
+    model.convertToSimulation(propensity_compilation, compiled_rules)
+    solver.debug = False
+    model.initializeSolver(solver)
+    _replicate_worker_model = model
+
+def _simulateReplicate(replicate_seed:np.random.SeedSequence, start_date, time_limit, max_iterations:int) -> Trajectory:
+    _replicate_worker_model.solver._random_source = np.random.default_rng(replicate_seed)
+    return _replicate_worker_model.simulate(start_date, time_limit, max_iterations)
+
+def _returnSweepPointValues(model:Model, point_constants:dict[str, dict[str, float]],
+                            replicate_seeds:list[np.random.SeedSequence], start_date, time_limit,
+                            max_iterations:int) -> np.ndarray:
+    model.setCompartmentConstants(point_constants)
+    point_values = np.zeros((len(replicate_seeds), len(model.compartments_state.values)), dtype=np.float64)
+    for replicate_i, replicate_seed in enumerate(replicate_seeds):
+        model.solver._random_source = np.random.default_rng(replicate_seed)
+        model.simulate(start_date, time_limit, max_iterations)
+        point_values[replicate_i] = model.compartments_state.values
+    return point_values
+
+def _simulateSweepPoint(point_constants:dict[str, dict[str, float]], replicate_seeds:list[np.random.SeedSequence],
+                        start_date, time_limit, max_iterations:int) -> np.ndarray:
+    return _returnSweepPointValues(_replicate_worker_model, point_constants, replicate_seeds, start_date,
+                                   time_limit, max_iterations)
+
 class SolverData:
     def __init__(self, fields:Iterable[str]) -> None:
         self.fields = fields
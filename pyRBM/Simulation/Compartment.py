@@ -1,3 +1,7 @@
+from typing import Optional
+
+import numpy as np
+
 class Compartment:
     def __init__ (self, index, name:str, comp_type, label_mapping,
                   initial_class_values, compartment_constants) -> None:
@@ -7,11 +11,57 @@ class Compartment:
         self.label_mapping = label_mapping
 
         self.initial_class_values = initial_class_values
-        self.class_values = initial_class_values
+        self.class_values = np.array(initial_class_values, dtype=np.float64)
         self.compartment_constants = compartment_constants
 
+        # Set by CompartmentsState, class_values is then a view into the shared state buffer.
+        self.state:Optional["CompartmentsState"] = None
+        self.state_offset:Optional[int] = None
+
+    def bindToState(self, state:"CompartmentsState", state_offset:int) -> None:
+        self.state = state
+        self.state_offset = state_offset
+        self.class_values = state.values[state_offset:state_offset+len(self.initial_class_values)]
+
     def updateCompartmentValues(self, new_values) -> None:
-        self.class_values = new_values
+        if self.state is None:
+            self.class_values = new_values
+        else:
+            self.class_values[:] = new_values
+
+    def reset(self) -> None:
+        if self.state is None:
+            self.class_values = np.array(self.initial_class_values, dtype=np.float64)
+        else:
+            self.class_values[:] = self.initial_class_values
+
+class CompartmentsState:
+    """ A single contiguous float64 buffer holding the class values of every compartment.
+
+    The class values of compartment i are values[offsets[i]:offsets[i+1]] and each bound `Compartment.class_values` is a
+    zero-copy view of that range, so rules and solvers update the model state in place.
+
+    Attributes:
+        offsets (np.ndarray): compartment index -> offset of the compartment's first class value (length num compartments+1).
+        values (np.ndarray): the current class values of all compartments.
+        initial_values (np.ndarray): the initial class values of all compartments.
+    """
+    def __init__(self, compartments:list[Compartment]) -> None:
+        self.offsets = np.zeros(len(compartments)+1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(compartment.initial_class_values) for compartment in compartments])
+        self.initial_values = np.zeros(int(self.offsets[-1]), dtype=np.float64)
+        for comp_i, compartment in enumerate(compartments):
+            self.initial_values[self.offsets[comp_i]:self.offsets[comp_i+1]] = compartment.initial_class_values
+        self.values = self.initial_values.copy()
+
+        for comp_i, compartment in enumerate(compartments):
+            compartment.bindToState(self, int(self.offsets[comp_i]))
 
     def reset(self) -> None:
-        self.class_values = self.initial_class_values
+        self.values[:] = self.initial_values
+
+    def returnSnapshot(self) -> np.ndarray:
+        return self.values.copy()
+
+    def loadSnapshot(self, snapshot:np.ndarray) -> None:
+        self.values[:] = snapshot
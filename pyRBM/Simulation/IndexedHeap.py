@@ -0,0 +1,74 @@
+import numpy as np
+
+class IndexedMinHeap:
+    """ Binary min-heap over a fixed set of integer items (subrule ids 0..size-1) with a key per item, supporting key updates of any item.
+
+    The heap is stored in NumPy arrays: heap[p] is the item at heap position p (children at 2p+1 and 2p+2), positions[i] is the heap
+    position of item i and keys[i] is the key of item i. Every item is always in the heap, items without a key use np.inf.
+
+    Attributes:
+        size (int): the number of items.
+        heap (np.ndarray): heap position -> item.
+        positions (np.ndarray): item -> heap position.
+        keys (np.ndarray): item -> key.
+    """
+    def __init__(self, size:int) -> None:
+        self.size = size
+        self.heap = np.arange(size, dtype=np.int64)
+        self.positions = np.arange(size, dtype=np.int64)
+        self.keys = np.full(size, np.inf, dtype=np.float64)
+
+    def build(self, keys:np.ndarray) -> None:
+        """ Sets the key of every item and rebuilds the heap in O(size log size) (a sorted array is a valid heap).
+        """
+        self.keys[:] = keys
+        self.heap[:] = np.argsort(self.keys, kind="stable")
+        self.positions[self.heap] = np.arange(self.size, dtype=np.int64)
+
+    def returnMin(self) -> tuple[int, float]:
+        """ Returns the item with the smallest key and its key, without removing it.
+        """
+        item = int(self.heap[0])
+        return item, float(self.keys[item])
+
+    def returnKey(self, item:int) -> float:
+        return float(self.keys[item])
+
+    def update(self, item:int, key:float) -> None:
+        """ Sets the key of item and restores the heap order in O(log size).
+        """
+        old_key = self.keys[item]
+        self.keys[item] = key
+        if key < old_key:
+            self._siftUp(int(self.positions[item]))
+        elif key > old_key:
+            self._siftDown(int(self.positions[item]))
+
+    def _swap(self, position_a:int, position_b:int) -> None:
+        heap = self.heap
+        item_a, item_b = heap[position_a], heap[position_b]
+        heap[position_a], heap[position_b] = item_b, item_a
+        self.positions[item_b] = position_a
+        self.positions[item_a] = position_b
+
+    def _siftUp(self, position:int) -> None:
+        heap, keys = self.heap, self.keys
+        while position > 0:
+            parent = (position-1)//2
+            if keys[heap[parent]] <= keys[heap[position]]:
+                break
+            self._swap(position, parent)
+            position = parent
+
+    def _siftDown(self, position:int) -> None:
+        heap, keys = self.heap, self.keys
+        while True:
+            child = 2*position+1
+            if child >= self.size:
+                break
+            if child+1 < self.size and keys[heap[child+1]] < keys[heap[child]]:
+                child += 1
+            if keys[heap[position]] <= keys[heap[child]]:
+                break
+            self._swap(position, child)
+            position = child
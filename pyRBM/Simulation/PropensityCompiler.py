@@ -0,0 +1,239 @@
+import math
+import re
+import types
+from typing import Optional
+
+import numpy as np
+import sympy
+from sympy.printing.numpy import NumPyPrinter
+from sympy.printing.pycode import PythonCodePrinter
+
+from pyRBM.Core.StringUtilities import replaceVarName
+
+_constant_regex = re.compile(r"comp_\w+")
+
+class CompiledSlot:
+    """ The compiled propensity of one slot of a metarule, shared by every compartment and index set the slot is matched to.
+
+    The compartment constants of the slot formula are function arguments (k0, k1, ...) rather than substituted literals, their values
+    are stored in a constants table with one column per row: the compartment index if constant_rows is "compartment" (formulas with
+    comp_ constants), the index set index if constant_rows is "index_set" (formulas with slot_ constants), and no columns if
+    constant_rows is "none".
+
+    Attributes:
+        scalar_function (Callable): evaluates the slot formula on floats (class values, model_ class values then constants).
+        batched_function (Callable): evaluates the slot formula on NumPy arrays.
+        constant_names (list[str]): the constant names (k0, k1, ...) in the slot formula.
+        constants (np.ndarray): the constants table of shape (number of constants, number of rows).
+        constant_rows (str): what the columns of the constants table are indexed by.
+    """
+    def __init__(self, scalar_function, batched_function, constant_names:list[str],
+                 constants:np.ndarray, constant_rows:str) -> None:
+        assert constant_rows in ["none", "compartment", "index_set"]
+        self.scalar_function = scalar_function
+        self.batched_function = batched_function
+        self.constant_names = constant_names
+        self.constant_rows = constant_rows
+        self.setConstants(constants)
+
+    def setConstants(self, constants:np.ndarray) -> None:
+        constants = np.asarray(constants, dtype=np.float64)
+        if constants.size == 0:
+            self.constants = np.zeros((len(self.constant_names), 0), dtype=np.float64)
+        else:
+            self.constants = constants.reshape(len(self.constant_names), -1)
+        # Row -> list of constant values, used by the scalar function.
+        self.constant_lists = self.constants.T.tolist()
+
+    def evaluateScalar(self, *args) -> float:
+        """ Evaluates the slot formula on floats with the scalar function. Invalid float operations (e.g. division by zero), which
+        raise for Python floats, are evaluated with NumPy scalars instead, so the result (e.g. inf for x/0 or nan for 0/0) matches
+        the batched function and the lambdified functions.
+        """
+        try:
+            return self.scalar_function(*args)
+        except (ArithmeticError, ValueError):
+            with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+                return float(self.batched_function(*[np.float64(arg) for arg in args]))
+
+    def returnConstants(self, compartment_index:int, index_set_i:int) -> list:
+        if self.constant_rows == "compartment":
+            return self.constant_lists[compartment_index]
+        elif self.constant_rows == "index_set":
+            return self.constant_lists[index_set_i]
+        return []
+
+def returnConstantRows(formula_str:str) -> str:
+    """ Returns what the constants of formula_str are indexed by, following the formula classification in `Rule`.
+    """
+    if "comp_" not in formula_str and "slot_" not in formula_str:
+        return "none"
+    elif "slot_" not in formula_str:
+        return "compartment"
+    return "index_set"
+
+def parameterizeFormula(formula_str:str) -> tuple[str, list[str]]:
+    """ Replaces every compartment constant (comp_ name, possibly containing slot_ references) in formula_str by a constant argument.
+
+    Returns:
+        tuple[str, list[str]]: the formula with the constants replaced by k0, k1, ... and the replaced constant names in argument order.
+    """
+    constant_names = list(dict.fromkeys(_constant_regex.findall(formula_str)))
+    parameterized_str = formula_str
+    for constant_i, constant_name in enumerate(constant_names):
+        parameterized_str = replaceVarName(parameterized_str, constant_name, f"k{constant_i}", ignore_underscore=False)
+    return parameterized_str, constant_names
+
+def _replaceSlotNames(constant_name:str, compartment_names:list[str]) -> str:
+    # Matches the slot to name substitution of Rule._subsituteConstants.
+    for slot_i, compartment_name in enumerate(compartment_names):
+        constant_name = constant_name.replace(f"slot_{slot_i}", compartment_name)
+    return constant_name
+
+def returnConstantsTable(constant_names:list[str], constant_rows:str, slot_i:int,
+                         rule_index_sets:list[list[int]], compartments, rule_name:str = "") -> np.ndarray:
+    """ Returns the constants table (number of constants, number of rows) of a slot formula, see `CompiledSlot`. Compartments the slot
+    is not matched to have nan constants.
+    """
+    if constant_rows == "none":
+        return np.zeros((len(constant_names), 0), dtype=np.float64)
+
+    def constantValue(compartment, constant_name:str) -> float:
+        if constant_name not in compartment.compartment_constants:
+            raise ValueError(f"Constant {constant_name} not defined for compartment {compartment.name} (Rule name: {rule_name})")
+        return float(compartment.compartment_constants[constant_name])
+
+    if constant_rows == "compartment":
+        constants = np.full((len(constant_names), len(compartments)), np.nan)
+        for comp_i in {index_set[slot_i] for index_set in rule_index_sets}:
+            constants[:, comp_i] = [constantValue(compartments[comp_i], constant_name) for constant_name in constant_names]
+        return constants
+
+    compartment_names = [compartment.name for compartment in compartments]
+    constants = np.zeros((len(constant_names), len(rule_index_sets)), dtype=np.float64)
+    for index_set_i, index_set in enumerate(rule_index_sets):
+        index_set_names = [compartment_names[comp_i] for comp_i in index_set]
+        constants[:, index_set_i] = [constantValue(compartments[index_set[slot_i]], _replaceSlotNames(constant_name, index_set_names))
+                                     for constant_name in constant_names]
+    return constants
+
+def returnSlotExpression(parameterized_str:str, num_symbols:int, num_constants:int) -> sympy.Expr:
+    """ Parses and simplifies a parameterized slot formula with class (x0, x1, ...) and constant (k0, k1, ...) symbols.
+    """
+    local_symbols = {f"x{i}":sympy.Symbol(f"x{i}", real=True) for i in range(num_symbols)}
+    local_symbols.update({f"k{i}":sympy.Symbol(f"k{i}", real=True) for i in range(num_constants)})
+    return sympy.parse_expr(parameterized_str, local_dict=local_symbols).simplify()
+
+def returnSlotFunctionsSource(function_name:str, expression:sympy.Expr, num_symbols:int, num_constants:int) -> str:
+    """ Returns the source of the scalar (math) and batched (NumPy, named function_name+"_batched") functions of a slot expression.
+
+    The scalar function raises on invalid float operations (e.g. division by zero), see `CompiledSlot.evaluateScalar`.
+    """
+    arguments = ", ".join([f"x{i}" for i in range(num_symbols)] + [f"k{i}" for i in range(num_constants)])
+    scalar_expression = PythonCodePrinter({"fully_qualified_modules":True}).doprint(expression)
+    batched_expression = NumPyPrinter().doprint(expression)
+    return (f"def {function_name}({arguments}):\n"
+            f"    return {scalar_expression}\n\n"
+            f"def {function_name}_batched({arguments}):\n"
+            f"    return {batched_expression}\n")
+
+def _floatLiteral(value:float) -> str:
+    return repr(value) if math.isfinite(value) else f"float('{value}')"
+
+def returnPropensityModuleSource(matched_rules_dict:dict, compartments, num_builtin_classes:int,
+                                 model_name:str = "") -> str:
+    """ Generates the source of a Python module holding the compiled propensity of every metarule slot of a model.
+
+    For slot slot_i of rule rule_i the module defines rule_{rule_i}_slot_{slot_i} (scalar, using `math`),
+    rule_{rule_i}_slot_{slot_i}_batched (using NumPy), and the constants table rule_{rule_i}_slot_{slot_i}_constants
+    with its row type rule_{rule_i}_slot_{slot_i}_constant_rows (see `CompiledSlot`).
+
+    Args:
+        matched_rules_dict (dict): the model matched rules dictionary (see `pyRBM.Core.Cache.loadMatchedRules`).
+        compartments (list[Compartment]): the model compartments.
+        num_builtin_classes (int): the number of model_ classes.
+        model_name (str, optional): the model name, used in the module docstring.
+    Returns:
+        str: the module source.
+    """
+    module_body = "".join(returnRuleSource(rule_i, matched_rules_dict[str(rule_i)], compartments, num_builtin_classes)
+                          for rule_i in range(len(matched_rules_dict)))
+    return returnPropensityModuleHeader(module_body, model_name) + module_body
+
+def returnPropensityModuleHeader(module_body:str, model_name:str = "") -> str:
+    """ Returns the docstring and imports of a generated propensity module with the rule sources module_body. functools is only
+    imported if the body uses it (NumPy Max and Min are printed as functools.reduce).
+    """
+    functools_import = "import functools\n" if "functools." in module_body else ""
+    return (f'""" Propensity functions of the model {model_name}, generated by pyRBM.Simulation.PropensityCompiler. """\n'
+            f"{functools_import}import math\n\nimport numpy\n\n")
+
+def returnRuleSource(rule_i:int, rule_dict:dict, compartments, num_builtin_classes:int) -> str:
+    """ Returns the generated propensity module source of every slot of rule rule_i (see `returnPropensityModuleSource`), without
+    the module header, so rules can be generated independently (e.g. in parallel) and joined.
+    """
+    source = [f"# {rule_dict['rule_name']}\n"]
+    for slot_i, formula_str in enumerate(rule_dict["propensity"]):
+        function_name = f"rule_{rule_i}_slot_{slot_i}"
+        num_symbols = len(rule_dict["stoichiomety"][slot_i]) + num_builtin_classes
+        expression, constant_names, constant_rows, constants = returnParameterizedSlot(formula_str, slot_i, num_symbols,
+                                                                                       rule_dict["matching_indices"],
+                                                                                       compartments, rule_dict["rule_name"])
+
+        source.append(returnSlotFunctionsSource(function_name, expression, num_symbols, len(constant_names)))
+        source.append(f"\n{function_name}_constant_names = {constant_names!r}\n")
+        source.append(f"{function_name}_constant_rows = {constant_rows!r}\n")
+        constants_source = ",\n    ".join("[" + ", ".join(_floatLiteral(value) for value in row) + "]"
+                                           for row in constants.tolist())
+        source.append(f"{function_name}_constants = [\n    {constants_source}]\n\n" if constants_source != ""
+                      else f"{function_name}_constants = []\n\n")
+    return "".join(source)
+
+def returnParameterizedSlot(formula_str:str, slot_i:int, num_symbols:int, rule_index_sets:list[list[int]],
+                            compartments, rule_name:str = "") -> tuple[sympy.Expr, list[str], str, np.ndarray]:
+    """ Parameterizes a slot formula (see `parameterizeFormula`), and returns its simplified expression, constant names, constant row
+    type and constants table (see `CompiledSlot`).
+    """
+    parameterized_str, constant_names = parameterizeFormula(formula_str)
+    constant_rows = returnConstantRows(formula_str)
+    constants = returnConstantsTable(constant_names, constant_rows, slot_i, rule_index_sets, compartments, rule_name)
+    return returnSlotExpression(parameterized_str, num_symbols, len(constant_names)), constant_names, constant_rows, constants
+
+def returnParameterizedSlots(propensity:list[str], stoichiometry:list[np.ndarray], num_builtin_classes:int,
+                             rule_index_sets:list[list[int]], compartments, rule_name:str = "") -> list[CompiledSlot]:
+    """ Returns the `CompiledSlot` of every slot of a rule by lambdifying each parameterized slot formula once, without generating a
+    module (the "parameterized" compilation of `pyRBM.Core.Model.Model.convertToSimulation`). Invalid float operations are handled
+    by `CompiledSlot.evaluateScalar`, as for the generated functions.
+    """
+    compiled_slots = []
+    for slot_i, formula_str in enumerate(propensity):
+        num_symbols = len(stoichiometry[slot_i]) + num_builtin_classes
+        expression, constant_names, constant_rows, constants = returnParameterizedSlot(formula_str, slot_i, num_symbols,
+                                                                                       rule_index_sets, compartments, rule_name)
+        arguments = sympy.symbols([f"x{i}" for i in range(num_symbols)] + [f"k{i}" for i in range(len(constant_names))], real=True)
+        compiled_slots.append(CompiledSlot(sympy.lambdify(arguments, expression, "math"),
+                                           sympy.lambdify(arguments, expression, "numpy"),
+                                           constant_names, constants, constant_rows))
+    return compiled_slots
+
+def loadPropensityModule(source:str, module_name:str = "pyrbm_propensities",
+                         filename:Optional[str] = None) -> types.ModuleType:
+    """ Executes generated propensity module source (see `returnPropensityModuleSource`) once and returns the module.
+    """
+    module = types.ModuleType(module_name)
+    module.__file__ = filename if filename is not None else f"<{module_name}>"
+    exec(compile(source, module.__file__, "exec"), module.__dict__)
+    return module
+
+def returnCompiledSlots(propensity_module:types.ModuleType, rule_i:int, num_slots:int) -> list[CompiledSlot]:
+    """ Returns the `CompiledSlot` of every slot of rule rule_i from a loaded propensity module.
+    """
+    compiled_slots = []
+    for slot_i in range(num_slots):
+        function_name = f"rule_{rule_i}_slot_{slot_i}"
+        compiled_slots.append(CompiledSlot(getattr(propensity_module, function_name),
+                                           getattr(propensity_module, f"{function_name}_batched"),
+                                           getattr(propensity_module, f"{function_name}_constant_names"),
+                                           np.array(getattr(propensity_module, f"{function_name}_constants"), dtype=np.float64),
+                                           getattr(propensity_module, f"{function_name}_constant_rows")))
+    return compiled_slots
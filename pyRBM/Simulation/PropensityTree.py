@@ -0,0 +1,60 @@
+import numpy as np
+
+class PropensitySumTree:
+    """ Binary sum tree over subrule propensities, used for logarithmic time event selection.
+
+    The tree is stored in a single float64 array: node 1 is the root, node i has children 2i and 2i+1 and
+    the leaf of subrule s is node num_leaves+s. Internal nodes are recomputed from their children rather than
+    updated by differences, so the total does not drift as propensities are updated.
+
+    Attributes:
+        size (int): the number of subrules (leaves in use).
+        num_leaves (int): the number of leaves, the smallest power of two >= size.
+        tree (np.ndarray): the array backed binary tree of length 2*num_leaves.
+    """
+    def __init__(self, size:int) -> None:
+        self.size = size
+        self.num_leaves = 1 << max(0, (size-1).bit_length())
+        self.tree = np.zeros(2*self.num_leaves, dtype=np.float64)
+
+    def rebuild(self, propensities:np.ndarray) -> None:
+        """ Set every leaf from `propensities` and recompute all internal nodes, level by level, in O(size).
+        """
+        tree = self.tree
+        tree[:] = 0
+        tree[self.num_leaves:self.num_leaves+self.size] = propensities
+        level_start = self.num_leaves
+        while level_start > 1:
+            parent_start = level_start//2
+            tree[parent_start:level_start] = tree[level_start:2*level_start:2] + tree[level_start+1:2*level_start:2]
+            level_start = parent_start
+
+    def update(self, subrule_i:int, propensity:float) -> None:
+        """ Set the leaf of `subrule_i` and recompute its ancestors in O(log size).
+        """
+        tree = self.tree
+        node = subrule_i + self.num_leaves
+        tree[node] = propensity
+        node //= 2
+        while node >= 1:
+            tree[node] = tree[2*node] + tree[2*node+1]
+            node //= 2
+
+    def returnTotal(self) -> float:
+        return float(self.tree[1])
+
+    def search(self, random_propensity:float) -> int:
+        """ Returns the subrule whose cumulative propensity interval contains `random_propensity` with a single
+        descent from the root. Subrules with zero propensity are never selected unless random_propensity
+        exceeds the total due to numerical precision, callers should check the selected subrule's propensity.
+        """
+        tree = self.tree
+        node = 1
+        while node < self.num_leaves:
+            left_propensity = tree[2*node]
+            if random_propensity < left_propensity:
+                node = 2*node
+            else:
+                random_propensity -= left_propensity
+                node = 2*node+1
+        return node - self.num_leaves
@@ -1,71 +1,134 @@
+import functools
 import re
-from typing import Optional
+from typing import Callable, Optional
 
 import numpy as np
 import sympy
 
 from pyRBM.Simulation.Compartment import Compartment
 from pyRBM.Core.StringUtilities import replaceVarName
+from pyRBM.Simulation.PropensityCompiler import CompiledSlot, parameterizeFormula, returnConstantRows, returnConstantsTable
 #from pyRBM.Simulation.WaitTimeDistributions import processDistribFunction
+
+# Class symbols (x0, x1, ...) of a parameterized formula, as opposed to its constant symbols (k0, k1, ...).
+_class_symbol_regex = re.compile(r"x\d+")
+
+# The maximum number of lazily lambdified propensity functions kept (shared by all rules).
+LAZY_PROPENSITY_CACHE_SIZE = 16384
+
+@functools.lru_cache(maxsize=LAZY_PROPENSITY_CACHE_SIZE)
+def _lambdifySubstitutedFormula(formula_str:str, num_symbols:int):
+    formula_symbols = sympy.symbols(''.join([f"x{str(i)} " for i in range(num_symbols)]), real=True)
+    return sympy.lambdify(formula_symbols, sympy.parse_expr(formula_str).simplify(), "numpy")
+
+class LazyPropensityFunctions:
+    """ Compartment (or index set) index -> propensity function of a slot formula with compartment constants, used in place of the
+    eagerly lambdified dictionary of a rule slot.
+
+    A function is only compiled when it is first evaluated: the formula with the constants of the index substituted is memoized per
+    index, and its lambdified function is memoized in a bounded least recently used cache keyed by the substituted formula (shared by
+    all rules, see LAZY_PROPENSITY_CACHE_SIZE), so compartments with identical substituted formulas share a function.
+
+    Args:
+        substitute_constants (Callable[[int], str]): returns the slot formula with the constants of an index substituted.
+        num_symbols (int): the number of formula symbols (slot classes and model_ classes).
+    """
+    def __init__(self, substitute_constants:Callable[[int], str], num_symbols:int) -> None:
+        self._substitute_constants = substitute_constants
+        self.num_symbols = num_symbols
+        self._formula_strs:dict[int, str] = {}
+
+    def __getitem__(self, index:int):
+        formula_str = self._formula_strs.get(index)
+        if formula_str is None:
+            formula_str = self._formula_strs[index] = self._substitute_constants(index)
+        return _lambdifySubstitutedFormula(formula_str, self.num_symbols)
+
 class Rule:
     def __init__(self, propensity:list[str],
                  stoichiometry:list[np.ndarray],
                  rule_name:str, num_builtin_classes:int,
                  compartments:list[Compartment],
-                 rule_index_sets:list[list[int]], event_time_distrib_and_args:str = None) -> None:
+                 rule_index_sets:list[list[int]], event_time_distrib_and_args:str = None,
+                 compiled_slots:Optional[list[CompiledSlot]] = None,
+                 rule_artifacts:Optional[dict] = None, lazy_compilation:bool = False) -> None:
 
         assert len(stoichiometry) == len(propensity)
+        assert compiled_slots is None or len(compiled_slots) == len(propensity)
+        # With compiled slots (see pyRBM.Simulation.PropensityCompiler) no per compartment functions are lambdified.
+        self.compiled_slots = compiled_slots
+        # With lazy compilation, per compartment (or index set) functions are lambdified on first evaluation (see
+        # LazyPropensityFunctions) rather than all at construction.
+        # With rule artifacts (see returnArtifacts), e.g. from the compiled model cache, no sympy analysis of the formulas is done.
         compartment_names = [compartment.name for compartment in compartments]
         if isinstance(propensity, (list)):
             self.lambda_propensities = []
             self.contains_compartment_constant = []
             self.contains_slot_match_constant = []
-            self.sympy_formula = []
-            comp_prop_dict = None
+            # Formula strings with the constants of an example set of locations substituted, parsed by the sympy_formula property.
+            self._example_formula_strs = []
+            # Per slot: compartment (or index set) index -> interned function group and the group functions, None unless the slot
+            # has eagerly lambdified functions with compartment constants.
+            self.slot_function_groups = []
+            self.slot_group_functions = []
 
             for slot_i, formula_str in enumerate(propensity):
-                symbol_string = ''.join([f"x{str(i)} "
-                                         for i in range(len(stoichiometry[slot_i])+num_builtin_classes)])
-                formula_symbols = sympy.symbols(symbol_string, real=True)
+                comp_prop_dict = None
+                self.slot_function_groups.append(None)
+                self.slot_group_functions.append(None)
+                if compiled_slots is None:
+                    symbol_string = ''.join([f"x{str(i)} "
+                                             for i in range(len(stoichiometry[slot_i])+num_builtin_classes)])
+                    formula_symbols = sympy.symbols(symbol_string, real=True)
                 # We only need one propensity function for this rule.
                 if "comp_" not in formula_str and "slot_" not in formula_str:
-                    formula = sympy.parse_expr(formula_str)
-                    self.sympy_formula.append(formula)
-                    comp_prop_dict=sympy.lambdify(formula_symbols, formula.simplify(), "numpy")
+                    self._example_formula_strs.append(formula_str)
+                    if compiled_slots is None:
+                        comp_prop_dict=sympy.lambdify(formula_symbols, sympy.parse_expr(formula_str).simplify(), "numpy")
                     self.contains_compartment_constant.append(False)
                     self.contains_slot_match_constant.append(False)
                 # We need multiple propensity functions for this rule as we have compartment specific information.
                 elif "slot_" not in formula_str:
                     applicable_indices = self._findIndices(rule_index_sets, slot_i)
                     #formula_without_constants = self.subsituteConstants(formula_str, {key:"" for key in list(compartments[applicable_indices[0]].compartment_constants.keys())})
-                    comp_prop_dict = {comp_index: sympy.lambdify(formula_symbols,
-                                        sympy.parse_expr(self._subsituteConstants(formula_str, compartments[comp_index].compartment_constants,
-                                                                                  None)).simplify(),
-                                                        "numpy")
-                                        for comp_index in applicable_indices}
-
-                    # self.sympy_formula is used for precomputing rules only and uses an example set of locations - should not be used
-                    # generally.
-                    self.sympy_formula.append(sympy.parse_expr(self._subsituteConstants(formula_str,
-                                                compartments[applicable_indices[0]].compartment_constants,
-                                                None)))
+                    if compiled_slots is None and lazy_compilation:
+                        comp_prop_dict = LazyPropensityFunctions(
+                            lambda comp_index, formula_str=formula_str: self._subsituteConstants(formula_str,
+                                                                                                 compartments[comp_index].compartment_constants,
+                                                                                                 None),
+                            len(stoichiometry[slot_i])+num_builtin_classes)
+                    elif compiled_slots is None:
+                        comp_prop_dict = self._lambdifyInterned({comp_index:self._subsituteConstants(formula_str,
+                                                                                                     compartments[comp_index].compartment_constants,
+                                                                                                     None)
+                                                                 for comp_index in applicable_indices},
+                                                                formula_symbols, len(compartments))
+
+                    self._example_formula_strs.append(self._subsituteConstants(formula_str,
+                                                      compartments[applicable_indices[0]].compartment_constants,
+                                                      None))
 
                     self.contains_compartment_constant.append(True)
                     self.contains_slot_match_constant.append(False)
 
                 else:
                     #formula_without_constants = self.subsituteConstants(formula_str, {key:"" for key in list(compartments[applicable_indices[0]].compartment_constants.keys())})
-                    comp_prop_dict = {comp_index: sympy.lambdify(formula_symbols,
-                                        sympy.parse_expr(self._subsituteConstants(formula_str, compartments[index_set[slot_i]].compartment_constants,
-                                                                                  np.take(compartment_names, rule_index_sets[comp_index]))).simplify(),
-                                                        "numpy")
-                                        for comp_index, index_set in enumerate(rule_index_sets)}
-
-                    # self.sympy_formula is used for precomputing rules only and uses an example set of locations - should not be used
-                    # generally.
-                    self.sympy_formula.append(sympy.parse_expr(self._subsituteConstants(formula_str,
-                                                compartments[rule_index_sets[0][slot_i]].compartment_constants,
-                                                np.take(compartment_names, rule_index_sets[0]))))
+                    if compiled_slots is None and lazy_compilation:
+                        comp_prop_dict = LazyPropensityFunctions(
+                            lambda index_set_i, formula_str=formula_str, slot_i=slot_i: self._subsituteConstants(
+                                formula_str, compartments[rule_index_sets[index_set_i][slot_i]].compartment_constants,
+                                np.take(compartment_names, rule_index_sets[index_set_i])),
+                            len(stoichiometry[slot_i])+num_builtin_classes)
+                    elif compiled_slots is None:
+                        comp_prop_dict = self._lambdifyInterned({comp_index:self._subsituteConstants(formula_str,
+                                                                                                     compartments[index_set[slot_i]].compartment_constants,
+                                                                                                     np.take(compartment_names, rule_index_sets[comp_index]))
+                                                                 for comp_index, index_set in enumerate(rule_index_sets)},
+                                                                formula_symbols, len(rule_index_sets))
+
+                    self._example_formula_strs.append(self._subsituteConstants(formula_str,
+                                                      compartments[rule_index_sets[0][slot_i]].compartment_constants,
+                                                      np.take(compartment_names, rule_index_sets[0])))
 
                     self.contains_compartment_constant.append(True)
                     self.contains_slot_match_constant.append(True)
@@ -75,12 +138,64 @@ class Rule:
             #self.propensity_function = lambda x, comp : np.dot(x, self.propensity_matrix[comp])
         else:
             raise ValueError("Unsupported Propensity in Model Loading")
+        self._sympy_formula = None
+        # The unsubstituted formulas and the compartments, used to analyse the class monotonicity on first access.
+        self._propensity_strs = list(propensity)
+        self._compartments = compartments
+        self._class_monotonicity = None
+        self._monotone_propensity = None
         self.rule_name = rule_name
         self.stoichiometry = stoichiometry
+        # Index set index -> compartment index for each slot, used for batched propensity evaluation.
+        self.index_sets = np.array(rule_index_sets, dtype=np.int64)
+        self._precomputeStateChanges(compartments)
+        if rule_artifacts is None:
+            self._precomputeSlotSymbols()
+        else:
+            self._loadArtifacts(rule_artifacts)
         self.contains_compartment_constant = np.array(self.contains_compartment_constant)
         self.contains_slot_match_constant = np.array(self.contains_slot_match_constant)
 
         #processDistribFunction(random_source ,event_time_distrib_and_args)
+    def updateCompartmentConstants(self, compartments:list[Compartment]) -> None:
+        """ Rereads the constants tables of the compiled slots from the compartments' compartment_constants, so changed constant values
+        are used without recompiling the slot functions. Requires compiled slots (parameterized or codegen propensity compilation).
+        """
+        if self.compiled_slots is None:
+            raise ValueError(f"Rule {self.rule_name} has no compiled slots: constants are substituted into its propensity functions.")
+        rule_index_sets = self.index_sets.tolist()
+        for slot_i, compiled_slot in enumerate(self.compiled_slots):
+            if compiled_slot.constant_rows != "none":
+                compiled_slot.setConstants(returnConstantsTable(compiled_slot.constant_names, compiled_slot.constant_rows, slot_i,
+                                                                rule_index_sets, compartments, self.rule_name))
+        # The signs of the constants may have changed.
+        self._compartments = compartments
+        self._class_monotonicity = None
+        self._monotone_propensity = None
+
+    def _lambdifyInterned(self, formula_strs:dict[int, str], formula_symbols, num_keys:int) -> dict:
+        """ Lambdifies the substituted slot formula of every compartment (or index set) index in formula_strs, interning textually
+        identical formulas (e.g. compartments with the same constant values) so they are parsed, simplified and lambdified once and
+        share one function. Records the function group of each index for batched evaluation in the current slot of
+        `self.slot_function_groups` and `self.slot_group_functions`.
+
+        Returns:
+            dict: compartment (or index set) index -> propensity function.
+        """
+        interned_groups:dict[str, int] = {}
+        group_functions = []
+        function_groups = np.full(num_keys, -1, dtype=np.int64)
+        for key, formula_str in formula_strs.items():
+            canonical_str = "".join(formula_str.split())
+            group_i = interned_groups.get(canonical_str)
+            if group_i is None:
+                group_i = interned_groups[canonical_str] = len(group_functions)
+                group_functions.append(sympy.lambdify(formula_symbols, sympy.parse_expr(formula_str).simplify(), "numpy"))
+            function_groups[key] = group_i
+        self.slot_function_groups[-1] = function_groups
+        self.slot_group_functions[-1] = group_functions
+        return {key:group_functions[group_i] for key, group_i in zip(formula_strs, function_groups[list(formula_strs)].tolist())}
+
     def _subsituteConstants(self, formula_str:str, compartment_constants:Optional[dict], compartments_names:Optional[list]) -> str:
         # The slot to name substitution is performed prior to constant to value substitution,
         # to allow for constant with slot_ to be formed.
@@ -97,6 +212,152 @@ class Rule:
                                              ignore_underscore = False)
         return out_formula
 
+    def _precomputeStateChanges(self, compartments:list[Compartment]) -> None:
+        """ Precomputes the (offset, delta) pairs into the shared `CompartmentsState` buffer that triggering each index set applies.
+
+        Every index set changes the same classes of its slot compartments, so the deltas are shared by all index sets and only the
+        offsets (index set index -> state buffer offsets) depend on the index set.
+        """
+        compartment_offsets = np.array([compartment.state_offset for compartment in compartments], dtype=np.int64)
+        # Index set index -> state buffer offset of each slot compartment.
+        self.index_set_state_offsets = compartment_offsets[self.index_sets]
+
+        change_offsets = []
+        change_deltas = []
+        for slot_i, slot_stoichiometry in enumerate(self.stoichiometry):
+            changed_classes = np.flatnonzero(slot_stoichiometry)
+            change_offsets.append(self.index_set_state_offsets[:, slot_i:slot_i+1] + changed_classes)
+            change_deltas.append(np.asarray(slot_stoichiometry, dtype=np.float64)[changed_classes])
+        self.state_change_offsets = np.concatenate(change_offsets, axis=1)
+        self.state_change_deltas = np.concatenate(change_deltas)
+
+    @property
+    def sympy_formula(self) -> list[sympy.Expr]:
+        """ The sympy expression of every slot formula, parsed on first access.
+
+        Formulas with compartment constants use the constants of an example set of locations, so these are for analysing rules
+        (e.g. which classes a formula uses) only and should not be used generally.
+        """
+        if self._sympy_formula is None:
+            self._sympy_formula = [sympy.parse_expr(formula_str) for formula_str in self._example_formula_strs]
+        return self._sympy_formula
+
+    def _precomputeSlotSymbols(self) -> None:
+        """ Sets `self.slot_symbol_indices`, the sorted symbol indices (x{i}) used by every slot formula, where indices from the
+        number of classes of the slot onwards refer to model_ classes.
+
+        The parameterized formula (see `pyRBM.Simulation.PropensityCompiler.parameterizeFormula`) is used, with the compartment
+        constants kept as symbols, so a class is not dropped when it is multiplied by a constant that is 0 in some compartment (the
+        propensity update graph would otherwise never refresh the subrule once the constant is changed).
+        """
+        self.slot_symbol_indices = []
+        for slot_i, formula_str in enumerate(self._propensity_strs):
+            try:
+                formula = sympy.parse_expr(parameterizeFormula(formula_str)[0])
+            except (SyntaxError, TypeError, ValueError):
+                # e.g. slot_ references outside of compartment constants.
+                formula = self.sympy_formula[slot_i]
+            self.slot_symbol_indices.append(np.array(sorted(int(str(symbol)[1:]) for symbol in formula.atoms(sympy.Symbol)
+                                                            if _class_symbol_regex.fullmatch(str(symbol))), dtype=np.int64))
+
+    def returnArtifacts(self) -> dict:
+        """ Returns the results of the sympy analysis of the rule formulas as a JSON serializable dictionary, which can be passed back
+        to the Rule constructor as rule_artifacts (for the same propensities and compartments) to skip the analysis. The class
+        monotonicity is only included if it has already been computed.
+        """
+        artifacts = {"slot_symbol_indices":[symbol_indices.tolist() for symbol_indices in self.slot_symbol_indices]}
+        if self._class_monotonicity is not None:
+            artifacts["class_monotonicity"] = [slot_monotonicity.tolist() for slot_monotonicity in self._class_monotonicity]
+            artifacts["monotone_propensity"] = self._monotone_propensity
+        return artifacts
+
+    def _loadArtifacts(self, rule_artifacts:dict) -> None:
+        self.slot_symbol_indices = [np.array(symbol_indices, dtype=np.int64) for symbol_indices in rule_artifacts["slot_symbol_indices"]]
+        if "class_monotonicity" in rule_artifacts:
+            self._class_monotonicity = [np.array(slot_monotonicity, dtype=np.int64)
+                                        for slot_monotonicity in rule_artifacts["class_monotonicity"]]
+            self._monotone_propensity = bool(rule_artifacts["monotone_propensity"])
+
+    @property
+    def class_monotonicity(self) -> list[np.ndarray]:
+        """ Per slot, whether the formula is non-decreasing (1), non-increasing (-1) or independent (0) of each of the slot
+        compartment's classes, computed on first access (see `_computeClassMonotonicity`).
+        """
+        if self._class_monotonicity is None:
+            self._computeClassMonotonicity()
+        return self._class_monotonicity
+
+    @property
+    def monotone_propensity(self) -> bool:
+        """ Whether the direction of every class in `class_monotonicity` could be determined, computed on first access.
+        """
+        if self._monotone_propensity is None:
+            self._computeClassMonotonicity()
+        return self._monotone_propensity
+
+    def _returnConstantSymbols(self, slot_i:int, constant_names:list[str]) -> dict:
+        """ Returns constant name (k0, k1, ...) -> a symbol with the sign shared by every value of the constant in the matched
+        compartments (or index sets), or a real symbol if the values have different signs.
+        """
+        constants = returnConstantsTable(constant_names, returnConstantRows(self._propensity_strs[slot_i]), slot_i,
+                                         self.index_sets.tolist(), self._compartments, self.rule_name)
+        constant_symbols = {}
+        for constant_i, constant_values in enumerate(constants):
+            constant_values = constant_values[~np.isnan(constant_values)]
+            symbol_name = f"k{constant_i}"
+            if np.all(constant_values > 0):
+                constant_symbols[symbol_name] = sympy.Symbol(symbol_name, positive=True)
+            elif np.all(constant_values < 0):
+                constant_symbols[symbol_name] = sympy.Symbol(symbol_name, negative=True)
+            elif np.all(constant_values == 0):
+                constant_symbols[symbol_name] = sympy.Integer(0)
+            elif np.all(constant_values >= 0):
+                constant_symbols[symbol_name] = sympy.Symbol(symbol_name, nonnegative=True)
+            elif np.all(constant_values <= 0):
+                constant_symbols[symbol_name] = sympy.Symbol(symbol_name, nonpositive=True)
+            else:
+                constant_symbols[symbol_name] = sympy.Symbol(symbol_name, real=True)
+        return constant_symbols
+
+    def _computeClassMonotonicity(self) -> None:
+        """ Determines, for every slot formula, whether it is non-decreasing (1), non-increasing (-1) or independent (0) of each of
+        the slot compartment's classes, for positive class values. Sets `self.monotone_propensity` to False if the direction of any
+        class could not be determined.
+
+        The parameterized formula (see `pyRBM.Simulation.PropensityCompiler.parameterizeFormula`) is analysed, with the compartment
+        constants as free symbols that only carry the sign of their values, so the result holds for every compartment. Only solvers
+        that bound propensities (`pyRBM.Simulation.Solvers.RSSASolver`) use this, so it is not computed when the rule is built.
+        """
+        self._class_monotonicity = []
+        self._monotone_propensity = True
+        for slot_i, formula_str in enumerate(self._propensity_strs):
+            num_classes = len(self.stoichiometry[slot_i])
+            slot_monotonicity = np.zeros(num_classes, dtype=np.int64)
+            parameterized_str, constant_names = parameterizeFormula(formula_str)
+            local_symbols = {f"x{class_index}":sympy.Symbol(f"x{class_index}", positive=True)
+                             for class_index in self.slot_symbol_indices[slot_i].tolist()}
+            local_symbols.update(self._returnConstantSymbols(slot_i, constant_names))
+            try:
+                formula = sympy.parse_expr(parameterized_str, local_dict=local_symbols)
+            except (SyntaxError, TypeError, ValueError):
+                # e.g. slot_ references outside of compartment constants.
+                self._monotone_propensity = False
+                self._class_monotonicity.append(slot_monotonicity)
+                continue
+            for class_index in self.slot_symbol_indices[slot_i].tolist():
+                if class_index >= num_classes:
+                    continue
+                derivative = sympy.factor(sympy.together(sympy.diff(formula, local_symbols[f"x{class_index}"])))
+                if derivative.is_zero:
+                    continue
+                elif derivative.is_nonnegative:
+                    slot_monotonicity[class_index] = 1
+                elif derivative.is_nonpositive:
+                    slot_monotonicity[class_index] = -1
+                else:
+                    self._monotone_propensity = False
+            self._class_monotonicity.append(slot_monotonicity)
+
     def _findIndices(self, rule_index_sets:list[list[int]], slot_index:int) -> list[int]:
         possible_indices = set()
 
@@ -119,6 +380,13 @@ class Rule:
         assert(len(compartments) == len(self.stoichiometry))
         # Assume product operation.
         propensity = 1
+        if self.compiled_slots is not None:
+            for comp_i, compartment in enumerate(compartments):
+                compiled_slot = self.compiled_slots[comp_i]
+                propensity *= max(0, compiled_slot.evaluateScalar(*compartment.class_values.tolist(), *builtin_classes,
+                                                                   *compiled_slot.returnConstants(compartment.index, index_set_i)))
+            assert propensity >= 0
+            return propensity
         for comp_i, compartment in enumerate(compartments):
             # Apply thresholding here to ensure that no negative propensities are used.
             # print(self.lambda_propensities[comp_i](*compartment.class_values, *builtin_classes))
@@ -137,6 +405,120 @@ class Rule:
         assert propensity >= 0
         return propensity
 
+    def returnPropensities(self, state_values:np.ndarray, builtin_classes,
+                           index_set_indices:Optional[np.ndarray] = None) -> np.ndarray:
+        """ Batched version of `returnPropensity`, returns the propensity of every index set in index_set_indices (all index sets if None).
+
+        The class values of each slot are gathered from the state buffer into one array per class, so each slot formula is evaluated
+        once as a NumPy array expression. Formulas with compartment constants are evaluated once per distinct compartment in the slot
+        and formulas with slot_ constants once per index set.
+
+        Args:
+            state_values (np.ndarray): the class values of all compartments (`CompartmentsState.values`), or a stack of them with
+                leading batch dimensions (e.g. one row per ensemble replicate).
+            builtin_classes (list): the current model_ class values (shared by the whole batch).
+            index_set_indices (np.ndarray, optional): the index sets to evaluate the propensity of.
+        Returns:
+            np.ndarray: the propensity of each requested index set, of shape state_values.shape[:-1]+(len(index_set_indices),).
+        """
+        if index_set_indices is None:
+            index_set_indices = np.arange(len(self.index_sets))
+        batch_shape = state_values.shape[:-1]
+        propensities = np.ones(batch_shape+(len(index_set_indices),), dtype=np.float64)
+
+        # Invalid operations (e.g. 0/0) are thresholded to 0 by np.fmax as max(0, nan) is in returnPropensity.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for slot_i in range(len(self.stoichiometry)):
+                class_values = self._gatherSlotClassValues(state_values, slot_i, index_set_indices)
+                propensities *= np.fmax(self._returnSlotPropensities(slot_i, class_values, builtin_classes,
+                                                                     index_set_indices, batch_shape), 0)
+        return propensities
+
+    def returnPropensityBounds(self, lower_values:np.ndarray, upper_values:np.ndarray, builtin_classes,
+                               index_set_indices:Optional[np.ndarray] = None) -> tuple[np.ndarray, np.ndarray]:
+        """ Returns lower and upper bounds on the propensity of every index set in index_set_indices (all index sets if None) over all
+        states with class values between lower_values and upper_values. Each slot formula is evaluated at the two corners of the box
+        given by `self.class_monotonicity`, so the bounds are only valid if `self.monotone_propensity` is True.
+
+        Args:
+            lower_values (np.ndarray): lower bound of every class value in the state buffer.
+            upper_values (np.ndarray): upper bound of every class value in the state buffer.
+            builtin_classes (list): the current model_ class values.
+            index_set_indices (np.ndarray, optional): the index sets to bound the propensity of.
+        Returns:
+            tuple[np.ndarray, np.ndarray]: the lower and upper propensity bound of each requested index set.
+        """
+        if index_set_indices is None:
+            index_set_indices = np.arange(len(self.index_sets))
+        lower_propensities = np.ones(len(index_set_indices), dtype=np.float64)
+        upper_propensities = np.ones(len(index_set_indices), dtype=np.float64)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for slot_i in range(len(self.stoichiometry)):
+                lower_class_values = self._gatherSlotClassValues(lower_values, slot_i, index_set_indices)
+                upper_class_values = self._gatherSlotClassValues(upper_values, slot_i, index_set_indices)
+                decreasing = (self.class_monotonicity[slot_i] < 0)[:, None]
+                lower_corner = np.where(decreasing, upper_class_values, lower_class_values)
+                upper_corner = np.where(decreasing, lower_class_values, upper_class_values)
+                lower_propensities *= np.fmax(self._returnSlotPropensities(slot_i, lower_corner, builtin_classes,
+                                                                           index_set_indices, ()), 0)
+                upper_propensities *= np.fmax(self._returnSlotPropensities(slot_i, upper_corner, builtin_classes,
+                                                                           index_set_indices, ()), 0)
+        return lower_propensities, upper_propensities
+
+    def _gatherSlotClassValues(self, state_values:np.ndarray, slot_i:int, index_set_indices:np.ndarray) -> np.ndarray:
+        """ Returns class index -> class values of the slot compartment of each index set (batch dimensions after the class index).
+        """
+        slot_state_offsets = self.index_set_state_offsets[index_set_indices, slot_i]
+        return np.moveaxis(state_values[..., np.arange(len(self.stoichiometry[slot_i]))[:, None] + slot_state_offsets], -2, 0)
+
+    def _returnSlotPropensities(self, slot_i:int, class_values:np.ndarray, builtin_classes,
+                                index_set_indices:np.ndarray, batch_shape:tuple) -> np.ndarray:
+        if self.compiled_slots is not None:
+            compiled_slot = self.compiled_slots[slot_i]
+            if compiled_slot.constant_rows == "compartment":
+                constants = compiled_slot.constants[:, self.index_sets[index_set_indices, slot_i]]
+            elif compiled_slot.constant_rows == "index_set":
+                constants = compiled_slot.constants[:, index_set_indices]
+            else:
+                constants = ()
+            # Functions simplified to a constant return a scalar, so the result is broadcast to the batch shape.
+            return np.broadcast_to(compiled_slot.batched_function(*class_values, *builtin_classes, *constants),
+                                   batch_shape+(len(index_set_indices),))
+        if not self.contains_compartment_constant[slot_i]:
+            return self.lambda_propensities[slot_i](*class_values, *builtin_classes)
+        # Group the index sets by the function of their slot compartment (or index set), and evaluate each function once.
+        keys = index_set_indices if self.contains_slot_match_constant[slot_i] else self.index_sets[index_set_indices, slot_i]
+        if self.slot_function_groups[slot_i] is not None:
+            groups = self.slot_function_groups[slot_i][keys]
+            group_functions = self.slot_group_functions[slot_i]
+        else:
+            groups = keys
+            group_functions = self.lambda_propensities[slot_i]
+        slot_propensities = np.empty(batch_shape+(len(index_set_indices),), dtype=np.float64)
+        group_order = np.argsort(groups, kind="stable")
+        group_starts = np.flatnonzero(np.diff(groups[group_order])) + 1
+        for group in np.split(group_order, group_starts):
+            # Functions simplified to a constant return a scalar, which the assignment broadcasts.
+            slot_propensities[..., group] = group_functions[int(groups[group[0]])](*class_values[..., group], *builtin_classes)
+        return slot_propensities
+
+    def triggerStateChange(self, state_values:np.ndarray, index_set_i:int,
+                           times_triggered:int = 1, allow_negative:bool = True) -> bool:
+        """ Applies the rule triggered times_triggered times with index set index_set_i as an in-place scatter-add into state_values,
+        the `CompartmentsState` buffer.
+
+        Returns:
+            bool: False (leaving state_values unchanged) if allow_negative is False and the change would give a negative class value, True otherwise.
+        """
+        offsets = self.state_change_offsets[index_set_i]
+        changes = times_triggered*self.state_change_deltas
+        if not allow_negative and np.any(state_values[offsets] + changes < 0):
+            return False
+        # Offsets are unique within an index set (distinct compartments and classes) so no accumulation is required.
+        state_values[offsets] += changes
+        return True
+
     # We expect pure Gillespie to have 0 propensity for negative rule changes, however with Tau leaping we may need
     # to check whether a series of rule changes leads to negative values.
     def triggerAttemptedRuleChange(self, compartments,
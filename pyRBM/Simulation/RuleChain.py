@@ -3,54 +3,126 @@
 # Use stoichiometry information to determine which
 from collections import defaultdict
 
-import sympy
+import numpy as np
 
-def _classToRuleDict(rules, compartments, matched_indices, base_classes):
+def returnSubruleOffsets(matched_indices) -> np.ndarray:
+    """ Returns the flat subrule numbering used by the solvers and the propensity update graph.
+
+    The subrule (rule_i, index_set_i) has the integer id offsets[rule_i]+index_set_i and the final entry of the
+    returned array is the total number of subrules.
+    """
+    offsets = np.zeros(len(matched_indices)+1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(index_sets) for index_sets in matched_indices])
+    return offsets
+
+class PropensityUpdateGraph:
+    """ Integer representation of the one step rule update map, used for propensity caching.
+
+    The subrules that require an updated propensity after subrule i triggers are stored in compressed sparse row
+    format, `indices[indptr[i]:indptr[i+1]]`. Subrules that require an update after a model_ class changes
+    are stored as an integer array per model_ class.
+
+    Attributes:
+        num_subrules (int): the number of subrules in the flat subrule numbering (see `returnSubruleOffsets`).
+        indptr (np.ndarray): CSR row pointer of length num_subrules+1.
+        indices (np.ndarray): CSR column indices (dependent subrule ids).
+        model_class_dependents (dict): model_ class name -> integer array of dependent subrule ids.
+    """
+    def __init__(self, subrule_dependents:dict[int, set[int]],
+                 model_class_dependents:dict[str, set[int]], num_subrules:int) -> None:
+        self.num_subrules = num_subrules
+
+        dependent_lengths = [len(subrule_dependents.get(subrule_i, ())) for subrule_i in range(num_subrules)]
+        self.indptr = np.zeros(num_subrules+1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum(dependent_lengths)
+        self.indices = np.fromiter((dependent for subrule_i in range(num_subrules)
+                                    for dependent in sorted(subrule_dependents.get(subrule_i, ()))),
+                                   dtype=np.int64, count=int(self.indptr[-1]))
+
+        self.model_class_dependents = {model_class:np.array(sorted(dependents), dtype=np.int64)
+                                       for model_class, dependents in model_class_dependents.items()}
+        self._no_dependents = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def fromArrays(cls, indptr:np.ndarray, indices:np.ndarray,
+                   model_class_dependents:dict[str, np.ndarray]) -> "PropensityUpdateGraph":
+        """ Returns the graph with the given CSR arrays and model_ class dependents (e.g. as saved by the compiled model cache).
+        """
+        graph = cls({}, {}, 0)
+        graph.num_subrules = len(indptr)-1
+        graph.indptr = np.asarray(indptr, dtype=np.int64)
+        graph.indices = np.asarray(indices, dtype=np.int64)
+        graph.model_class_dependents = {model_class:np.asarray(dependents, dtype=np.int64)
+                                        for model_class, dependents in model_class_dependents.items()}
+        return graph
+
+    def returnSubruleDependents(self, subrule_i:int) -> np.ndarray:
+        return self.indices[self.indptr[subrule_i]:self.indptr[subrule_i+1]]
+
+    def returnModelClassDependents(self, model_class:str) -> np.ndarray:
+        return self.model_class_dependents.get(model_class, self._no_dependents)
+
+    def returnModelClasses(self) -> list[str]:
+        return list(self.model_class_dependents.keys())
+
+    def withSelfDependencies(self) -> "PropensityUpdateGraph":
+        """ Returns a copy of the graph where every subrule is also a dependent of itself
+        (used by solvers that must redraw the time of the triggered subrule).
+        """
+        subrule_dependents = {subrule_i:set(self.returnSubruleDependents(subrule_i).tolist())|{subrule_i}
+                              for subrule_i in range(self.num_subrules)}
+        model_class_dependents = {model_class:set(dependents.tolist())
+                                  for model_class, dependents in self.model_class_dependents.items()}
+        return PropensityUpdateGraph(subrule_dependents, model_class_dependents, self.num_subrules)
+
+def _classToRuleDict(rules, compartments, matched_indices, base_classes, subrule_offsets):
     ctr_dict = defaultdict(set)
     base_ctr_dict = defaultdict(set)
     for rule_i in range(len(matched_indices)):
         rule = rules[rule_i]
         for index_set_i in range(len(matched_indices[rule_i])):
+            subrule_i = int(subrule_offsets[rule_i])+index_set_i
             for slot_i, comp_i in enumerate(matched_indices[rule_i][index_set_i]):
                 comp_classes_num = len(compartments[comp_i].class_values)
-                comp_symbols = rule.sympy_formula[slot_i].atoms(sympy.Symbol)
                 #rtc_dict[f"{rule_i} {index_set_i}"].update([f"{str(symbol)} {comp_i}" for symbol in comp_symbols])
-                
-                for symbol in comp_symbols:
-                    class_index = int(str(symbol)[1:])
+
+                for class_index in rule.slot_symbol_indices[slot_i].tolist():
                     if class_index < comp_classes_num:
-                        ctr_dict[f"{str(symbol)} {comp_i}"].add((rule_i, index_set_i))
+                        ctr_dict[f"x{class_index} {comp_i}"].add(subrule_i)
                     else:
-                        base_ctr_dict[base_classes[class_index-comp_classes_num]].add((rule_i, index_set_i))
+                        base_ctr_dict[base_classes[class_index-comp_classes_num]].add(subrule_i)
     return ctr_dict, base_ctr_dict
 
 # Use propensity infomation to determine which rules require updating based on a change in class value
-def _ruleToClassesDict(rules, matched_indices):
+def _ruleToClassesDict(rules, matched_indices, subrule_offsets):
     rtc_dict = defaultdict(set)
     for rule_i in range(len(matched_indices)):
         rule = rules[rule_i]
         for index_set_i in range(len(matched_indices[rule_i])):
+            subrule_i = int(subrule_offsets[rule_i])+index_set_i
             for slot_i, comp_i in enumerate(matched_indices[rule_i][index_set_i]):
                 #rtc_dict[f"{rule_i} {index_set_i}"].update([f"{str(symbol)} {comp_i}" for symbol in comp_symbols])
-                rtc_dict[f"{rule_i} {index_set_i}"].update([f"x{i} {comp_i}"
-                                                            for i in range(len(rule.stoichiometry[slot_i]))
-                                                            if not rule.stoichiometry[slot_i][i] == 0])
+                rtc_dict[subrule_i].update([f"x{i} {comp_i}"
+                                            for i in range(len(rule.stoichiometry[slot_i]))
+                                            if not rule.stoichiometry[slot_i][i] == 0])
     return rtc_dict
 
-# Returns a dictionary that maps a rule index to a set of all rule indices that have a changed propensity after a rule trigger.
+# Returns a dictionary that maps a subrule id to a set of all subrule ids that have a changed propensity after a rule trigger.
 def _ruleToRule(rtc_dict, ctr_dict):
-    rtr_dict = {rule_compartment_key:set()
-                for rule_compartment_key in rtc_dict}
+    rtr_dict = {subrule_i:set()
+                for subrule_i in rtc_dict}
+
+    for subrule_i in rtr_dict:
+        for class_comp in rtc_dict[subrule_i]:
+            rtr_dict[subrule_i].update(ctr_dict[class_comp])
 
-    for rule_compartment_key in rtr_dict:
-        for class_comp in rtc_dict[rule_compartment_key]:
-            rtr_dict[rule_compartment_key].update(ctr_dict[class_comp])
-    
     return rtr_dict
 
 def returnOneStepRuleUpdates(rules, compartments,
-                             matched_indices, base_classes):
-    rtc_dict = _ruleToClassesDict(rules, matched_indices)
+                             matched_indices, base_classes) -> PropensityUpdateGraph:
+    subrule_offsets = returnSubruleOffsets(matched_indices)
+    rtc_dict = _ruleToClassesDict(rules, matched_indices, subrule_offsets)
     ctr_dict, base_ctr_dict = _classToRuleDict(rules, compartments,
-                                               matched_indices, base_classes)
-    return _ruleToRule(rtc_dict, ctr_dict)|base_ctr_dict
+                                               matched_indices, base_classes, subrule_offsets)
+    return PropensityUpdateGraph(_ruleToRule(rtc_dict, ctr_dict), base_ctr_dict,
+                                 int(subrule_offsets[-1]))
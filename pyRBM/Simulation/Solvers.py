@@ -1,17 +1,25 @@
+import math
 from typing import Optional, Callable, Union
 from typing_extensions import override
 
-import indexed_priority_queue
 import numpy as np
 import sympy
 from pyRBM.Simulation.State import ModelState
+from pyRBM.Simulation.RuleChain import PropensityUpdateGraph, returnSubruleOffsets
+from pyRBM.Simulation.PropensityTree import PropensitySumTree
+from pyRBM.Simulation.IndexedHeap import IndexedMinHeap
+from pyRBM.Simulation.Stoichiometry import StoichiometryMatrix
 #from pyRBM.Simulation.WaitTimeDistributions import returnDistribFunctions
 
 class Solver:
     def __init__(self, use_cached_propensities:bool = True,
                  no_rules_behaviour:str = "step", debug:bool = True,
-                 random_generator=None, default_time_step=1) -> None:
+                 random_generator=None, default_time_step=1,
+                 batch_propensity_threshold:Optional[int] = 32) -> None:
         self.use_cached_propensities = use_cached_propensities
+        # Full refreshes and propensity updates of at least this many subrules use batched (per rule) evaluation,
+        # None always updates subrule by subrule.
+        self.batch_propensity_threshold = batch_propensity_threshold
 
         # Either step or exit
         assert (no_rules_behaviour in ["step", "end"])
@@ -20,11 +28,11 @@ class Solver:
         self.debug = debug
         self._random_source = np.random.default_rng(random_generator)
     
-    def hasFutureNonZeroPropensity(self, rules_to_check):
+    def hasFutureNonZeroPropensity(self, subrules_to_check):
 
-        for rule_index in rules_to_check:
-            rule, index_set = rule_index.split(" ")
-            partial_evaluation = self.rules[int(rule)].partial_evaluation(self.matched_indices[int(index_set)])
+        for subrule_i in subrules_to_check:
+            rule_i, index_set_i = self.subrule_rules[subrule_i], self.subrule_index_sets[subrule_i]
+            partial_evaluation = self.rules[rule_i].partial_evaluation(self.matched_indices[rule_i][index_set_i])
             if isinstance(partial_evaluation, (sympy.core.numbers.Float, sympy.core.numbers.Zero)):
                 return True
         return False
@@ -41,11 +49,10 @@ class Solver:
         
         # Only the model state variables change, if we partially evaluate
         elif self.no_rules_behaviour == "analyse":
-            rules_to_check = set()
-            for key in self.propensity_update_dict:
-                if "model_" in key:
-                    rules_to_check.update(self.propensity_update_dict[key])
-            if self.hasFutureNonZeroPropensity(rules_to_check):
+            subrules_to_check = set()
+            for model_class in self.propensity_update_dict.returnModelClasses():
+                subrules_to_check.update(self.propensity_update_dict.returnModelClassDependents(model_class).tolist())
+            if self.hasFutureNonZeroPropensity(subrules_to_check):
                 self.collectStats(None, None, 0)
                 self.continue_prior_step = True
                 return current_time + self.default_step
@@ -55,23 +62,40 @@ class Solver:
     
     def initialize(self, compartments, rules,
                    matched_indices, model_state:ModelState,
-                   propensity_update_dict:Optional[dict] = None) -> None:
+                   propensity_update_dict:Optional[PropensityUpdateGraph] = None) -> None:
+        # Attributes set before the first initialization are the solver configuration (see __getstate__).
+        if not hasattr(self, "_configuration_attributes"):
+            self._configuration_attributes = frozenset(self.__dict__)|{"_configuration_attributes"}
         self.compartments = compartments
         self.rules = rules
         self.matched_indices = matched_indices
         self.model_state = model_state
-        # Read as propensity_update_dict if not None, otherwise a blank dictionary, avoids mutable default value
         if self.no_rules_behaviour == "analyse" and propensity_update_dict is None:
             raise ValueError("Please provide the propensity_update_dict to use self.no_rules_behaviour == 'analyse'")
+        if self.use_cached_propensities and propensity_update_dict is None:
+            raise ValueError("Please provide the propensity_update_dict to use cached propensities")
         if self.no_rules_behaviour:
             self.continue_prior_step = False
-        self.propensity_update_dict = propensity_update_dict if propensity_update_dict is not None else {}
+        self.propensity_update_dict = propensity_update_dict
+
+        # Flat subrule numbering: subrule (rule_i, index_set_i) has id subrule_offsets[rule_i]+index_set_i.
+        self.subrule_offsets = returnSubruleOffsets(matched_indices)
+        self.num_subrules = int(self.subrule_offsets[-1])
+        subrule_counts = np.diff(self.subrule_offsets)
+        self.subrule_rules = np.repeat(np.arange(len(matched_indices), dtype=np.int64), subrule_counts)
+        self.subrule_index_sets = np.arange(self.num_subrules, dtype=np.int64) - np.repeat(self.subrule_offsets[:-1],
+                                                                                            subrule_counts)
+        # Compartments of each subrule (for scalar propensity evaluation) and the shared class values buffer that rules update in place.
+        self.subrule_compartments = [tuple(compartments[comp_i] for comp_i in index_set)
+                                     for rule_index_sets in matched_indices for index_set in rule_index_sets]
+        self.state_values = compartments[0].state.values
+        self.stoichiometry_matrix = StoichiometryMatrix(rules, self.subrule_offsets, len(self.state_values))
 
         self.reset()
 
     def reset(self) -> None:
-        self.propensities = {}
-        self.last_rule_index_set = []
+        self.propensities = np.zeros(self.num_subrules, dtype=np.float64)
+        self.last_fired_subrules = []
         if self.use_cached_propensities:
             self.total_propensity = 0
 
@@ -79,67 +103,139 @@ class Solver:
         if self.debug:
             self.current_stats = {}
 
+    def __getstate__(self) -> dict:
+        """ Only the solver configuration is pickled (rules hold lambdified propensity functions which cannot be pickled),
+        an unpickled solver must be initialized again (`Model.initializeSolver`) before use.
+        """
+        if not hasattr(self, "_configuration_attributes"):
+            return self.__dict__.copy()
+        return {attribute:value for attribute, value in self.__dict__.items()
+                if attribute in self._configuration_attributes}
+
     def simulateOneStep(self):
         raise(NotImplementedError("Abstract class Solver, please use a concrete implementation."))
-    
-    def postSimulationActions(self, selected_rule, selected_index_set, total_propensity):
+
+    def simulateEnsembleStep(self, ensemble_values:np.ndarray, current_time):
+        """ Advances every replicate (each row of ensemble_values, a stack of `CompartmentsState.values`) in place by one common
+        time step and returns the new time. Only implemented by solvers with steps common to all replicates, used by `Model.simulateEnsemble`.
+        """
+        raise(NotImplementedError(f"{type(self).__name__} does not support lockstep ensemble simulation, please use a solver with common steps (e.g. TauLeapSolver or ODESolver)."))
+
+    def returnEnsemblePropensities(self, ensemble_values:np.ndarray, model_state_values:list) -> np.ndarray:
+        """ Returns the propensity of every subrule for every replicate, of shape (number of replicates, number of subrules).
+        """
+        propensities = np.zeros((len(ensemble_values), self.num_subrules), dtype=np.float64)
+        for rule_i, rule in enumerate(self.rules):
+            rule_start, rule_end = self.subrule_offsets[rule_i], self.subrule_offsets[rule_i+1]
+            if rule_end > rule_start:
+                propensities[:, rule_start:rule_end] = rule.returnPropensities(ensemble_values, model_state_values)
+        return propensities
+
+    def returnSubruleCompartments(self, subrule_i:int):
+        return self.subrule_compartments[subrule_i]
+
+    def triggerSubrule(self, subrule_i:int, times_triggered:int = 1, allow_negative:bool = True) -> bool:
+        """ Applies the state change of subrule_i (times_triggered times) in place to the compartments state buffer.
+        """
+        return self.rules[self.subrule_rules[subrule_i]].triggerStateChange(self.state_values, self.subrule_index_sets[subrule_i],
+                                                                            times_triggered, allow_negative)
+
+    def postSimulationActions(self, subrule_i:int, total_propensity):
         if self.debug:
-            self.collectStats(int(selected_rule),
-                              int(selected_index_set),
+            self.collectStats(int(self.subrule_rules[subrule_i]),
+                              int(self.subrule_index_sets[subrule_i]),
                               total_propensity)
         if self.use_cached_propensities:
-            self.last_rule_index_set.append(f"{selected_rule} {selected_index_set}")
+            self.last_fired_subrules.append(subrule_i)
         # We have successfully triggered a rule, we should not assume that we are not in an absorbing state anymore
         # and rerun the analysis step again.
         if self.no_rules_behaviour == "analyse":
             self.continue_prior_step = False
             
-    # rules_and_matched_indices is used to determine which propensities to recompute, if None is provided this is all propensities.
-    # returns total propensity
+    # subrules is used to determine which propensities to recompute, if None is provided this is all propensities.
 
-    def updateGivenPropensities(self, update_propensity_func:Callable[[int, int, list], None],
-                                rules_and_matched_indices:Optional[tuple[int, int]] = None) -> None:
+    def updateGivenPropensities(self, update_propensity_func:Callable[[int, list], None],
+                                subrules:Optional[np.ndarray] = None) -> None:
         model_state_values = list(self.model_state.returnModelClassesValues())
 
-        if rules_and_matched_indices is None:
-            for rule_i in range(len(self.matched_indices)):
-                for index_set_i in range(len(self.matched_indices[rule_i])):
-                    update_propensity_func(rule_i, index_set_i, model_state_values)
+        # Batched evaluation only replaces the default update function, solvers with their own update function
+        # (e.g. NRM time updates) are updated subrule by subrule.
+        if (update_propensity_func == self.updateGivenPropensity and self.batch_propensity_threshold is not None
+            and (subrules is None or len(subrules) >= self.batch_propensity_threshold)):
+            self.updateGivenPropensitiesBatched(model_state_values, subrules)
+        elif subrules is None:
+            for subrule_i in range(self.num_subrules):
+                update_propensity_func(subrule_i, model_state_values)
         else:
-            for rule_i, index_set_i in rules_and_matched_indices:
-                update_propensity_func(rule_i, index_set_i, model_state_values)
-
-
-    def updateGivenPropensity(self, rule_i:int, index_set_i:int,
-                              model_state_values:list) -> None:
-        rule = self.rules[rule_i]
-        new_propensity = rule.returnPropensity(np.take(self.compartments,
-                                                       self.matched_indices[rule_i][index_set_i]),
-                                                       model_state_values, index_set_i)
+            for subrule_i in subrules.tolist():
+                update_propensity_func(subrule_i, model_state_values)
+
+
+    def updateGivenPropensitiesBatched(self, model_state_values:list,
+                                       subrules:Optional[np.ndarray] = None) -> None:
+        """ Recomputes the propensities of subrules (all subrules if None) with one `Rule.returnPropensities` call per rule.
+        """
+        if subrules is None:
+            for rule_i, rule in enumerate(self.rules):
+                rule_subrules = np.arange(self.subrule_offsets[rule_i], self.subrule_offsets[rule_i+1])
+                if len(rule_subrules) > 0:
+                    self.setSubrulePropensities(rule_subrules,
+                                                rule.returnPropensities(self.state_values, model_state_values))
+        else:
+            # Group the subrules by rule.
+            subrule_rules = self.subrule_rules[subrules]
+            rule_order = np.argsort(subrule_rules, kind="stable")
+            rule_starts = np.flatnonzero(np.diff(subrule_rules[rule_order])) + 1
+            for rule_subrules in np.split(subrules[rule_order], rule_starts):
+                rule = self.rules[self.subrule_rules[rule_subrules[0]]]
+                self.setSubrulePropensities(rule_subrules,
+                                            rule.returnPropensities(self.state_values, model_state_values,
+                                                                    self.subrule_index_sets[rule_subrules]))
+
+    def setSubrulePropensities(self, subrules:np.ndarray, new_propensities:np.ndarray) -> None:
+        """ Array equivalent of the store performed at the end of `updateGivenPropensity`.
+        """
         if self.use_cached_propensities:
-            propensity_diff = (new_propensity - self.propensities.get(f"{rule_i} {index_set_i}", 0.0))
-            self.total_propensity += propensity_diff
-        self.propensities[f"{rule_i} {index_set_i}"] = new_propensity
-
-    def performPropensityUpdates(self, update_propensity_func:Callable[[int, int, list], None]) -> None:
-        if self.use_cached_propensities and len(self.last_rule_index_set) > 0:
-            rule_prop_update_set = {}
-            for rule_index in self.last_rule_index_set:
-                rule_prop_update_set = self.propensity_update_dict[rule_index]
-            changed_model_vars = self.model_state.returnChangedVars()
-            if len(changed_model_vars) > 0:
-                rule_prop_update_set = rule_prop_update_set.copy()
-                for changed_var in changed_model_vars:
-                    rule_prop_update_set.update(self.propensity_update_dict[changed_var])
-
+            self.total_propensity += float(np.sum(new_propensities - self.propensities[subrules]))
+        self.propensities[subrules] = new_propensities
+
+    def updateGivenPropensity(self, subrule_i:int, model_state_values:list) -> None:
+        rule_i = self.subrule_rules[subrule_i]
+        index_set_i = self.subrule_index_sets[subrule_i]
+        new_propensity = self.rules[rule_i].returnPropensity(self.subrule_compartments[subrule_i],
+                                                             model_state_values, index_set_i)
+        if self.use_cached_propensities:
+            self.total_propensity += new_propensity - self.propensities[subrule_i]
+        self.propensities[subrule_i] = new_propensity
+
+    def returnSubrulesToUpdate(self) -> np.ndarray:
+        """ Returns the ids of the subrules whose propensity is changed by the subrules triggered in the last step
+        and by any change in the model_ classes.
+        """
+        subrules_to_update = [self.propensity_update_dict.returnSubruleDependents(subrule_i)
+                              for subrule_i in self.last_fired_subrules]
+        for changed_var in self.model_state.returnChangedVars():
+            subrules_to_update.append(self.propensity_update_dict.returnModelClassDependents(changed_var))
+
+        if len(subrules_to_update) == 1:
+            return subrules_to_update[0]
+        return np.unique(np.concatenate(subrules_to_update))
+
+    def performPropensityUpdates(self, update_propensity_func:Callable[[int, list], None]) -> None:
+        if self.use_cached_propensities and len(self.last_fired_subrules) > 0:
             self.updateGivenPropensities(update_propensity_func,
-                                         rule_prop_update_set)
+                                         self.returnSubrulesToUpdate())
         else:
             self.updateGivenPropensities(update_propensity_func)
-        # List of the rule/subrule pair that is triggered during this step.
-        self.last_rule_index_set = []
+        # List of the subrules triggered during this step.
+        self.last_fired_subrules = []
 
 
+    def returnStatsFields(self) -> list[str]:
+        """ Returns the keys of the debug stats written to `self.current_stats` by `collectStats`.
+        """
+        return ["rule_triggered", "rule_index_set", "total_propensity"]
+
     def collectStats(self, rule:int, index_set:int, total_propensity) -> None:
         assert(self.debug)
         self.current_stats["rule_triggered"] = str(rule)
@@ -149,19 +245,66 @@ class Solver:
     # CACHE TOTAL PROPENSITY AND UPDATE USING DIFF BETWEEN OLD AND NEW CACHE VALUES.
     def returnTotalPropensity(self) -> Union[float, int]:
         if not self.use_cached_propensities:
-            return sum(list(self.propensities.values()))
+            return float(self.propensities.sum())
         else:
             return self.total_propensity
         
 class GillespieSolver(Solver):
     """ Gillespie Direct Method.
     Fastest implemented exact simulation algorithm and the most commonly used. 
+
+    With selection_method = "linear" the next subrule is found with a cumulative search over all subrule propensities (O(number of subrules)
+    per event). With selection_method = "tree" a `PropensitySumTree` is kept over the subrule propensities, each propensity update costs
+    O(log(number of subrules)) and selection is a single tree descent, preferable for models with a large number of subrules.
     """
     def __init__(self, use_cached_propensities:bool = True,
-                 no_rules_behaviour:str = "step", debug:bool = True) -> None:
+                 no_rules_behaviour:str = "step", debug:bool = True,
+                 selection_method:str = "linear") -> None:
         super().__init__(use_cached_propensities, no_rules_behaviour, debug)
+        assert selection_method in ["linear", "tree"]
+        self.selection_method = selection_method
         self.update_propensity_function = self.updateGivenPropensity
 
+    @override
+    def reset(self) -> None:
+        super().reset()
+        if self.selection_method == "tree":
+            self.propensity_tree = PropensitySumTree(self.num_subrules)
+
+    @override
+    def updateGivenPropensities(self, update_propensity_func:Callable[[int, list], None],
+                                subrules:Optional[np.ndarray] = None) -> None:
+        super().updateGivenPropensities(update_propensity_func, subrules)
+        if self.selection_method == "tree":
+            # A full recompute rebuilds the tree level by level rather than performing an O(log n) update per subrule.
+            if subrules is None:
+                self.propensity_tree.rebuild(self.propensities)
+            else:
+                for subrule_i in subrules.tolist():
+                    self.propensity_tree.update(subrule_i, self.propensities[subrule_i])
+
+    @override
+    def returnTotalPropensity(self) -> Union[float, int]:
+        if self.selection_method == "tree":
+            return self.propensity_tree.returnTotal()
+        return super().returnTotalPropensity()
+
+    def selectSubrule(self, random_propensity:float) -> Optional[int]:
+        """ Returns the first subrule whose cumulative propensity exceeds random_propensity, or None if no subrule is found
+        (due to numerical precision errors).
+        """
+        if self.selection_method == "tree":
+            selected_subrule = self.propensity_tree.search(random_propensity)
+            if selected_subrule >= self.num_subrules or self.propensities[selected_subrule] <= 0:
+                return None
+            return selected_subrule
+
+        cumulative_propensities = np.cumsum(self.propensities)
+        selected_subrule = int(np.searchsorted(cumulative_propensities, random_propensity, side="right"))
+        if selected_subrule >= self.num_subrules:
+            return None
+        return selected_subrule
+
     def simulateOneStep(self, current_time):
         self.performPropensityUpdates(self.update_propensity_function)
         
@@ -175,159 +318,285 @@ class GillespieSolver(Solver):
         u1, r2 = self._random_source.random(2)
         u2 = (-np.log(r2))/total_propensity
         # Random time
-        cumulative_prop = 0
-        selected_rule_index = None
-        for rule_comp_key, rule_comp_propensity in self.propensities.items():
-            cumulative_prop += rule_comp_propensity
-            if cumulative_prop > u1*total_propensity:
-               selected_rule_index = rule_comp_key
-               break
+        selected_subrule = self.selectSubrule(u1*total_propensity)
         # No rule has been selected as even though total_propensity is non-zero, this is
         # likely due to numerical precision errors.
-        if selected_rule_index is None:
+        if selected_subrule is None:
             return self.processNoRuleEvent(current_time)
 
-        selected_rule, selected_compartments = selected_rule_index.split(" ")
-        assert self.rules[int(selected_rule)].triggerAttemptedRuleChange(np.take(self.compartments,
-                                                                                  self.matched_indices[int(selected_rule)]
-                                                                                  [int(selected_compartments)]))
+        assert self.triggerSubrule(selected_subrule)
         
-        self.postSimulationActions(int(selected_rule), int(selected_compartments), total_propensity)
+        self.postSimulationActions(selected_subrule, total_propensity)
 
         return current_time + u2
 
+class SortingDirectSolver(GillespieSolver):
+    """ Sorting Direct Method (McCollum et al., 2006) and Optimized Direct Method (Cao et al., 2004).
+
+    A variant of the Gillespie Direct Method where the cumulative search visits subrules in order of how often they trigger, so
+    when a small number of subrules trigger most events the search usually ends after a few entries.
+
+    With sorting_method = "dynamic" a triggered subrule is swapped with the subrule directly before it in the search order. With
+    sorting_method = "warm_up" the firing frequency of every subrule is counted for the first warm_up_steps events and the search
+    order is then sorted by it once. The search order is kept between simulations of the same model.
+
+    The running average search depth (number of subrules visited per selection) is reported in the debug stats as "average_search_depth".
+    """
+    def __init__(self, use_cached_propensities:bool = True,
+                 no_rules_behaviour:str = "step", debug:bool = True,
+                 sorting_method:str = "dynamic", warm_up_steps:int = 1000) -> None:
+        super().__init__(use_cached_propensities, no_rules_behaviour, debug)
+        assert sorting_method in ["dynamic", "warm_up"]
+        self.sorting_method = sorting_method
+        self.warm_up_steps = warm_up_steps
+
+    @override
+    def initialize(self, compartments, rules, matched_indices, model_state:ModelState,
+                   propensity_update_dict:Optional[PropensityUpdateGraph] = None) -> None:
+        super().initialize(compartments, rules, matched_indices, model_state, propensity_update_dict)
+        # Search position -> subrule and subrule -> search position.
+        self.search_order = list(range(self.num_subrules))
+        self.search_positions = list(range(self.num_subrules))
+        self.warm_up_counts = np.zeros(self.num_subrules, dtype=np.int64)
+        self.warm_up_events = 0
+
+    @override
+    def reset(self) -> None:
+        super().reset()
+        self.total_search_depth = 0
+        self.searches = 0
+
+    def returnAverageSearchDepth(self) -> float:
+        return self.total_search_depth/self.searches if self.searches > 0 else 0.0
+
+    def _sortSearchOrder(self) -> None:
+        self.search_order = np.argsort(-self.warm_up_counts, kind="stable").tolist()
+        for position, subrule_i in enumerate(self.search_order):
+            self.search_positions[subrule_i] = position
+
+    @override
+    def selectSubrule(self, random_propensity:float) -> Optional[int]:
+        cumulative_propensity = 0
+        selected_subrule = None
+        propensities = self.propensities
+        for position, subrule_i in enumerate(self.search_order):
+            cumulative_propensity += propensities[subrule_i]
+            if cumulative_propensity > random_propensity:
+                selected_subrule = subrule_i
+                break
+        if selected_subrule is None:
+            return None
+
+        self.total_search_depth += position+1
+        self.searches += 1
+
+        if self.sorting_method == "dynamic":
+            # Bubble the selected subrule one place towards the front of the search.
+            if position > 0:
+                previous_subrule = self.search_order[position-1]
+                self.search_order[position-1] = selected_subrule
+                self.search_order[position] = previous_subrule
+                self.search_positions[selected_subrule] = position-1
+                self.search_positions[previous_subrule] = position
+        elif self.warm_up_events < self.warm_up_steps:
+            self.warm_up_counts[selected_subrule] += 1
+            self.warm_up_events += 1
+            if self.warm_up_events == self.warm_up_steps:
+                self._sortSearchOrder()
+        return selected_subrule
+
+    @override
+    def returnStatsFields(self) -> list[str]:
+        return super().returnStatsFields() + ["average_search_depth"]
+
+    @override
+    def collectStats(self, rule:int, index_set:int, total_propensity) -> None:
+        super().collectStats(rule, index_set, total_propensity)
+        self.current_stats["average_search_depth"] = self.returnAverageSearchDepth()
+
 class GillespieFRMSolver(Solver):
     """ Gillespie First Reaction method.
     Prefer the Gillespie Solver in almost all cases as the direct method is faster.
+
+    With selection_method = "linear" every step draws a time for every subrule, computed with one masked division over the propensity
+    array, and triggers the subrule with the earliest time (argmin).
+
+    With selection_method = "batched" (requires cached propensities) the candidate times are sorted once and reused for the following
+    events. After each event only the triggered subrule and the subrules whose propensity changed draw new times, these are kept in a
+    pending set and the earliest of the next unchanged sorted candidate and the pending subrules is triggered. The times of unchanged
+    subrules remain valid by the memorylessness of the exponential distribution, so the method stays exact. The candidates are resorted
+    once more than resort_interval subrules are pending.
     """
     def __init__(self, use_cached_propensities:bool = True,
-                 no_rules_behaviour:str = "step", debug:bool = True) -> None:
+                 no_rules_behaviour:str = "step", debug:bool = True,
+                 selection_method:str = "linear", resort_interval:int = 256) -> None:
         super().__init__(use_cached_propensities, no_rules_behaviour, debug)
+        assert selection_method in ["linear", "batched"]
+        assert selection_method == "linear" or use_cached_propensities
+        self.selection_method = selection_method
+        self.resort_interval = resort_interval
         self.update_propensity_function = self.updateGivenPropensity
 
+    @override
+    def reset(self) -> None:
+        super().reset()
+        if self.selection_method == "batched":
+            self.event_times = np.full(self.num_subrules, np.inf)
+            self.sorted_subrules = np.zeros(0, dtype=np.int64)
+            self.sorted_position = 0
+            self.redrawn = np.zeros(self.num_subrules, dtype=bool)
+            self.pending_subrules = np.zeros(0, dtype=np.int64)
+
+    def returnCandidateTimes(self, propensities:np.ndarray) -> np.ndarray:
+        """ Returns an exponentially distributed time for every propensity (inf for non-positive propensities).
+        """
+        random_times = self._random_source.exponential(size=len(propensities))
+        candidate_times = np.full(len(propensities), np.inf)
+        np.divide(random_times, propensities, out=candidate_times, where=propensities > 0)
+        return candidate_times
+
     def simulateOneStep(self, current_time):
-        self.performPropensityUpdates(self.update_propensity_function)
+        if self.selection_method == "batched":
+            return self.simulateBatchedStep(current_time)
 
-        # Generate a random number for each subrule, this will be used to calculate the next event time
-        r_i = -np.log(self._random_source.random(len(self.propensities)))
+        self.performPropensityUpdates(self.update_propensity_function)
 
-        min_time = None
-        min_rule_index = None
-        # Calculate the next event time and save the minimum event time and the rule/subrule index set that has that minimum time.
-        for index, (rule_comp_key, rule_comp_propensity) in enumerate(self.propensities.items()):
-            if rule_comp_propensity > 0:
-                time = r_i[index]/rule_comp_propensity
-                # If this is the first iteration, set the min_time = time, otherwise if time < min_time, update it.
-                if min_time is None or time < min_time:
-                    min_time = time
-                    min_rule_index = rule_comp_key
+        candidate_times = self.returnCandidateTimes(self.propensities)
+        min_subrule = int(np.argmin(candidate_times))
+        min_time = candidate_times[min_subrule]
 
-        # No rule has been selected as even though total_propensity is non-zero, this is
-        # likely due to numerical precision errors.
-        if min_rule_index is None:
+        # No rule has been selected as all propensities are 0.
+        if min_time == np.inf:
             return self.processNoRuleEvent(current_time)
 
-        selected_rule, selected_compartments = min_rule_index.split(" ")
-        assert (self.rules[int(selected_rule)].triggerAttemptedRuleChange(np.take(self.compartments,
-                                                                                  self.matched_indices[int(selected_rule)]
-                                                                                  [int(selected_compartments)])))
+        assert (self.triggerSubrule(min_subrule))
         
-        self.postSimulationActions(int(selected_rule), int(selected_compartments), 0)
+        self.postSimulationActions(min_subrule, 0)
         return current_time + min_time
 
+    def resortCandidates(self) -> None:
+        self.sorted_subrules = np.argsort(self.event_times, kind="stable")
+        self.sorted_position = 0
+        self.redrawn[:] = False
+        self.pending_subrules = np.zeros(0, dtype=np.int64)
+
+    def simulateBatchedStep(self, current_time):
+        if len(self.last_fired_subrules) == 0:
+            self.updateGivenPropensities(self.update_propensity_function)
+            self.event_times = current_time + self.returnCandidateTimes(self.propensities)
+            self.resortCandidates()
+        else:
+            subrules_to_update = self.returnSubrulesToUpdate()
+            self.updateGivenPropensities(self.update_propensity_function, subrules_to_update)
+            # The triggered subrule's time has been used, so it is redrawn even if its propensity is unchanged.
+            redraw_subrules = np.union1d(subrules_to_update, np.array(self.last_fired_subrules, dtype=np.int64))
+            self.event_times[redraw_subrules] = current_time + self.returnCandidateTimes(self.propensities[redraw_subrules])
+            self.redrawn[redraw_subrules] = True
+            self.pending_subrules = np.union1d(self.pending_subrules, redraw_subrules)
+            if len(self.pending_subrules) > self.resort_interval:
+                self.resortCandidates()
+        self.last_fired_subrules = []
+
+        # Skip sorted candidates whose time has been redrawn since the last sort.
+        while self.sorted_position < self.num_subrules and self.redrawn[self.sorted_subrules[self.sorted_position]]:
+            self.sorted_position += 1
+        min_subrule = -1
+        min_time = np.inf
+        if self.sorted_position < self.num_subrules:
+            min_subrule = int(self.sorted_subrules[self.sorted_position])
+            min_time = self.event_times[min_subrule]
+        if len(self.pending_subrules) > 0:
+            pending_min = int(self.pending_subrules[np.argmin(self.event_times[self.pending_subrules])])
+            if self.event_times[pending_min] < min_time:
+                min_subrule = pending_min
+                min_time = self.event_times[pending_min]
+
+        if min_time == np.inf:
+            return self.processNoRuleEvent(current_time)
+
+        assert (self.triggerSubrule(min_subrule))
+        self.postSimulationActions(min_subrule, 0)
+        return float(min_time)
+
 class GillespieNRMSolver(Solver):
-    """ Gillespie Next Reaction Method.
+    """ Gillespie Next Reaction Method (Gibson and Bruck, 2000).
     An improved version of the FRM method.
+
+    The absolute trigger time of every subrule is kept in an `IndexedMinHeap`, so the next subrule is found in O(1). After a trigger only
+    the dependents of the triggered subrule (from the `PropensityUpdateGraph`) are updated: the triggered subrule draws a new time and
+    every other dependent reuses its time, rescaled by the ratio of its old to new propensity, so one random number is used per event.
     """
     def __init__(self, no_rules_behaviour:str = "step", debug:bool = True) -> None:
         super().__init__(True, no_rules_behaviour, debug)
-        self.update_propensity_function = self.updateGivenPropensityNRM
+        self.update_propensity_function = self.updateGivenPropensity
 
-    def initialize(self, compartments, rules, matched_indices, model_state: ModelState, propensity_update_dict: dict | None = None) -> None:
+    def initialize(self, compartments, rules, matched_indices, model_state: ModelState,
+                   propensity_update_dict:Optional[PropensityUpdateGraph] = None) -> None:
         # Ensure that the rule index set updates itself, a new time will need to be generated
         # as the time was popped for that previous rule.
         super().initialize(compartments, rules, matched_indices, model_state, propensity_update_dict)
-        for key in self.propensity_update_dict:
-            try:
-                self.propensity_update_dict[key].add(tuple(int(x) for x in key.split(" ")))
-            except ValueError:
-                continue
+        self.propensity_update_dict = self.propensity_update_dict.withSelfDependencies()
 
     def reset(self):
         super().reset()
-        self.times = indexed_priority_queue.IndexedPriorityQueue()
-        self.propensities = {f"{rule_i} {index_set_i}":0 for rule_i in range(len(self.matched_indices))
-                             for index_set_i in range(len(self.matched_indices[rule_i]))}
-
-    def updateGivenPropensityNRM(self, rule_i:int, index_set_i:int,
-                              model_state_values:list) -> None:
-        rule_index_string = f"{rule_i} {index_set_i}"
-        rule = self.rules[rule_i]
-        new_propensity = rule.returnPropensity(np.take(self.compartments,
-                                                       self.matched_indices[rule_i][index_set_i]),
-                                                       model_state_values, index_set_i)
-        if new_propensity > 0:
-            time_key = (rule_i, index_set_i)
-            # If the rule has been triggered in the prior iteration.
-            key_missing = False
-            try:
-                old_time = self.times.priority(time_key)
-            except KeyError:
-                key_missing = True
-            time = None
-
-            if rule_index_string in self.last_rule_index_set or key_missing:
+        self.times = IndexedMinHeap(self.num_subrules)
+        self.current_time = 0
+        self.last_fired_subrule = -1
+
+    def returnSubruleTime(self, subrule_i:int, old_propensity:float, new_propensity:float) -> float:
+        if new_propensity <= 0:
+            return np.inf
+        if subrule_i == self.last_fired_subrule or old_propensity <= 0:
             # Compute the new time by t + tau and save this rather than tau as in the FRM.
-                time = self.current_time + ((-np.log(self._random_source.random(1)[0]))/new_propensity)
-            else:
-                old_propensity = self.propensities[rule_index_string]
-                time = self.current_time + (old_propensity/new_propensity)*(old_time-self.current_time)
-
-            if not key_missing:
-                self.times.update((rule_i, index_set_i), new_priority=time)
-            else:
-                self.times.push((rule_i, index_set_i), priority=time)
+            return self.current_time - np.log(self._random_source.random())/new_propensity
+        return self.current_time + (old_propensity/new_propensity)*(self.times.returnKey(subrule_i)-self.current_time)
 
-        
-        self.propensities[rule_index_string] = new_propensity
-
-
-        # Reduce the storage size, will need to check pq size though.
-        #else:
-            #self.times.push((rule_i, index_set_i), priority=float("inf"))
+    @override
+    def updateGivenPropensity(self, subrule_i:int, model_state_values:list) -> None:
+        rule_i = self.subrule_rules[subrule_i]
+        new_propensity = self.rules[rule_i].returnPropensity(self.subrule_compartments[subrule_i],
+                                                             model_state_values, self.subrule_index_sets[subrule_i])
+        self.times.update(subrule_i, self.returnSubruleTime(subrule_i, self.propensities[subrule_i], new_propensity))
+        self.propensities[subrule_i] = new_propensity
 
     @override
-    def updateGivenPropensities(self, update_propensity_func:Callable[[int, int, list], None],
-                                rules_and_matched_indices:Optional[tuple[int, int]] = None) -> None:
-        # Only change is self.updateTime calls and the computation of r_i for new times.
-        model_state_values = list(self.model_state.returnModelClassesValues())
+    def setSubrulePropensities(self, subrules:np.ndarray, new_propensities:np.ndarray) -> None:
+        old_propensities = self.propensities[subrules]
+        rescaled = (old_propensities > 0) & (new_propensities > 0) & (subrules != self.last_fired_subrule)
+        redrawn = (new_propensities > 0) & ~rescaled
+        new_times = np.full(len(subrules), np.inf)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            new_times[rescaled] = self.current_time + ((old_propensities[rescaled]/new_propensities[rescaled])
+                                                       *(self.times.keys[subrules[rescaled]]-self.current_time))
+        new_times[redrawn] = self.current_time + self._random_source.exponential(size=int(redrawn.sum()))/new_propensities[redrawn]
+        self.propensities[subrules] = new_propensities
+        for subrule_i, new_time in zip(subrules.tolist(), new_times.tolist()):
+            self.times.update(subrule_i, new_time)
 
-        if rules_and_matched_indices is None:
-            for rule_i in range(len(self.matched_indices)):
-                for index_set_i in range(len(self.matched_indices[rule_i])):
-                    update_propensity_func(rule_i, index_set_i, model_state_values)
-        else:
-            for rule_i, index_set_i in rules_and_matched_indices:
-                update_propensity_func(rule_i, index_set_i, model_state_values)
     @override
     def simulateOneStep(self, current_time):
         self.current_time = current_time
         self.performPropensityUpdates(self.update_propensity_function)
 
-        # List of the rule/subrule pair that is triggered during this step.
-        try:
-            (selected_rule,selected_compartments), new_time  = self.times.pop()
-        except IndexError:
+        selected_subrule, new_time = self.times.returnMin()
+        if new_time == np.inf:
+            self.last_fired_subrule = -1
             return self.processNoRuleEvent(current_time)
 
-        assert self.rules[int(selected_rule)].triggerAttemptedRuleChange(np.take(self.compartments,
-                                                                                  self.matched_indices[int(selected_rule)]
-                                                                                  [int(selected_compartments)]))
-        
-        self.postSimulationActions(int(selected_rule), int(selected_compartments), 0)
+        assert self.triggerSubrule(selected_subrule)
+        self.last_fired_subrule = selected_subrule
+
+        self.postSimulationActions(selected_subrule, 0)
         return new_time
 
 class HKOSolver(Solver):
+    """ Two-level direct method, a rule is selected first and then one of its subrules (index sets).
+
+    The subrule propensities are stored in one ragged array, rule_i's subrule propensities being
+    self.propensities[self.subrule_offsets[rule_i]:self.subrule_offsets[rule_i+1]], alongside the per-rule propensity sums. A rule is
+    selected with `np.searchsorted` over the cumulative rule sums and a subrule with `np.searchsorted` over the cumulative propensities
+    of the selected rule only, preferable for models with a few rules each matched to a large number of compartments.
+    """
     def __init__(self, use_cached_propensities:bool = True,
                  no_rules_behaviour:str = "step",
                  debug:bool = True) -> None:
@@ -336,38 +605,66 @@ class HKOSolver(Solver):
     @override
     def reset(self) -> None:
         super().reset()
-        # Rule index -> Subrule index -> subrule propensity
-        # This overwrites the default rule index -> rule propensity map defined in super.reset()
-        self.propensities = {str(rule_i):{str(matched_indices_i):0
-                                          for matched_indices_i in range(len(self.matched_indices[rule_i]))}
-                                            for rule_i in range(len(self.rules))}
-
-        # Rule index -> rule propensity
-        self.rule_propensities = {str(i):0 for i in range(len(self.rules))}
+        # Rule index -> rule propensity, the subrule propensities of rule_i are
+        # self.propensities[self.subrule_offsets[rule_i]:self.subrule_offsets[rule_i+1]].
+        self.rule_propensities = np.zeros(len(self.rules), dtype=np.float64)
 
     @override
-    def updateGivenPropensity(self, rule_i:int, index_set_i:int,
-                              model_state_values:list) -> None:
-        rule = self.rules[rule_i]
+    def updateGivenPropensity(self, subrule_i:int, model_state_values:list) -> None:
+        rule_i = self.subrule_rules[subrule_i]
+        index_set_i = self.subrule_index_sets[subrule_i]
 
         # Return the propensity of the subrule given by rule_i triggered with index_set_i,
         # and the current global model state values.
-        new_propensity = rule.returnPropensity(np.take(self.compartments,
-                                                       self.matched_indices[rule_i][index_set_i]),
-                                                       model_state_values, index_set_i)
+        new_propensity = self.rules[rule_i].returnPropensity(self.subrule_compartments[subrule_i],
+                                                             model_state_values, index_set_i)
 
         # We use the subrule propensity diff to update the stored propensity in rule_propensities and total_propensity
-        propensity_diff = new_propensity - self.propensities[str(rule_i)].get(str(index_set_i), 0.0)
+        propensity_diff = new_propensity - self.propensities[subrule_i]
 
-        self.rule_propensities[str(rule_i)] += propensity_diff
+        self.rule_propensities[rule_i] += propensity_diff
 
         if self.use_cached_propensities:
             self.total_propensity += propensity_diff
-        self.propensities[str(rule_i)][str(index_set_i)] = new_propensity
+        self.propensities[subrule_i] = new_propensity
+
+    @override
+    def setSubrulePropensities(self, subrules:np.ndarray, new_propensities:np.ndarray) -> None:
+        np.add.at(self.rule_propensities, self.subrule_rules[subrules], new_propensities - self.propensities[subrules])
+        super().setSubrulePropensities(subrules, new_propensities)
+
+    def selectSubrule(self, random_propensity:float) -> Optional[int]:
+        """ Returns the subrule whose cumulative propensity interval contains random_propensity, found by selecting the rule and then
+        the index set of the rule, or None if no subrule is found (due to numerical precision errors).
+        """
+        cumulative_rule_propensities = np.cumsum(self.rule_propensities)
+        rule_i = int(np.searchsorted(cumulative_rule_propensities, random_propensity, side="right"))
+        if rule_i >= len(self.rules):
+            return None
+        # random_propensity relative to the left hand side of rule_i's propensity interval.
+        random_propensity -= cumulative_rule_propensities[rule_i] - self.rule_propensities[rule_i]
+        rule_start, rule_end = self.subrule_offsets[rule_i], self.subrule_offsets[rule_i+1]
+        cumulative_propensities = np.cumsum(self.propensities[rule_start:rule_end])
+        index_set_i = int(np.searchsorted(cumulative_propensities, random_propensity, side="right"))
+        # The rule sums are updated by differences, so may differ slightly from the sum of the rule's propensities.
+        if index_set_i >= rule_end-rule_start:
+            positive_index_sets = np.flatnonzero(self.propensities[rule_start:rule_end] > 0)
+            if len(positive_index_sets) == 0:
+                return None
+            index_set_i = int(positive_index_sets[-1])
+        return int(rule_start) + index_set_i
+
+    @override
+    def updateGivenPropensities(self, update_propensity_func:Callable[[int, list], None],
+                                subrules:Optional[np.ndarray] = None) -> None:
+        super().updateGivenPropensities(update_propensity_func, subrules)
+        if subrules is None:
+            # Recompute the rule sums exactly on a full update to remove accumulated rounding errors.
+            self.rule_propensities = np.bincount(self.subrule_rules, weights=self.propensities, minlength=len(self.rules))
 
     @override
     def simulateOneStep(self, current_time):
-        # Update propensities for the rules affected by triggering the last_rule_index_set subrule.
+        # Update propensities for the rules affected by triggering the last_fired_subrules subrule.
         # Save these in self.rule_propensities, self.propensities.
         self.performPropensityUpdates(self.updateGivenPropensity)
 
@@ -380,40 +677,130 @@ class HKOSolver(Solver):
         u1, r2 = self._random_source.random(2)
         u2 = -np.log(r2)*(1/total_propensity)
         # Random time
-        cumulative_rule_prop = 0
+        selected_subrule = self.selectSubrule(u1*total_propensity)
+        # See dicussion of numerical precision in the Gillespie sovler.
+        if selected_subrule is None:
+            return self.processNoRuleEvent(current_time)
+
+        assert self.triggerSubrule(selected_subrule)
+        
+        self.postSimulationActions(selected_subrule, 0)
+        
+        return current_time + u2
+
+class CompositionRejectionSolver(Solver):
+    """ Composition-Rejection SSA (Slepoy, Thompson and Plimpton, 2008).
+
+    Subrules with non-zero propensity are grouped into bins by the power of two above their propensity, the bin with exponent e
+    holds propensities in [2**(e-1), 2**e). A bin is selected by a linear search over the bin propensities and a subrule is then
+    selected uniformly within the bin and accepted with probability propensity/2**e (at least 1/2). The cost of selection depends
+    on the number of bins (the spread of propensity magnitudes) and not on the number of subrules.
 
-        selected_rule = None
-        selected_index_set = None
+    Propensity updates only rebin the subrules returned by the propensity caching (`performPropensityUpdates`).
+    """
+    def __init__(self, use_cached_propensities:bool = True,
+                 no_rules_behaviour:str = "step", debug:bool = True) -> None:
+        super().__init__(use_cached_propensities, no_rules_behaviour, debug)
+        self.update_propensity_function = self.updateGivenPropensityCR
 
+    @override
+    def reset(self) -> None:
+        super().reset()
+        # Bin exponent -> subrules in the bin and bin exponent -> sum of the subrule propensities in the bin.
+        self.bins:dict[int, list[int]] = {}
+        self.bin_propensities:dict[int, float] = {}
+        # Subrule -> bin exponent (None if the subrule has zero propensity) and subrule -> position within its bin.
+        self.subrule_bins:list[Optional[int]] = [None]*self.num_subrules
+        self.subrule_bin_positions:list[int] = [0]*self.num_subrules
+
+    def _addToBin(self, subrule_i:int, exponent:int, propensity:float) -> None:
+        if exponent not in self.bins:
+            self.bins[exponent] = []
+            self.bin_propensities[exponent] = 0.0
+        subrule_bin = self.bins[exponent]
+        self.subrule_bins[subrule_i] = exponent
+        self.subrule_bin_positions[subrule_i] = len(subrule_bin)
+        subrule_bin.append(subrule_i)
+        self.bin_propensities[exponent] += propensity
+
+    def _removeFromBin(self, subrule_i:int, exponent:int, propensity:float) -> None:
+        subrule_bin = self.bins[exponent]
+        if len(subrule_bin) == 1:
+            # Dropping empty bins also discards any accumulated floating point error in the bin propensity.
+            del self.bins[exponent]
+            del self.bin_propensities[exponent]
+        else:
+            # Swap the last subrule in the bin into the removed subrule's position.
+            position = self.subrule_bin_positions[subrule_i]
+            last_subrule = subrule_bin.pop()
+            if last_subrule != subrule_i:
+                subrule_bin[position] = last_subrule
+                self.subrule_bin_positions[last_subrule] = position
+            self.bin_propensities[exponent] -= propensity
+        self.subrule_bins[subrule_i] = None
+
+    def updateGivenPropensityCR(self, subrule_i:int, model_state_values:list) -> None:
+        rule_i = self.subrule_rules[subrule_i]
+        index_set_i = self.subrule_index_sets[subrule_i]
+        new_propensity = self.rules[rule_i].returnPropensity(self.subrule_compartments[subrule_i],
+                                                             model_state_values, index_set_i)
+        old_propensity = self.propensities[subrule_i]
+        old_exponent = self.subrule_bins[subrule_i]
+        # math.frexp returns (m, e) with propensity = m*2**e and 0.5 <= m < 1.
+        new_exponent = math.frexp(new_propensity)[1] if new_propensity > 0 else None
+
+        if old_exponent is not None and old_exponent == new_exponent:
+            self.bin_propensities[old_exponent] += new_propensity - old_propensity
+        else:
+            if old_exponent is not None:
+                self._removeFromBin(subrule_i, old_exponent, old_propensity)
+            if new_exponent is not None:
+                self._addToBin(subrule_i, new_exponent, new_propensity)
+        self.propensities[subrule_i] = new_propensity
+
+    @override
+    def returnTotalPropensity(self) -> Union[float, int]:
+        return sum(self.bin_propensities.values())
+
+    def simulateOneStep(self, current_time):
+        self.performPropensityUpdates(self.update_propensity_function)
+
+        total_propensity = self.returnTotalPropensity()
+
+        if total_propensity <= 0:
+            return self.processNoRuleEvent(current_time)
+
+        u1, r2 = self._random_source.random(2)
+        u2 = (-np.log(r2))/total_propensity
+
+        # Composition: linear search over the bins.
         random_propensity = u1*total_propensity
-        # Find which rule to trigger based on u1
-        for rule_i in range(len(self.rules)):
-            rule_propensity = self.rule_propensities[str(rule_i)]
-            cumulative_rule_prop += rule_propensity
-            if cumulative_rule_prop > random_propensity:
-                # u1 lies between rule_i propensity interval
-                selected_rule = rule_i
-                # Start from the left hand side of rule_i's propensity interval
-                cumulative_rule_prop -= rule_propensity
-                selected_rule_propensity_dict = self.propensities[str(rule_i)]
-                # Find which subrule (i.e. which compartments ("index set") triggered the rule)
-                for index_set_key in selected_rule_propensity_dict:
-                    cumulative_rule_prop += selected_rule_propensity_dict[index_set_key]
-                    if cumulative_rule_prop > random_propensity:
-                        selected_index_set = int(index_set_key)
-                        break
+        cumulative_propensity = 0
+        selected_exponent = None
+        for exponent, bin_propensity in self.bin_propensities.items():
+            cumulative_propensity += bin_propensity
+            if cumulative_propensity > random_propensity:
+                selected_exponent = exponent
                 break
         # See dicussion of numerical precision in the Gillespie sovler.
-        if selected_rule is None or selected_index_set is None:
+        if selected_exponent is None:
             return self.processNoRuleEvent(current_time)
 
-        assert self.rules[int(selected_rule)].triggerAttemptedRuleChange(np.take(self.compartments,
-                                                                                  self.matched_indices[int(selected_rule)]
-                                                                                  [int(selected_index_set)]))
-        
-        self.postSimulationActions(int(selected_rule), int(selected_index_set), 0)
-        
+        # Rejection: every propensity in the bin is at least half of the bin upper bound, so on average fewer than two attempts are required.
+        subrule_bin = self.bins[selected_exponent]
+        bin_upper_bound = math.ldexp(1.0, selected_exponent)
+        while True:
+            r3, r4 = self._random_source.random(2)
+            selected_subrule = subrule_bin[int(r3*len(subrule_bin))]
+            if r4*bin_upper_bound < self.propensities[selected_subrule]:
+                break
+
+        assert self.triggerSubrule(selected_subrule)
+
+        self.postSimulationActions(selected_subrule, total_propensity)
+
         return current_time + u2
+
 class LaplaceGillespieSolver(GillespieSolver):
     def __init__(self, no_rules_behaviour:str = "step", debug:bool = True) -> None:
         # We require use of propensity caching as we only redraw when the update the propensity.
@@ -424,30 +811,100 @@ class LaplaceGillespieSolver(GillespieSolver):
 
         self.update_propensity_function = self.updateLaplacePropensity
 
-    def updateLaplacePropensity(self, rule_i:int, index_set_i:int,
-                              model_state_values:list) -> None:
-        rule = self.rules[rule_i]
-        new_propensity = rule.returnPropensity(np.take(self.compartments,
-                                                       self.matched_indices[rule_i][index_set_i]),
-                                                       model_state_values, index_set_i)
+    def updateLaplacePropensity(self, subrule_i:int, model_state_values:list) -> None:
+        rule = self.rules[self.subrule_rules[subrule_i]]
+        index_set_i = self.subrule_index_sets[subrule_i]
+        new_propensity = rule.returnPropensity(self.returnSubruleCompartments(subrule_i),
+                                               model_state_values, index_set_i)
         new_rate = self.wait_time_distribs[self.rule.wait_time_distribtion](new_propensity)
         if self.use_cached_propensities:
-            rate_diff = (new_rate - self.propensities.get(f"{rule_i} {index_set_i}", 0.0))
+            rate_diff = (new_rate - self.propensities[subrule_i])
             self.total_propensity += rate_diff
-        self.propensities[f"{rule_i} {index_set_i}"] = new_rate
+        self.propensities[subrule_i] = new_rate
 
 class TauLeapSolver(Solver):
+    """ Tau-leaping, an approximate method that triggers every subrule a Poisson distributed number of times per leap.
+
+    With tau_selection = "fixed" every leap is time_step long. With tau_selection = "adaptive" the leap length is chosen every step with
+    the Cao, Gillespie and Petzold (2006) bound, so that the expected relative change of every class value (and its standard deviation)
+    stays below epsilon, capped at time_step. The bound uses max_reaction_order as the highest reaction order of every class, as rule
+    propensities are arbitrary formulas. When a leap would contain fewer than ssa_threshold expected events an exact
+    (Gillespie direct method) step is taken instead, and a leap that makes a class value negative is halved and redrawn
+    (with negative_behaviour = "redraw").
+    """
     def __init__(self, time_step:float, use_cached_propensities:bool = False,
-                 no_rules_behaviour:str = "step", debug:bool = True, negative_behaviour:str = "redraw") -> None:
+                 no_rules_behaviour:str = "step", debug:bool = True, negative_behaviour:str = "redraw",
+                 tau_selection:str = "fixed", epsilon:float = 0.03, ssa_threshold:float = 10,
+                 max_reaction_order:float = 2) -> None:
         
         super().__init__(use_cached_propensities, no_rules_behaviour, debug, default_time_step=time_step)
         assert negative_behaviour in ["redraw", "ignore"]
         self.allow_negative = negative_behaviour == "ignore"
+        assert tau_selection in ["fixed", "adaptive"]
+        self.tau_selection = tau_selection
+        self.epsilon = epsilon
+        self.ssa_threshold = ssa_threshold
+        self.max_reaction_order = max_reaction_order
 
         # Use standard updateGivenPropensity derived from Solver class.
         self.update_propensity_function = self.updateGivenPropensity
         self.time_step = time_step
 
+    def returnAdaptiveTau(self, propensities:Optional[np.ndarray] = None, state_values:Optional[np.ndarray] = None) -> float:
+        """ Returns the Cao, Gillespie and Petzold (2006) leap length for the current propensities, capped at self.time_step.
+
+        Given a stack of propensities and state values (one row per replicate), returns the smallest leap length of the replicates.
+        """
+        if propensities is None:
+            propensities, state_values = self.propensities, self.state_values
+        changed_offsets = self.stoichiometry_matrix.changed_offsets
+        if len(changed_offsets) == 0:
+            return self.time_step
+        mean_change, change_variance = self.stoichiometry_matrix.returnStateChangeMoments(propensities)
+        change_bound = np.maximum(self.epsilon*state_values[..., changed_offsets]/self.max_reaction_order, 1)
+        with np.errstate(divide="ignore"):
+            tau = min(np.min(change_bound/np.abs(mean_change[..., changed_offsets])),
+                      np.min(change_bound**2/change_variance[..., changed_offsets]))
+        return min(float(tau), self.time_step)
+
+    def simulateExactStep(self, current_time, total_propensity):
+        u1, r2 = self._random_source.random(2)
+        selected_subrule = int(np.searchsorted(np.cumsum(self.propensities), u1*total_propensity, side="right"))
+        if selected_subrule >= self.num_subrules:
+            return self.processNoRuleEvent(current_time)
+        assert self.triggerSubrule(selected_subrule)
+        self.postSimulationActions(selected_subrule, total_propensity)
+        return current_time - np.log(r2)/total_propensity
+
+    def drawLeap(self, tau) -> tuple[np.ndarray, np.ndarray]:
+        """ Draws the trigger counts of every subrule over a leap of length tau with a single Poisson call and returns them with
+        the state values after the leap (the sparse stoichiometry product), without applying the leap.
+        """
+        counts = self._random_source.poisson(self.propensities*tau)
+        return counts, self.state_values + self.stoichiometry_matrix.returnStateChange(counts)
+
+    def applyLeap(self, counts:np.ndarray, new_values:np.ndarray, total_propensity) -> None:
+        self.state_values[:] = new_values
+        fired_subrules = np.flatnonzero(counts)
+        if len(fired_subrules) == 0:
+            return
+        # postSimulationActions records the last fired subrule.
+        if self.use_cached_propensities:
+            self.last_fired_subrules.extend(fired_subrules[:-1].tolist())
+        # Only one triggered subrule is recorded per step in the debug stats.
+        self.postSimulationActions(int(fired_subrules[-1]), total_propensity)
+
+    def simulateAdaptiveStep(self, current_time, total_propensity):
+        tau = self.returnAdaptiveTau()
+        while tau*total_propensity >= self.ssa_threshold:
+            counts, new_values = self.drawLeap(tau)
+            if self.allow_negative or not np.any(new_values < 0):
+                self.applyLeap(counts, new_values, total_propensity)
+                return current_time + tau
+            tau /= 2
+        # Too few events are expected in the leap for tau-leaping to be worthwhile.
+        return self.simulateExactStep(current_time, total_propensity)
+
     def simulateOneStep(self, current_time):
         self.performPropensityUpdates(self.update_propensity_function)
 
@@ -458,16 +915,538 @@ class TauLeapSolver(Solver):
         if total_propensity <= 1e-17:
             return self.processNoRuleEvent(current_time)
 
-        for rule_comp_key, rule_comp_propensity in self.propensities.items():
-            negative_valued = True
-            while negative_valued:
-                times_triggered = self._random_source.poisson(lam=rule_comp_propensity*self.time_step)
-                selected_rule, selected_compartments = rule_comp_key.split(" ")
-
-                if times_triggered > 0:
-                    negative_valued = not self.rules[int(selected_rule)].triggerAttemptedRuleChange(np.take(self.compartments,
-                                                                                  self.matched_indices[int(selected_rule)]
-                                                                                  [int(selected_compartments)]), times_triggered, self.allow_negative)
-                    # Not collecting times_triggered here (should be!)
-                    self.postSimulationActions(int(selected_rule), int(selected_compartments), total_propensity)
-        return current_time + self.time_step
\ No newline at end of file
+        if self.tau_selection == "adaptive":
+            return self.simulateAdaptiveStep(current_time, total_propensity)
+
+        counts, new_values = self.drawLeap(self.time_step)
+        # With negative_behaviour = "redraw" the whole leap is redrawn until no class value is negative.
+        while not self.allow_negative and np.any(new_values < 0):
+            counts, new_values = self.drawLeap(self.time_step)
+        self.applyLeap(counts, new_values, total_propensity)
+        return current_time + self.time_step
+
+    @override
+    def simulateEnsembleStep(self, ensemble_values:np.ndarray, current_time):
+        """ Leaps every replicate by a common tau with one vectorised Poisson draw over all replicates and subrules, the state change
+        is the product of the trigger counts with the sparse stoichiometry matrix. With negative_behaviour = "redraw" the whole leap of a
+        replicate is redrawn until none of its class values are negative.
+
+        With tau_selection = "fixed" tau is self.time_step. With tau_selection = "adaptive" tau is the smallest adaptive leap length
+        (`returnAdaptiveTau`) of the replicates, the exact steps below ssa_threshold expected events and the halving of leaps with
+        negative class values are not used, as the replicates step in lockstep.
+        """
+        model_state_values = list(self.model_state.returnModelClassesValues())
+        propensities = self.returnEnsemblePropensities(ensemble_values, model_state_values)
+        tau = self.time_step
+        if self.tau_selection == "adaptive":
+            tau = self.returnAdaptiveTau(propensities, ensemble_values)
+        leap_means = propensities*tau
+
+        counts = self._random_source.poisson(leap_means)
+        new_values = ensemble_values + self.stoichiometry_matrix.returnStateChange(counts)
+        if not self.allow_negative:
+            negative_replicates = np.flatnonzero(np.any(new_values < 0, axis=1))
+            while len(negative_replicates) > 0:
+                counts = self._random_source.poisson(leap_means[negative_replicates])
+                new_values[negative_replicates] = (ensemble_values[negative_replicates]
+                                                   + self.stoichiometry_matrix.returnStateChange(counts))
+                negative_replicates = negative_replicates[np.any(new_values[negative_replicates] < 0, axis=1)]
+        ensemble_values[:] = new_values
+        return current_time + tau
+
+class HybridSolver(Solver):
+    """ Hybrid stochastic/deterministic method with dynamic partitioning of the subrules into fast and slow subrules.
+
+    Every step the subrules are repartitioned: a subrule is fast if it is expected to trigger at least fast_event_threshold times per
+    time_step and every class value it changes is at least population_threshold, all other subrules are slow. Fast subrules are
+    integrated with an Euler step of their mean state change (fast_method = "deterministic") or an Euler-Maruyama step of the chemical
+    Langevin equation (fast_method = "langevin"), class values are clipped at 0. Slow subrules are triggered exactly with the Gillespie
+    direct method, the time to the next slow event being drawn from the slow propensities at the start of the step.
+
+    A step integrates the fast subrules up to the next slow event (which is then triggered) or for time_step if the next slow event is
+    later. Without fast subrules a step is a Gillespie direct method step. Propensities are recomputed every step.
+    """
+    def __init__(self, time_step:float, fast_event_threshold:float = 10, population_threshold:float = 100,
+                 fast_method:str = "deterministic", no_rules_behaviour:str = "step", debug:bool = True) -> None:
+        super().__init__(False, no_rules_behaviour, debug, default_time_step=time_step)
+        assert fast_method in ["deterministic", "langevin"]
+        self.fast_method = fast_method
+        self.fast_event_threshold = fast_event_threshold
+        self.population_threshold = population_threshold
+
+        self.update_propensity_function = self.updateGivenPropensity
+        self.time_step = time_step
+
+    @override
+    def reset(self) -> None:
+        super().reset()
+        self.fast_subrules = np.zeros(self.num_subrules, dtype=bool)
+
+    def returnSubrulePopulations(self) -> np.ndarray:
+        """ Returns the smallest class value changed by each subrule (inf for subrules that change no class values).
+        """
+        populations = np.full(self.num_subrules, np.inf)
+        np.minimum.at(populations, self.stoichiometry_matrix.subrules,
+                      self.state_values[self.stoichiometry_matrix.offsets])
+        return populations
+
+    def partitionSubrules(self) -> None:
+        self.fast_subrules = ((self.propensities*self.time_step >= self.fast_event_threshold)
+                              & (self.returnSubrulePopulations() >= self.population_threshold))
+
+    def integrateFastSubrules(self, time_step) -> None:
+        fast_rates = np.where(self.fast_subrules, self.propensities, 0)*time_step
+        if self.fast_method == "langevin":
+            fast_rates = fast_rates + np.sqrt(fast_rates)*self._random_source.standard_normal(self.num_subrules)
+        self.state_values += self.stoichiometry_matrix.returnStateChange(fast_rates)
+        np.maximum(self.state_values, 0, out=self.state_values)
+
+    def simulateOneStep(self, current_time):
+        self.performPropensityUpdates(self.update_propensity_function)
+
+        total_propensity = self.returnTotalPropensity()
+        if total_propensity <= 1e-17:
+            return self.processNoRuleEvent(current_time)
+
+        self.partitionSubrules()
+        slow_propensities = np.where(self.fast_subrules, 0, self.propensities)
+        slow_total_propensity = float(slow_propensities.sum())
+        any_fast_subrules = bool(self.fast_subrules.any())
+
+        u1, r2 = self._random_source.random(2)
+        slow_event_time = -np.log(r2)/slow_total_propensity if slow_total_propensity > 0 else np.inf
+        if any_fast_subrules and slow_event_time > self.time_step:
+            self.integrateFastSubrules(self.time_step)
+            if self.debug:
+                self.collectStats(None, None, total_propensity)
+            return current_time + self.time_step
+
+        if any_fast_subrules:
+            self.integrateFastSubrules(slow_event_time)
+        selected_subrule = int(np.searchsorted(np.cumsum(slow_propensities), u1*slow_total_propensity, side="right"))
+        if selected_subrule >= self.num_subrules:
+            return self.processNoRuleEvent(current_time)
+        assert self.triggerSubrule(selected_subrule)
+        self.postSimulationActions(selected_subrule, total_propensity)
+        return current_time + slow_event_time
+
+    @override
+    def returnStatsFields(self) -> list[str]:
+        return super().returnStatsFields() + ["num_fast_subrules"]
+
+    @override
+    def collectStats(self, rule:int, index_set:int, total_propensity) -> None:
+        super().collectStats(rule, index_set, total_propensity)
+        self.current_stats["num_fast_subrules"] = int(self.fast_subrules.sum())
+
+class ODESolver(Solver):
+    """ Deterministic mean-field approximation, integrates the rate equations dx/dt = a(x, t) · S, where a(x, t) are the subrule
+    propensities and S is the stoichiometry matrix, over the compartments state buffer.
+
+    Each step is an adaptive Dormand-Prince 5(4) Runge-Kutta step, the step size is controlled so that the estimated local error of every
+    class value stays below atol + rtol*|class value|, and capped at max_step as model_ classes are held constant within a step.
+    Implements `simulateEnsembleStep`, so `Model.simulateEnsemble` integrates many replicates (e.g. with different initial values)
+    in lockstep with a common step size.
+    """
+    # Dormand-Prince 5(4) Butcher tableau, the final stage is evaluated at the 5th order solution.
+    _stage_coefficients = [[],
+                           [1/5],
+                           [3/40, 9/40],
+                           [44/45, -56/15, 32/9],
+                           [19372/6561, -25360/2187, 64448/6561, -212/729],
+                           [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+                           [35/384, 0, 500/1113, 125/192, -2187/6784, 11/84]]
+    _solution_weights = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84, 0])
+    _error_weights = _solution_weights - np.array([5179/57600, 0, 7571/16695, 393/640, -92097/339200, 187/2100, 1/40])
+
+    def __init__(self, max_step:float = 1, rtol:float = 1e-3, atol:float = 1e-6, initial_step:Optional[float] = None,
+                 no_rules_behaviour:str = "step", debug:bool = True) -> None:
+        super().__init__(False, no_rules_behaviour, debug, default_time_step=max_step)
+        self.max_step = max_step
+        self.rtol = rtol
+        self.atol = atol
+        self.initial_step = initial_step if initial_step is not None else max_step/100
+
+        self.update_propensity_function = self.updateGivenPropensity
+
+    @override
+    def reset(self) -> None:
+        super().reset()
+        self.step_size = self.initial_step
+
+    def returnRateOfChange(self, ensemble_values:np.ndarray, model_state_values:list) -> np.ndarray:
+        """ Returns dx/dt for every replicate (each row of ensemble_values).
+        """
+        return self.stoichiometry_matrix.returnStateChange(self.returnEnsemblePropensities(ensemble_values, model_state_values))
+
+    def attemptStep(self, ensemble_values:np.ndarray, initial_rate:np.ndarray,
+                    model_state_values:list, step_size:float) -> tuple[np.ndarray, float]:
+        """ Returns the 5th order solution after step_size and the largest scaled error estimate over all replicates.
+        """
+        stage_rates = [initial_rate]
+        for coefficients in self._stage_coefficients[1:]:
+            stage_values = ensemble_values + step_size*sum(coefficient*stage_rate
+                                                           for coefficient, stage_rate in zip(coefficients, stage_rates))
+            stage_rates.append(self.returnRateOfChange(stage_values, model_state_values))
+        stage_rates = np.stack(stage_rates, axis=-1)
+        new_values = ensemble_values + step_size*(stage_rates @ self._solution_weights)
+        error = step_size*(stage_rates @ self._error_weights)
+        error_scale = self.atol + self.rtol*np.maximum(np.abs(ensemble_values), np.abs(new_values))
+        return new_values, float(np.sqrt(np.mean((error/error_scale)**2, axis=-1)).max())
+
+    def advance(self, ensemble_values:np.ndarray, initial_rate:np.ndarray, model_state_values:list) -> float:
+        """ Advances ensemble_values in place by one accepted step and returns the step size taken.
+        """
+        while True:
+            step_size = min(self.step_size, self.max_step)
+            new_values, error_norm = self.attemptStep(ensemble_values, initial_rate, model_state_values, step_size)
+            step_factor = 0.9*error_norm**-0.2 if error_norm > 0 else 5
+            self.step_size = step_size*min(5, max(0.2, step_factor))
+            if error_norm <= 1:
+                ensemble_values[:] = new_values
+                return step_size
+
+    def simulateOneStep(self, current_time):
+        self.performPropensityUpdates(self.update_propensity_function)
+
+        total_propensity = self.returnTotalPropensity()
+        if total_propensity <= 1e-17:
+            return self.processNoRuleEvent(current_time)
+
+        model_state_values = list(self.model_state.returnModelClassesValues())
+        initial_rate = self.stoichiometry_matrix.returnStateChange(self.propensities)[None]
+        step_size = self.advance(self.state_values[None], initial_rate, model_state_values)
+        if self.debug:
+            self.collectStats(None, None, total_propensity)
+        return current_time + step_size
+
+    @override
+    def simulateEnsembleStep(self, ensemble_values:np.ndarray, current_time):
+        model_state_values = list(self.model_state.returnModelClassesValues())
+        initial_rate = self.returnRateOfChange(ensemble_values, model_state_values)
+        return current_time + self.advance(ensemble_values, initial_rate, model_state_values)
+
+class LangevinSolver(Solver):
+    """ Chemical Langevin equation, an approximate method for large class values where each subrule's number of triggers in a
+    time step is approximated by a Gaussian rather than a Poisson random variable.
+
+    Every step is an Euler-Maruyama step of dx = a(x) · S dt + sqrt(a(x)) · S dW, with the subrule propensities evaluated and the
+    Gaussian increments drawn for all subrules at once. With negative_behaviour = "clip" negative class values are set to 0 after
+    each step. Implements `simulateEnsembleStep` for `Model.simulateEnsemble`.
+    """
+    def __init__(self, time_step:float, no_rules_behaviour:str = "step", debug:bool = True,
+                 negative_behaviour:str = "clip") -> None:
+        super().__init__(False, no_rules_behaviour, debug, default_time_step=time_step)
+        assert negative_behaviour in ["clip", "ignore"]
+        self.clip_negative = negative_behaviour == "clip"
+
+        self.update_propensity_function = self.updateGivenPropensity
+        self.time_step = time_step
+
+    def returnLangevinStateChange(self, propensities:np.ndarray) -> np.ndarray:
+        """ Returns the Euler-Maruyama state change over self.time_step for propensities of shape (..., number of subrules).
+        """
+        mean_triggers = propensities*self.time_step
+        triggers = mean_triggers + np.sqrt(mean_triggers)*self._random_source.standard_normal(mean_triggers.shape)
+        return self.stoichiometry_matrix.returnStateChange(triggers)
+
+    def simulateOneStep(self, current_time):
+        self.performPropensityUpdates(self.update_propensity_function)
+
+        total_propensity = self.returnTotalPropensity()
+        if total_propensity <= 1e-17:
+            return self.processNoRuleEvent(current_time)
+
+        self.state_values += self.returnLangevinStateChange(self.propensities)
+        if self.clip_negative:
+            np.maximum(self.state_values, 0, out=self.state_values)
+        if self.debug:
+            self.collectStats(None, None, total_propensity)
+        return current_time + self.time_step
+
+    @override
+    def simulateEnsembleStep(self, ensemble_values:np.ndarray, current_time):
+        model_state_values = list(self.model_state.returnModelClassesValues())
+        ensemble_values += self.returnLangevinStateChange(self.returnEnsemblePropensities(ensemble_values, model_state_values))
+        if self.clip_negative:
+            np.maximum(ensemble_values, 0, out=ensemble_values)
+        return current_time + self.time_step
+
+class RSSASolver(Solver):
+    """ Rejection-based SSA (Thanh et al., 2014), an exact method that avoids most propensity evaluations.
+
+    Every class value in the state buffer has a fluctuation interval around it, [x - w, x + w] with w = max(fluctuation_rate*x, min_fluctuation),
+    and every subrule keeps a lower and upper bound on its propensity over these intervals (see `Rule.returnPropensityBounds`). A candidate
+    subrule is selected with the upper bounds (using a `PropensitySumTree`) and accepted without evaluating its propensity if a uniform
+    draw falls below the lower bound, its exact propensity is only evaluated otherwise. Bounds are only recomputed for the subrules that
+    depend on a class value that has left its interval (and the interval is then recentred), or on a changed model_ class.
+
+    Subrules of rules whose propensity is not monotone in each class (`Rule.monotone_propensity`) have their exact propensity as both
+    bounds, recomputed whenever a class value they depend on changes.
+
+    The number of rejected candidates per step is reported in the debug stats as "rejections".
+    """
+    def __init__(self, fluctuation_rate:float = 0.1, min_fluctuation:float = 3,
+                 no_rules_behaviour:str = "step", debug:bool = True, max_rejections:int = 1000) -> None:
+        super().__init__(False, no_rules_behaviour, debug)
+        self.fluctuation_rate = fluctuation_rate
+        self.min_fluctuation = min_fluctuation
+        # After max_rejections consecutive rejections check that the exact total propensity is non-zero.
+        self.max_rejections = max_rejections
+
+        self.update_propensity_function = self.updateGivenPropensity
+
+    @override
+    def initialize(self, compartments, rules, matched_indices, model_state:ModelState,
+                   propensity_update_dict:Optional[PropensityUpdateGraph] = None) -> None:
+        super().initialize(compartments, rules, matched_indices, model_state, propensity_update_dict)
+        self.exact_subrules = np.repeat(np.array([not rule.monotone_propensity for rule in rules], dtype=bool),
+                                        np.diff(self.subrule_offsets))
+
+        # State buffer offset -> subrules whose propensity formula uses the class value (CSR), and model_ class -> subrules.
+        dependent_offsets = [np.zeros(0, dtype=np.int64)]
+        dependent_subrules = [np.zeros(0, dtype=np.int64)]
+        model_class_dependents = {model_class:[] for model_class in model_state.returnModelClasses()}
+        model_classes = list(model_state.returnModelClasses())
+        for rule_i, rule in enumerate(rules):
+            rule_subrules = np.arange(self.subrule_offsets[rule_i], self.subrule_offsets[rule_i+1], dtype=np.int64)
+            for slot_i, class_indices in enumerate(rule.slot_symbol_indices):
+                num_classes = len(rule.stoichiometry[slot_i])
+                class_indices = class_indices.tolist()
+                used_classes = np.array([class_i for class_i in class_indices if class_i < num_classes], dtype=np.int64)
+                dependent_offsets.append((rule.index_set_state_offsets[:, slot_i][:, None] + used_classes).ravel())
+                dependent_subrules.append(np.repeat(rule_subrules, len(used_classes)))
+                for class_i in class_indices:
+                    if class_i >= num_classes:
+                        model_class_dependents[model_classes[class_i-num_classes]].append(rule_subrules)
+        dependent_offsets = np.concatenate(dependent_offsets)
+        dependent_subrules = np.concatenate(dependent_subrules)
+        dependency_order = np.argsort(dependent_offsets, kind="stable")
+        self.state_dependents_indptr = np.zeros(len(self.state_values)+1, dtype=np.int64)
+        self.state_dependents_indptr[1:] = np.cumsum(np.bincount(dependent_offsets, minlength=len(self.state_values)))
+        self.state_dependents_indices = dependent_subrules[dependency_order]
+        self.model_class_dependents = {model_class:np.unique(np.concatenate(dependents))
+                                       for model_class, dependents in model_class_dependents.items() if len(dependents) > 0}
+
+    @override
+    def reset(self) -> None:
+        super().reset()
+        self.lower_values = np.zeros(len(self.state_values), dtype=np.float64)
+        self.upper_values = np.zeros(len(self.state_values), dtype=np.float64)
+        self.lower_bounds = np.zeros(self.num_subrules, dtype=np.float64)
+        self.upper_bounds = np.zeros(self.num_subrules, dtype=np.float64)
+        self.upper_bound_tree = PropensitySumTree(self.num_subrules)
+        self.bounds_initialized = False
+        self.rejections = 0
+
+    def updateFluctuationIntervals(self, offsets:Optional[np.ndarray] = None) -> None:
+        """ Recentres the fluctuation interval of the class values at offsets (all class values if None) around their current value.
+        """
+        if offsets is None:
+            offsets = slice(None)
+        class_values = self.state_values[offsets]
+        fluctuation = np.maximum(self.fluctuation_rate*np.abs(class_values), self.min_fluctuation)
+        self.lower_values[offsets] = np.maximum(class_values - fluctuation, 0)
+        self.upper_values[offsets] = class_values + fluctuation
+
+    def returnStateDependents(self, offsets:np.ndarray) -> np.ndarray:
+        return np.unique(np.concatenate([self.state_dependents_indices[self.state_dependents_indptr[offset]:
+                                                                       self.state_dependents_indptr[offset+1]]
+                                         for offset in offsets.tolist()] + [np.zeros(0, dtype=np.int64)]))
+
+    def updateBounds(self, model_state_values:list, subrules:Optional[np.ndarray] = None) -> None:
+        """ Recomputes the propensity bounds of subrules (all subrules if None) with one call per rule.
+        """
+        if subrules is None:
+            subrules = np.arange(self.num_subrules, dtype=np.int64)
+        if len(subrules) == 0:
+            return
+        subrule_rules = self.subrule_rules[subrules]
+        rule_order = np.argsort(subrule_rules, kind="stable")
+        rule_starts = np.flatnonzero(np.diff(subrule_rules[rule_order])) + 1
+        for rule_subrules in np.split(subrules[rule_order], rule_starts):
+            rule = self.rules[self.subrule_rules[rule_subrules[0]]]
+            index_set_indices = self.subrule_index_sets[rule_subrules]
+            if rule.monotone_propensity:
+                lower_bounds, upper_bounds = rule.returnPropensityBounds(self.lower_values, self.upper_values,
+                                                                         model_state_values, index_set_indices)
+            else:
+                lower_bounds = upper_bounds = rule.returnPropensities(self.state_values, model_state_values, index_set_indices)
+            self.lower_bounds[rule_subrules] = lower_bounds
+            self.upper_bounds[rule_subrules] = upper_bounds
+
+        if len(subrules) == self.num_subrules:
+            self.upper_bound_tree.rebuild(self.upper_bounds)
+        else:
+            for subrule_i in subrules.tolist():
+                self.upper_bound_tree.update(subrule_i, self.upper_bounds[subrule_i])
+
+    def returnExactTotalPropensity(self, model_state_values:list) -> float:
+        self.updateGivenPropensitiesBatched(model_state_values)
+        return float(self.propensities.sum())
+
+    def simulateOneStep(self, current_time):
+        model_state_values = list(self.model_state.returnModelClassesValues())
+        if not self.bounds_initialized:
+            self.updateFluctuationIntervals()
+            self.updateBounds(model_state_values)
+            self.bounds_initialized = True
+        else:
+            changed_model_classes = [self.model_class_dependents[model_class] for model_class in self.model_state.returnChangedVars()
+                                     if model_class in self.model_class_dependents]
+            if len(changed_model_classes) > 0:
+                self.updateBounds(model_state_values, np.unique(np.concatenate(changed_model_classes)))
+
+        elapsed_time = 0
+        rejections = 0
+        while True:
+            upper_total = self.upper_bound_tree.returnTotal()
+            if upper_total <= 0 or (rejections >= self.max_rejections and rejections % self.max_rejections == 0
+                                    and self.returnExactTotalPropensity(model_state_values) <= 0):
+                return self.processNoRuleEvent(current_time)
+
+            u1, u2, r3 = self._random_source.random(3)
+            elapsed_time -= np.log(r3)/upper_total
+            candidate = self.upper_bound_tree.search(u1*upper_total)
+            if candidate < self.num_subrules and self.upper_bounds[candidate] > 0:
+                acceptance_propensity = u2*self.upper_bounds[candidate]
+                if acceptance_propensity <= self.lower_bounds[candidate]:
+                    break
+                rule_i = self.subrule_rules[candidate]
+                if acceptance_propensity <= self.rules[rule_i].returnPropensity(self.subrule_compartments[candidate], model_state_values,
+                                                                                self.subrule_index_sets[candidate]):
+                    break
+            rejections += 1
+
+        assert self.triggerSubrule(candidate)
+        self.rejections = rejections
+        self.postSimulationActions(candidate, upper_total)
+
+        changed_offsets = self.rules[self.subrule_rules[candidate]].state_change_offsets[self.subrule_index_sets[candidate]]
+        changed_values = self.state_values[changed_offsets]
+        left_interval = changed_offsets[(changed_values < self.lower_values[changed_offsets])
+                                        | (changed_values > self.upper_values[changed_offsets])]
+        subrules_to_update = self.returnStateDependents(changed_offsets)
+        subrules_to_update = subrules_to_update[self.exact_subrules[subrules_to_update]]
+        if len(left_interval) > 0:
+            self.updateFluctuationIntervals(left_interval)
+            subrules_to_update = np.union1d(subrules_to_update, self.returnStateDependents(left_interval))
+        self.updateBounds(model_state_values, subrules_to_update)
+
+        return current_time + elapsed_time
+
+    @override
+    def returnStatsFields(self) -> list[str]:
+        return super().returnStatsFields() + ["rejections"]
+
+    @override
+    def collectStats(self, rule:int, index_set:int, total_propensity) -> None:
+        super().collectStats(rule, index_set, total_propensity)
+        self.current_stats["rejections"] = self.rejections
+
+class NextSubvolumeSolver(Solver):
+    """ Next Subvolume Method (Elf and Ehrenberg, 2004), an exact method for spatial models with a large number of compartments.
+
+    Every subrule belongs to the compartment in its first slot (the source compartment of a transport rule). The total propensity of
+    every compartment and the absolute time of its next event are kept, the times in an `IndexedMinHeap`, so the compartment of the next
+    event is found in O(1) and a subrule is then selected within that compartment only. After an event only the compartments whose
+    total propensity changed update their times, the triggering compartment draws a new time and every other changed compartment
+    rescales its time by the ratio of its old to new total propensity (as in `GillespieNRMSolver`).
+    """
+    def __init__(self, no_rules_behaviour:str = "step", debug:bool = True) -> None:
+        super().__init__(True, no_rules_behaviour, debug)
+        self.update_propensity_function = self.updateGivenPropensity
+
+    @override
+    def initialize(self, compartments, rules, matched_indices, model_state:ModelState,
+                   propensity_update_dict:Optional[PropensityUpdateGraph] = None) -> None:
+        super().initialize(compartments, rules, matched_indices, model_state, propensity_update_dict)
+        self.subrule_compartment = np.array([index_set[0] for rule_index_sets in matched_indices for index_set in rule_index_sets],
+                                            dtype=np.int64)
+        # Compartment -> subrules (CSR), the subrules of compartment c are
+        # compartment_subrules[compartment_indptr[c]:compartment_indptr[c+1]].
+        self.compartment_subrules = np.argsort(self.subrule_compartment, kind="stable")
+        self.compartment_indptr = np.zeros(self.num_compartments+1, dtype=np.int64)
+        self.compartment_indptr[1:] = np.cumsum(np.bincount(self.subrule_compartment, minlength=self.num_compartments))
+
+    @override
+    def reset(self) -> None:
+        super().reset()
+        self.num_compartments = len(self.compartments)
+        self.compartment_propensities = np.zeros(self.num_compartments, dtype=np.float64)
+        # The compartment total propensity that the compartment's event time was computed with.
+        self.scheduled_propensities = np.zeros(self.num_compartments, dtype=np.float64)
+        self.times = IndexedMinHeap(self.num_compartments)
+        self.changed_compartments = []
+        self.last_fired_compartment = -1
+        self.current_time = 0
+
+    @override
+    def updateGivenPropensity(self, subrule_i:int, model_state_values:list) -> None:
+        old_propensity = self.propensities[subrule_i]
+        super().updateGivenPropensity(subrule_i, model_state_values)
+        compartment_i = self.subrule_compartment[subrule_i]
+        self.compartment_propensities[compartment_i] += self.propensities[subrule_i] - old_propensity
+        self.changed_compartments.append(compartment_i)
+
+    @override
+    def setSubrulePropensities(self, subrules:np.ndarray, new_propensities:np.ndarray) -> None:
+        subrule_compartments = self.subrule_compartment[subrules]
+        np.add.at(self.compartment_propensities, subrule_compartments, new_propensities - self.propensities[subrules])
+        self.changed_compartments.extend(subrule_compartments.tolist())
+        super().setSubrulePropensities(subrules, new_propensities)
+
+    @override
+    def updateGivenPropensities(self, update_propensity_func:Callable[[int, list], None],
+                                subrules:Optional[np.ndarray] = None) -> None:
+        super().updateGivenPropensities(update_propensity_func, subrules)
+        if subrules is None:
+            # Recompute the compartment totals exactly on a full update to remove accumulated rounding errors.
+            self.compartment_propensities = np.bincount(self.subrule_compartment, weights=self.propensities,
+                                                        minlength=self.num_compartments)
+
+    def updateCompartmentTimes(self, compartments:np.ndarray) -> None:
+        old_propensities = self.scheduled_propensities[compartments]
+        new_propensities = np.maximum(self.compartment_propensities[compartments], 0)
+        rescaled = (old_propensities > 0) & (new_propensities > 0) & (compartments != self.last_fired_compartment)
+        redrawn = (new_propensities > 0) & ~rescaled
+        new_times = np.full(len(compartments), np.inf)
+        new_times[rescaled] = self.current_time + ((old_propensities[rescaled]/new_propensities[rescaled])
+                                                   *(self.times.keys[compartments[rescaled]]-self.current_time))
+        new_times[redrawn] = self.current_time + self._random_source.exponential(size=int(redrawn.sum()))/new_propensities[redrawn]
+        self.scheduled_propensities[compartments] = new_propensities
+        for compartment_i, new_time in zip(compartments.tolist(), new_times.tolist()):
+            self.times.update(compartment_i, new_time)
+
+    def selectCompartmentSubrule(self, compartment_i:int) -> Optional[int]:
+        compartment_subrules = self.compartment_subrules[self.compartment_indptr[compartment_i]:self.compartment_indptr[compartment_i+1]]
+        cumulative_propensities = np.cumsum(self.propensities[compartment_subrules])
+        if len(cumulative_propensities) == 0 or cumulative_propensities[-1] <= 0:
+            return None
+        position = int(np.searchsorted(cumulative_propensities, self._random_source.random()*cumulative_propensities[-1], side="right"))
+        return int(compartment_subrules[min(position, len(compartment_subrules)-1)])
+
+    def simulateOneStep(self, current_time):
+        self.current_time = current_time
+        full_update = len(self.last_fired_subrules) == 0
+        self.performPropensityUpdates(self.update_propensity_function)
+
+        if full_update:
+            changed_compartments = np.arange(self.num_compartments, dtype=np.int64)
+        else:
+            self.changed_compartments.append(self.last_fired_compartment)
+            changed_compartments = np.unique(np.array(self.changed_compartments, dtype=np.int64))
+        self.changed_compartments = []
+        self.updateCompartmentTimes(changed_compartments)
+
+        compartment_i, new_time = self.times.returnMin()
+        selected_subrule = self.selectCompartmentSubrule(compartment_i) if new_time < np.inf else None
+        if selected_subrule is None:
+            self.last_fired_compartment = -1
+            return self.processNoRuleEvent(current_time)
+
+        assert self.triggerSubrule(selected_subrule)
+        self.last_fired_compartment = compartment_i
+
+        self.postSimulationActions(selected_subrule, 0)
+        return new_time
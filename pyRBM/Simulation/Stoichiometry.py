@@ -0,0 +1,68 @@
+import numpy as np
+
+class StoichiometryMatrix:
+    """ Sparse stoichiometry matrix of every subrule over the compartments state buffer (`CompartmentsState.values`).
+
+    Stored in coordinate format built from each rule's precomputed (offset, delta) pairs: triggering subrule subrules[k] once
+    changes the state value at offsets[k] by deltas[k].
+
+    Attributes:
+        num_subrules (int): the number of subrules (rows).
+        state_size (int): the size of the compartments state buffer (columns).
+        subrules (np.ndarray): subrule id of each non-zero entry.
+        offsets (np.ndarray): state buffer offset of each non-zero entry.
+        deltas (np.ndarray): change in the state value of each non-zero entry.
+    """
+    def __init__(self, rules, subrule_offsets:np.ndarray, state_size:int) -> None:
+        self.num_subrules = int(subrule_offsets[-1])
+        self.state_size = state_size
+
+        subrules = [np.zeros(0, dtype=np.int64)]
+        offsets = [np.zeros(0, dtype=np.int64)]
+        deltas = [np.zeros(0, dtype=np.float64)]
+        for rule_i, rule in enumerate(rules):
+            num_index_sets, num_changes = rule.state_change_offsets.shape
+            subrules.append(np.repeat(np.arange(subrule_offsets[rule_i], subrule_offsets[rule_i+1], dtype=np.int64),
+                                      num_changes))
+            offsets.append(rule.state_change_offsets.ravel())
+            deltas.append(np.tile(rule.state_change_deltas, num_index_sets))
+        self.subrules = np.concatenate(subrules)
+        self.offsets = np.concatenate(offsets)
+        self.deltas = np.concatenate(deltas)
+        # State buffer offsets changed by at least one subrule.
+        self.changed_offsets = np.unique(self.offsets)
+
+    def returnStateChange(self, counts:np.ndarray) -> np.ndarray:
+        """ Returns the change in the state buffer when each subrule triggers counts times (i.e. counts · S).
+
+        Args:
+            counts (np.ndarray): subrule trigger counts (or rates) of shape (..., num_subrules).
+        Returns:
+            np.ndarray: the state change of shape (..., state_size).
+        """
+        return self._returnScatteredWeights(counts[..., self.subrules]*self.deltas)
+
+    def _returnScatteredWeights(self, weights:np.ndarray) -> np.ndarray:
+        # Sums weights of shape (..., number of non-zero entries) into the state buffer offsets of the entries.
+        batch_shape = weights.shape[:-1]
+        if len(batch_shape) == 0:
+            return np.bincount(self.offsets, weights, minlength=self.state_size)
+
+        # Offset each batch row into its own block of a flat state so a single bincount performs the scatter-add.
+        weights = weights.reshape(-1, len(self.deltas))
+        num_rows = weights.shape[0]
+        flat_offsets = (np.arange(num_rows, dtype=np.int64)[:, None]*self.state_size + self.offsets).ravel()
+        state_change = np.bincount(flat_offsets, weights.ravel(), minlength=num_rows*self.state_size)
+        return state_change.reshape(batch_shape+(self.state_size,))
+
+    def returnStateChangeMoments(self, propensities:np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """ Returns the expected change and the variance of the change of every state value per unit time when each subrule
+        triggers as a Poisson process with the given propensity, i.e. (a · S, a · S²).
+
+        Args:
+            propensities (np.ndarray): subrule propensities of shape (..., num_subrules).
+        Returns:
+            tuple[np.ndarray, np.ndarray]: the mean and variance of the state change, each of shape (..., state_size).
+        """
+        weights = propensities[..., self.subrules]*self.deltas
+        return self._returnScatteredWeights(weights), self._returnScatteredWeights(weights*self.deltas)
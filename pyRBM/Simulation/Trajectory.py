@@ -8,7 +8,8 @@ class Trajectory:
     def __init__(self, compartments:list[Compartment]) -> None:
         self.timestamps = {compartment_index:[0]
                            for compartment_index, _ in enumerate(compartments)}
-        self.trajectory_compartment_values = {compartment_index:[compartment.class_values]
+        # Compartment class values are views into the model state, so copies are stored.
+        self.trajectory_compartment_values = {compartment_index:[compartment.class_values.copy()]
                                            for compartment_index, compartment in enumerate(compartments)}
         self.last_time = 0
         self.last_compartment_index:Optional[int] = None
@@ -27,7 +28,7 @@ class Trajectory:
                                                                    [len(self.trajectory_compartment_values[compartment_index])-1])
             self.timestamps[compartment_index].append(self.last_time)
 
-        self.trajectory_compartment_values[compartment_index].append(compartment_values)
+        self.trajectory_compartment_values[compartment_index].append(np.array(compartment_values))
         self.timestamps[compartment_index].append(time)
 
         self.last_time = time
@@ -43,4 +44,49 @@ class Trajectory:
                     for i in range(len(self.compartment_labels[compartment_index]))],
                     loc=figure_position)
         plt.title(f"Classes over time for {self.compartment_names[compartment_index]}")
-        plt.show()
\ No newline at end of file
+        plt.show()
+
+class EnsembleTrajectory:
+    """ Trajectories of a lockstep ensemble of replicates (see `Model.simulateEnsemble`), all replicates share the same timestamps.
+
+    Attributes:
+        timestamps (list): the time of each recorded step.
+        state_offsets (np.ndarray): compartment index -> offset of the compartment's class values in the state (`CompartmentsState.offsets`).
+    """
+    def __init__(self, compartments:list[Compartment], ensemble_values:np.ndarray) -> None:
+        self.timestamps = [0]
+        self._ensemble_values = [ensemble_values.copy()]
+        self.state_offsets = compartments[0].state.offsets
+        self.compartment_labels = {compartment_index:compartment.label_mapping
+                                   for compartment_index, compartment in enumerate(compartments)}
+        self.compartment_names = {compartment_index:compartment.name
+                                  for compartment_index, compartment in enumerate(compartments)}
+
+    def addEntry(self, time, ensemble_values:np.ndarray) -> None:
+        self._ensemble_values.append(ensemble_values.copy())
+        self.timestamps.append(time)
+
+    def returnEnsembleValues(self) -> np.ndarray:
+        """ Returns the stacked trajectories, of shape (number of replicates, number of timestamps, state size).
+        """
+        return np.stack(self._ensemble_values, axis=1)
+
+    def returnCompartmentValues(self, compartment_index:int) -> np.ndarray:
+        """ Returns the class values of a compartment, of shape (number of replicates, number of timestamps, number of classes).
+        """
+        return self.returnEnsembleValues()[:, :, self.state_offsets[compartment_index]:self.state_offsets[compartment_index+1]]
+
+    def plotAllClassesOverTime(self, compartment_index:int,
+                               figure_position:str = "center left") -> None:
+        # Ensemble mean with the 5%-95% quantile band of each class.
+        class_values = self.returnCompartmentValues(compartment_index)
+        for class_i in range(class_values.shape[2]):
+            plt.plot(self.timestamps, class_values[:, :, class_i].mean(axis=0))
+        for class_i in range(class_values.shape[2]):
+            plt.fill_between(self.timestamps, np.quantile(class_values[:, :, class_i], 0.05, axis=0),
+                             np.quantile(class_values[:, :, class_i], 0.95, axis=0), alpha=0.2)
+        plt.legend([self.compartment_labels[compartment_index][str(i)].replace("_", " ")
+                    for i in range(len(self.compartment_labels[compartment_index]))],
+                    loc=figure_position)
+        plt.title(f"Ensemble classes over time for {self.compartment_names[compartment_index]}")
+        plt.show()